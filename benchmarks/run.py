@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import biocore
+import biosearch
+import biosim
+import biostats
+
+# Genome sizes (bases) each benchmark is run at by default
+SIZES = [100000, 1000000, 10000000]
+# Timed runs per benchmark and size, the best of which is reported
+REPEATS = 3
+# Fractional slow-down (or memory growth) over a baseline counted as a regression
+TOLERANCE = 0.25
+# Time (seconds) and memory (MB) differences below these are never counted as regressions
+TIME_FLOOR = 0.005
+MEMORY_FLOOR = 1.0
+# Contigs per synthetic genome, each half the size of the one before
+CONTIGS = 8
+# Arguments the benchmarks are run with
+KMER = 8
+MOTIF = 'GAATTC'
+ENZYME = 'EcoRI'
+SITES = ['EcoRI', 'BamHI', 'GATC']
+# Motif set searched on both strands at once by findMotifs, and one motif at a time by motifLoop
+MOTIFS = ['GAATTC', 'GGATCC', 'AAGCTT', 'GATC', 'CTGCAG', 'GGTCTC', 'CGTCTC', 'GCGGCCGC',
+          'RGATCY', 'CCWGG', 'GCNGC', 'TTAA', 'ACGT', 'CATG', 'GTAC', 'TCGA']
+
+##########
+# Inputs #
+##########
+
+def makeInputs(directory, size, seed=0):
+    """Write a synthetic genome of size bases (repeats, N-runs and planted
+    restriction sites included) to directory, returning the dictionary of
+    inputs the benchmarks take: the fasta, its largest contig as a string and
+    a primer pair either side of a 500 base product within it.
+    """
+    weights = 0.5 ** np.arange(CONTIGS)
+    lengths = np.maximum((weights / weights.sum() * size).astype(np.int64), 1).tolist()
+    records, planted = biosim.simulateGenome(lengths, gcBias=0.45, nRuns=2, repeats=4, repeatLength=min(1000, size // 100),
+                                             divergence=0.02, sites=SITES, count=max(size // 100000, 1), seed=seed)
+    fasta = os.path.join(directory, 'genome{}.fasta'.format(size))
+    biocore.writeFasta([name for name, seq in records], [seq for name, seq in records], filename=fasta)
+    seq = records[0][1]
+    start = min(1000, len(seq) // 4)
+    return({'fasta': fasta, 'size': size, 'seq': seq, 'primer1': seq[start:start+20],
+            'primer2': biocore._complement(seq[start+480:start+500], reverse=True)})
+
+##############
+# Benchmarks #
+##############
+
+def motifLoop(fasta, motifs=MOTIFS):
+    """Baseline for findMotifs: search each motif and its reverse complement
+    separately, one contig at a time.
+    """
+    for name, seq, qual in biocore.iterRecords(fasta):
+        for motif in motifs:
+            biosearch.matchMotif(seq, motif)
+            biosearch.matchMotif(seq, biosearch._reverseMotif(motif))
+
+# Each benchmark takes the inputs from makeInputs
+BENCHMARKS = {
+    'ToDict': lambda inputs: biocore.ToDict(inputs['fasta']),
+    'findKmers': lambda inputs: biocore.findKmers(inputs['fasta'], KMER),
+    'findMotif': lambda inputs: biocore.findMotif(MOTIF, inputs['fasta']),
+    'findMotifs': lambda inputs: biosearch.searchMotifs(MOTIFS, inputs['fasta']),
+    'motifLoop': lambda inputs: motifLoop(inputs['fasta']),
+    'simCleave': lambda inputs: biocore.simCleave(inputs['seq'], ENZYME),
+    'simPCR': lambda inputs: biocore.simPCR(inputs['seq'], inputs['primer1'], inputs['primer2']),
+    'getStats': lambda inputs: biostats.getStats(inputs['fasta']),
+    'getGC': lambda inputs: biostats.getGC(inputs['fasta']),
+}
+
+def _quietly(func, inputs):
+    """Call func, discarding anything it prints."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        func(inputs)
+
+def timeBenchmark(func, inputs, repeats=REPEATS):
+    """Return (best, median) wall-clock seconds over repeats calls, followed
+    by the peak traced memory (MB) of one more call. Memory is traced apart
+    from the timed calls, as tracing slows Python code down.
+    """
+    times = []
+    for i in range(int(repeats)):
+        start = time.perf_counter()
+        _quietly(func, inputs)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        _quietly(func, inputs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return(min(times), float(np.median(times)), peak / 1e6)
+
+def runBenchmarks(sizes=SIZES, names=None, repeats=REPEATS, seed=0):
+    """Run each benchmark (all of BENCHMARKS by default) at every genome
+    size, printing progress to stderr, and return the report as a dictionary.
+    """
+    names = list(BENCHMARKS) if names is None else names
+    for name in names:
+        if name not in BENCHMARKS:
+            raise Exception("Error: Unknown benchmark '{}', choose from: {}".format(name, ', '.join(BENCHMARKS)))
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            inputs = makeInputs(directory, int(size), seed)
+            for name in names:
+                best, median, peak = timeBenchmark(BENCHMARKS[name], inputs, repeats)
+                results.append({'benchmark': name, 'size': int(size), 'best': round(best, 6), 'median': round(median, 6),
+                                'peakMB': round(peak, 3), 'basesPerSecond': round(size / best) if best else None})
+                sys.stderr.write('{:<10}\t{:>10}\t{:.4f}s\t{:.1f} MB\n'.format(name, size, best, peak))
+    return({'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+            'repeats': int(repeats), 'seed': seed, 'results': results})
+
+###############
+# Regressions #
+###############
+
+def compareReports(report, baseline, tolerance=TOLERANCE):
+    """Given two reports, returns a list of (benchmark, size, measure, old,
+    new) for every benchmark and size in both that got more than tolerance
+    slower (best time) or hungrier (peak memory) than the baseline.
+    """
+    old = dict(((i['benchmark'], i['size']), i) for i in baseline['results'])
+    regressions = []
+    for result in report['results']:
+        before = old.get((result['benchmark'], result['size']))
+        if before is None:
+            continue
+        if result['best'] > before['best'] * (1 + tolerance) and result['best'] - before['best'] > TIME_FLOOR:
+            regressions.append((result['benchmark'], result['size'], 'best', before['best'], result['best']))
+        if result['peakMB'] > before['peakMB'] * (1 + tolerance) and result['peakMB'] - before['peakMB'] > MEMORY_FLOOR:
+            regressions.append((result['benchmark'], result['size'], 'peakMB', before['peakMB'], result['peakMB']))
+    return(regressions)
+
+def main(args):
+    options = {'sizes': SIZES, 'names': None, 'repeats': REPEATS, 'seed': 0}
+    outfile, baseline, tolerance = 'benchmark.json', None, TOLERANCE
+    extra = iter(args)
+    for arg in extra:
+        if arg.lower() == 'sizes':
+            options['sizes'] = [int(float(i)) for i in next(extra).split(',')]
+        elif arg.lower() == 'only':
+            options['names'] = next(extra).split(',')
+        elif arg.lower() == 'repeats':
+            options['repeats'] = int(next(extra))
+        elif arg.lower() == 'seed':
+            options['seed'] = int(next(extra))
+        elif arg.lower() == 'out':
+            outfile = next(extra)
+        elif arg.lower() == 'compare':
+            baseline = next(extra)
+        elif arg.lower() == 'tolerance':
+            tolerance = float(next(extra))
+        else:
+            return("Usage: run.py (sizes <int,int,...>) (only <benchmark,...>) (repeats <int>) (seed <int>) "
+                   "(out <report.json>) (compare <baseline.json>) (tolerance <fraction>)\n"
+                   "Benchmarks: " + ', '.join(BENCHMARKS))
+
+    report = runBenchmarks(**options)
+    with open(outfile, 'w') as f:
+        json.dump(report, f, indent=1)
+    print("Report written to {}.".format(outfile))
+
+    if baseline is not None:
+        with open(baseline, 'r') as f:
+            regressions = compareReports(report, json.load(f), tolerance)
+        for name, size, measure, before, after in regressions:
+            print("Regression: {} at {} bases, {} {} -> {} ({:+.0%})".format(name, size, measure, before, after, after / before - 1))
+        if regressions:
+            return(1)
+        print("No regressions beyond {:.0%} of {}.".format(tolerance, baseline))
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+
+import os
+from urllib.parse import unquote
+import numpy as np
+import biozip
+
+################
+# Exon parsing #
+################
+
+def readExons(exons):
+    """Given exons as a 'bpA:bpB,bpC:bpD' string or a file with one 'bpA:bpB'
+    per line (1-based, inclusive, in coding order), returns a list of (bpA,
+    bpB) tuples. Minus strand genes run from high to low (bpA > bpB).
+    """
+    if os.path.isfile(exons):
+        with open(exons, 'r') as f:
+            exons = ','.join(line.strip() for line in f if line.strip())
+    try:
+        ranges = [tuple(int(i) for i in exon.split(':')) for exon in exons.split(',')]
+    except ValueError:
+        raise Exception("Error: Contigs supplied in irregular format, please input as 'positionA:positionB,positionC:positionD'.")
+    if any(len(i) != 2 for i in ranges):
+        raise Exception("Error: Contigs supplied in irregular format, please input as 'positionA:positionB,positionC:positionD'.")
+    return(ranges)
+
+def readQueries(filename):
+    """Given a file with one integer per line (blank lines and '#' comments
+    skipped), returns them as an array.
+    """
+    with open(filename, 'r') as f:
+        return(np.array([int(line.split()[0]) for line in f if line.strip() and not line.startswith('#')], dtype=np.int64))
+
+# Hits returned by GeneIndex.lookup: the query they answer, the transcript
+# hit and its 1-based CDS position, codon and base within that codon.
+HIT_DTYPE = np.dtype([('query', np.int64), ('transcript', np.int64), ('cds', np.int64),
+                      ('codon', np.int64), ('base', np.int64)])
+# Columns of the table written by reportLoci
+LOCUS_COLUMNS = ['Contig', 'Position', 'Gene', 'Transcript', 'Strand', 'CDSPosition', 'Codon', 'Base']
+
+###################
+# Coordinate maps #
+###################
+
+class ExonMap(object):
+    """Maps between genomic, CDS and amino acid coordinates of one gene,
+    given its exons in coding order as (bpA, bpB) pairs (1-based, inclusive;
+    bpA > bpB throughout for minus strand genes). Only the exon bounds and
+    the CDS position at which each exon starts are held, and every lookup is
+    a binary search, so arrays of any number of positions are converted at
+    once whatever the gene length. Positions outside the CDS map to 0.
+    """
+
+    def __init__(self, exons):
+        if not len(exons):
+            raise Exception("Error: No exons given.")
+        strands = set('+' if a < b else '-' for a, b in exons if a != b) or {'+'} # Single base exons run either way
+        if len(strands) > 1:
+            raise Exception("Error: Exons of one gene must all run the same way.")
+        self.strand = strands.pop()
+        self.lows = np.array([min(i) for i in exons], dtype=np.int64)
+        self.highs = np.array([max(i) for i in exons], dtype=np.int64)
+        lengths = self.highs - self.lows + 1
+        self.offsets = np.cumsum(lengths) - lengths # CDS position (0-based) of each exon's first base
+        self.length = int(lengths.sum())
+
+        # Exons in genomic order for searching, which must not overlap
+        self._order = np.argsort(self.lows, kind='stable')
+        sortedLows, sortedHighs = self.lows[self._order], self.highs[self._order]
+        if np.any(sortedLows[1:] <= sortedHighs[:-1]):
+            raise Exception('Error: Duplicate position/s found in contigs.')
+        if np.any(np.diff(self._order) != (1 if self.strand == '+' else -1)):
+            raise Exception("Error: Exons must be listed in coding order.")
+        self._sortedLows, self._sortedHighs = sortedLows, sortedHighs
+
+    @classmethod
+    def parse(cls, exons):
+        """Build an ExonMap from a 'bpA:bpB,bpC:bpD' string or file (see readExons)."""
+        return(cls(readExons(exons)))
+
+    def exonOf(self, positions):
+        """Return the index (in coding order) of the exon holding each genomic
+        position, or -1 for positions outside every exon.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        found = np.searchsorted(self._sortedLows, positions, side='right') - 1
+        inside = (found >= 0) & (positions <= self._sortedHighs[np.maximum(found, 0)])
+        return(np.where(inside, self._order[np.maximum(found, 0)], -1))
+
+    def exonToCDS(self, exons, positions):
+        """Return the 0-based CDS positions of genomic positions in the given exons."""
+        if self.strand == '+':
+            return(self.offsets[exons] + positions - self.lows[exons])
+        return(self.offsets[exons] + self.highs[exons] - positions)
+
+    def toCDS(self, positions):
+        """Given genomic positions, returns their 1-based CDS positions (0
+        where not coding).
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        exons = self.exonOf(positions)
+        return(np.where(exons >= 0, self.exonToCDS(np.maximum(exons, 0), positions) + 1, 0))
+
+    def toGenomic(self, cdsPositions):
+        """Given 1-based CDS positions, returns their genomic positions (0
+        where beyond the CDS).
+        """
+        cds = np.asarray(cdsPositions, dtype=np.int64) - 1
+        valid = (cds >= 0) & (cds < self.length)
+        exons = np.searchsorted(self.offsets, np.where(valid, cds, 0), side='right') - 1
+        within = np.where(valid, cds, 0) - self.offsets[exons]
+        genomic = self.lows[exons] + within if self.strand == '+' else self.highs[exons] - within
+        return(np.where(valid, genomic, 0))
+
+    def toAA(self, positions):
+        """Given genomic positions, returns (amino acid, base within that
+        codon), both 1-based and 0 where not coding.
+        """
+        cds = self.toCDS(positions)
+        coding = cds > 0
+        return(np.where(coding, (cds - 1) // 3 + 1, 0), np.where(coding, (cds - 1) % 3 + 1, 0))
+
+    def codonToGenomic(self, codons):
+        """Given 1-based codon numbers, returns an (n x 3) array of the
+        genomic positions of each codon's bases, in coding order.
+        """
+        codons = np.asarray(codons, dtype=np.int64)
+        return(self.toGenomic(3 * (codons[..., None] - 1) + np.arange(1, 4)))
+
+##############
+# GFF3 genes #
+##############
+
+def _attributes(column):
+    """Return the key=value attributes of a GFF3 line as a dictionary."""
+    return(dict((key.strip(), unquote(value)) for key, sep, value in
+                (field.partition('=') for field in column.strip().split(';') if field.strip())))
+
+def readGFF(filename):
+    """Given a GFF3 annotation (optionally gzip/bgzip compressed), returns a
+    list of (gene, transcript, contig, strand, phase, exons), one per set of
+    CDS features sharing a parent, with exons as (bpA, bpB) pairs in coding
+    order (descending for minus strand transcripts, as for ExonMap) and the
+    phase of the first. Genes are named by the Name (or ID) of the topmost
+    feature above each transcript.
+    """
+    parents, names, cds, order = {}, {}, {}, []
+    with biozip.openText(filename) as f:
+        for line in f:
+            if line.startswith('##FASTA'):
+                break
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.rstrip('\r\n').split('\t')
+            if len(fields) < 9:
+                raise Exception("Error: GFF3 lines need 9 tab-separated columns, got: " + line.strip())
+            attributes = _attributes(fields[8])
+            if 'ID' in attributes:
+                names[attributes['ID']] = attributes.get('Name', attributes['ID'])
+                if 'Parent' in attributes:
+                    parents[attributes['ID']] = attributes['Parent'].split(',')[0]
+            if fields[2] != 'CDS':
+                continue
+            start, end = int(fields[3]), int(fields[4])
+            phase = int(fields[7]) if fields[7].isdigit() else 0
+            keys = attributes['Parent'].split(',') if 'Parent' in attributes else [attributes.get('ID', 'CDS{}'.format(len(order) + 1))]
+            for key in keys:
+                if key not in cds:
+                    cds[key] = (fields[0], '-' if fields[6] == '-' else '+', [])
+                    order.append(key)
+                cds[key][2].append((start, end, phase))
+
+    transcripts = []
+    for key in order:
+        contig, strand, parts = cds[key]
+        parts.sort(reverse=strand == '-')
+        top, seen = key, set()
+        while top in parents and top not in seen: # Walk up to the gene, guarding against cycles
+            seen.add(top)
+            top = parents[top]
+        exons = [(a, b) if strand == '+' else (b, a) for a, b, phase in parts]
+        transcripts.append((names.get(top, top), key, contig, strand, parts[0][2], exons))
+    return(transcripts)
+
+def readLoci(filename):
+    """Given a VCF or a tab-separated table whose first two columns are contig
+    and position (optionally gzip/bgzip compressed), returns (contigs,
+    positions) as a list and an array. '#' lines and a header starting
+    'contig' are skipped.
+    """
+    contigs, positions = [], []
+    with biozip.openText(filename) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.split('\t', 2)
+            if fields[0].lower() in ('contig', 'chrom', 'chromosome'):
+                continue
+            contigs.append(fields[0])
+            positions.append(int(fields[1]))
+    return(contigs, np.array(positions, dtype=np.int64))
+
+def indexFile(gff):
+    """Return the path of a GFF3 annotation's gene index."""
+    return(gff + '.idx.npz')
+
+def buildGeneIndex(gff, path=None):
+    """Given a GFF3 annotation, writes the sorted arrays of a GeneIndex over
+    every CDS feature to path (alongside the GFF by default) and returns it.
+    The GFF only has to be parsed once; later runs load the arrays directly.
+    """
+    transcripts = readGFF(gff)
+    contigs = list(dict.fromkeys(contig for gene, name, contig, strand, phase, exons in transcripts))
+    contigIndex = dict((contig, i) for i, contig in enumerate(contigs))
+
+    # One row per CDS feature, with the 0-based CDS position its first coding base takes
+    lows, highs, owners, offsets, lengths = [], [], [], [], []
+    for t, (gene, name, contig, strand, phase, exons) in enumerate(transcripts):
+        length = 0
+        for a, b in exons:
+            lows.append(min(a, b))
+            highs.append(max(a, b))
+            owners.append(t)
+            offsets.append(length)
+            length += abs(b - a) + 1
+        lengths.append(length)
+    lows, highs = np.array(lows, dtype=np.int64), np.array(highs, dtype=np.int64)
+    owners, offsets = np.array(owners, dtype=np.int64), np.array(offsets, dtype=np.int64)
+    features = np.array([contigIndex[transcripts[t][2]] for t in owners.tolist()], dtype=np.int64)
+
+    order = np.lexsort((lows, features))
+    features = features[order]
+    bounds = np.searchsorted(features, np.arange(len(contigs) + 1), side='left')
+    spans = (highs - lows)[order]
+    longest = np.array([spans[a:b].max() if b > a else 0 for a, b in zip(bounds[:-1], bounds[1:])], dtype=np.int64)
+
+    path = indexFile(gff) if path is None else path
+    stat = os.stat(gff)
+    np.savez(path, contigs=np.array(contigs, dtype=str), bounds=bounds, longest=longest,
+             lows=lows[order], highs=highs[order], owners=owners[order], offsets=offsets[order],
+             genes=np.array([i[0] for i in transcripts], dtype=str), transcripts=np.array([i[1] for i in transcripts], dtype=str),
+             strands=np.array([1 if i[3] == '+' else -1 for i in transcripts], dtype=np.int8),
+             phases=np.array([i[4] for i in transcripts], dtype=np.int64), lengths=np.array(lengths, dtype=np.int64),
+             source=np.array([stat.st_mtime, stat.st_size], dtype=np.float64))
+    return(GeneIndex(path))
+
+def openGeneIndex(annotation):
+    """Given a GFF3 annotation or a saved gene index (.npz), returns its
+    GeneIndex, building the index alongside a GFF if it is missing or the
+    GFF has changed since.
+    """
+    if annotation.endswith('.npz'):
+        return(GeneIndex(annotation))
+    path = indexFile(annotation)
+    if os.path.isfile(path):
+        index = GeneIndex(path)
+        stat = os.stat(annotation)
+        if index.source[0] == stat.st_mtime and index.source[1] == stat.st_size:
+            return(index)
+    return(buildGeneIndex(annotation))
+
+class GeneIndex(object):
+    """Every CDS feature of a GFF3 annotation as sorted arrays of bounds, one
+    contig after another, along with the transcript each belongs to and the
+    CDS position it starts at, as written by buildGeneIndex. Features may
+    overlap (alternative transcripts, overlapping genes), so a position is
+    looked up by binary search for the features starting at most the longest
+    feature's length before it, keeping those that reach it.
+    """
+
+    def __init__(self, path):
+        with np.load(path) as saved:
+            self.contigs = [str(i) for i in saved['contigs']]
+            self.genes = [str(i) for i in saved['genes']]
+            self.transcripts = [str(i) for i in saved['transcripts']]
+            for key in ('bounds', 'longest', 'lows', 'highs', 'owners', 'offsets', 'strands', 'phases', 'lengths', 'source'):
+                setattr(self, key, saved[key])
+        self._contigIndex = dict((contig, i) for i, contig in enumerate(self.contigs))
+
+    def _contigHits(self, contig, positions):
+        """Return (query, feature) pairs for every feature holding a position on one contig."""
+        a, b = self.bounds[contig], self.bounds[contig + 1]
+        lows = self.lows[a:b]
+        lo = np.searchsorted(lows, positions - self.longest[contig], side='left')
+        hi = np.searchsorted(lows, positions, side='right')
+        counts = hi - lo
+        queries = np.repeat(np.arange(len(positions)), counts)
+        features = np.repeat(lo, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        inside = self.highs[a:b][features] >= positions[queries]
+        return(queries[inside], features[inside] + a)
+
+    def lookup(self, contigs, positions):
+        """Given contig names (one, or one per position) and 1-based genomic
+        positions, returns HIT_DTYPE records for every transcript each
+        position codes in, sorted by query. Codons count from the first
+        complete codon of the CDS, so the bases of a partial first codon (GFF
+        phase above 0) fall in codon 0. Positions in no CDS are left out.
+        """
+        positions = np.asarray(positions, dtype=np.int64).ravel()
+        if isinstance(contigs, str):
+            codes = np.full(len(positions), self._contigIndex.get(contigs, -1), dtype=np.int64)
+        elif isinstance(contigs, np.ndarray): # Faster to look up each distinct name than every element
+            names, inverse = np.unique(contigs.astype(str), return_inverse=True)
+            codes = np.array([self._contigIndex.get(str(name), -1) for name in names], dtype=np.int64)[inverse.ravel()]
+        else:
+            codes = np.array([self._contigIndex.get(name, -1) for name in contigs], dtype=np.int64)
+        order = np.argsort(codes, kind='stable')
+        splits = np.searchsorted(codes[order], np.arange(len(self.contigs) + 1))
+
+        queries, features = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for contig in np.flatnonzero(splits[1:] > splits[:-1]).tolist():
+            selected = order[splits[contig]:splits[contig + 1]]
+            hits, found = self._contigHits(contig, positions[selected])
+            queries.append(selected[hits])
+            features.append(found)
+        queries, features = np.concatenate(queries), np.concatenate(features)
+        if len(queries) and np.any(queries[1:] < queries[:-1]): # Only needed if contigs were interleaved
+            order = np.argsort(queries, kind='stable')
+            queries, features = queries[order], features[order]
+
+        owners = self.owners[features]
+        within = np.where(self.strands[owners] > 0, positions[queries] - self.lows[features], self.highs[features] - positions[queries])
+        framed = self.offsets[features] + within - self.phases[owners] # 0-based from the first complete codon
+        hits = np.zeros(len(queries), dtype=HIT_DTYPE)
+        hits['query'], hits['transcript'] = queries, owners
+        hits['cds'] = self.offsets[features] + within + 1
+        hits['codon'] = np.maximum(framed // 3 + 1, 0)
+        hits['base'] = framed % 3 + 1
+        return(hits)
+
+    def find(self, name):
+        """Return the index of a transcript, given its ID or its gene's name."""
+        for names in (self.transcripts, self.genes):
+            if name in names:
+                return(names.index(name))
+        raise Exception("Error: No transcript or gene named '{}' in the annotation.".format(name))
+
+    def exonMap(self, transcript):
+        """Return an ExonMap of one transcript (an index or a name, see find),
+        e.g. to find the genomic positions of its codons.
+        """
+        t = self.find(transcript) if isinstance(transcript, str) else int(transcript)
+        features = np.flatnonzero(self.owners == t)
+        features = features[np.argsort(self.offsets[features], kind='stable')]
+        if self.strands[t] > 0:
+            return(ExonMap(list(zip(self.lows[features].tolist(), self.highs[features].tolist()))))
+        return(ExonMap(list(zip(self.highs[features].tolist(), self.lows[features].tolist()))))
+
+def reportLoci(loci, annotation, outfile=None):
+    """Given genomic positions (a VCF/TSV, see readLoci, or a (contigs,
+    positions) pair) and a GFF3 annotation or saved gene index (see
+    openGeneIndex), writes a table of LOCUS_COLUMNS to outfile (or stdout),
+    one row per position and transcript it codes in, '.' where it codes in
+    none. Returns the number of (positions, coding hits).
+    """
+    contigs, positions = readLoci(loci) if isinstance(loci, str) else loci
+    positions = np.asarray(positions, dtype=np.int64)
+    contigs = [contigs] * len(positions) if isinstance(contigs, str) else list(contigs)
+    index = openGeneIndex(annotation)
+    hits = index.lookup(contigs, positions)
+
+    # Every query gets a row per hit, or one empty row slotted in by query order if it has none
+    covered = np.zeros(len(positions), dtype=bool)
+    covered[hits['query']] = True
+    rows = np.concatenate((hits['query'], np.flatnonzero(~covered)))
+    order = np.argsort(rows, kind='stable')
+    described = ['{}\t{}\t{}'.format(gene, name, '+' if strand > 0 else '-')
+                 for gene, name, strand in zip(index.genes, index.transcripts, index.strands.tolist())]
+    details = ['{}\t{}\t{}\t{}'.format(described[t], c, codon, base) for t, c, codon, base in
+               zip(hits['transcript'].tolist(), hits['cds'].tolist(), hits['codon'].tolist(), hits['base'].tolist())]
+    details.append('.\t.\t.\t.\t.\t.')
+
+    located = positions.tolist()
+    lines = ['\t'.join(LOCUS_COLUMNS) + '\n']
+    lines.extend('{}\t{}\t{}\n'.format(contigs[q], located[q], details[h])
+                 for q, h in zip(rows[order].tolist(), np.minimum(order, len(hits)).tolist()))
+    out = open(outfile, 'w') if outfile else None
+    try:
+        out.write(''.join(lines)) if out else print(''.join(lines), end='')
+    finally:
+        if out:
+            out.close()
+    return(len(positions), len(hits))
@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 
+import glob
 import os
-import re
 import sys
 import numpy as np
-
-# TODO: Build a fastq to fasta converter (base qualities will have to be removed)
-# TODO: Update findMotif to support IUPAC ambiguous nucleotides (Y, R, W etc.)
-# TODO: Add ambiguous allele support for translate.
+import biocoords
+import biozip
 
 ####################################
 # Utilities of broader application #
@@ -15,109 +13,305 @@ import numpy as np
 
 Idict = {'A':'A', 'C':'C', 'G':'G', 'T':'T', 'U':'U', 'R':['A', 'G'], 'Y':['C', 'T', 'U'], 'M':['A', 'C'], 'K':['G', 'T', 'U'], 'S':['C', 'G'], 'W':['A', 'T', 'U'], 'H':['A', 'C', 'T', 'U'], 'B':['C', 'G', 'T', 'U'], 'V':['A', 'C', 'G'], 'D':['A', 'G', 'T', 'U'], 'N':['A', 'C', 'G', 'T', 'U'] }
 
-def detectType(filename):
-    """Given filename, will attempt to predict and return the filetype.
-    Note that this depends entirely on the name of the file given.
-    In future this may be replaced with a more dynamic approach.
+# Filename extensions used when a file cannot be read to detect its type
+_EXTENSIONS = {'fasta': ('.fa', '.fasta', '.fna', '.ffn', '.faa', '.frn', '.fas', '.fsa', '.mpfa'),
+               'fastq': ('.fq', '.fastq')}
+_COMPRESSED = ('.gz', '.bgz', '.zst')
+# detectType results by absolute path: (mtime, size, filetype)
+_typeCache = {}
+
+def _typeFromName(filename):
+    name = filename.lower()
+    for suffix in _COMPRESSED:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    for filetype, extensions in _EXTENSIONS.items():
+        if name.endswith(extensions):
+            return(filetype)
+    return(None)
+
+def _stripExtensions(filename):
+    """Return filename without any compression suffix and then any fasta/q
+    extension, e.g. 'reads.fq.gz' -> 'reads'.
+    """
+    for suffix in _COMPRESSED:
+        if filename.lower().endswith(suffix):
+            filename = filename[:-len(suffix)]
+    for extensions in _EXTENSIONS.values():
+        for extension in extensions:
+            if filename.lower().endswith(extension):
+                return(filename[:-len(extension)])
+    return(filename)
+
+def _typeFromContent(head):
+    """Given the first bytes of a file, return its type from the first
+    character of its (decompressed) content, or None.
     """
-    if filename[-2:] == "fa" or filename[-5:] == "fasta":
-        return("fasta")
-    elif filename[-2:] == "fq" or filename[-5:] == "fastq":
-        return("fastq")
-    elif filename[-2:] == "gz":
+    content = biozip.decompressHead(head).lstrip()
+    filetype = {b'>': 'fasta', b'@': 'fastq'}.get(content[:1])
+    if filetype is None and head[:2] == biozip.GZIP_MAGIC:
         return("gzip")
+    if filetype is None and head[:4] == biozip.ZSTD_MAGIC:
+        return("zstd")
+    return(filetype)
 
-def namesToFile(fasta, keepStart='N'):
-    """Creates a file of names from a given fasta.
+def detectType(filename):
+    """Given filename, will attempt to predict and return the filetype
+    ('fasta' or 'fastq'; 'gzip' or 'zstd' if compressed but otherwise
+    unrecognised; None if unknown). The first bytes of the file are checked
+    (decompressed if gzip/bgzip/zstd), falling back on its extension for
+    empty or missing files. '-' is standard input, which is peeked at but
+    not consumed. Results are cached per path until the file changes.
+    """
+    if filename == biozip.STDIN:
+        if filename not in _typeCache:
+            _typeCache[filename] = (None, None, _typeFromContent(biozip.peek(filename, 4096)))
+        return(_typeCache[filename][2])
+    if not os.path.isfile(filename):
+        return(_typeFromName(filename))
+
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    if path in _typeCache and _typeCache[path][:2] == (stat.st_mtime_ns, stat.st_size):
+        return(_typeCache[path][2])
+    filetype = _typeFromContent(biozip.peek(filename, 4096)) or _typeFromName(filename)
+    _typeCache[path] = (stat.st_mtime_ns, stat.st_size, filetype)
+    return(filetype)
+
+def isInputFile(seq):
+    """Return True if seq names a file to read (or '-' for stdin) rather than a sequence."""
+    return(isinstance(seq, str) and (seq == biozip.STDIN or os.path.isfile(seq)))
+
+def expandFiles(paths):
+    """Given a directory, a glob pattern, a comma-separated string or a list
+    of these, returns the sorted list of fasta/q files it refers to. Files
+    named explicitly are always kept; those found in directories or by glob
+    are kept only if detected as fasta/q.
     """
-    titles = []
+    if isinstance(paths, str):
+        paths = paths.split(',')
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, i) for i in os.listdir(path) if detectType(os.path.join(path, i)) in ('fasta', 'fastq')]
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            files += [i for i in glob.glob(path) if os.path.isfile(i) and detectType(i) in ('fasta', 'fastq')]
+    return(sorted(set(files)))
 
-    f = open(fasta, "r")
+def namesToFile(fasta, keepStart='N'):
+    """Creates a file of names from a given fasta/q (optionally compressed,
+    or '-' for stdin), keeping the leading > (or @) if keepStart is 'Y'.
+    """
+    if keepStart.upper() not in ('N', 'Y'):
+        print("keepStart input unclear, accepts Y/N only")
+        return
+    start = ('>' if detectType(fasta) == 'fasta' else '@') if keepStart.upper() == 'Y' else ''
+
+    with open(r'names_out.txt', 'w') as n:
+        for name, seq, qual in iterRecords(fasta, upper=False):
+            n.write(start + name + '\n')
+
+def iterRecords(filename, upper=True, threads=None):
+    """Given a fasta or fastq, yields one record at a time as a tuple with
+    the format ("contig_name", "sequence", "qualities"). Qualities are None
+    for a fasta. Only the current record is held in memory, so peak memory
+    is bounded by the longest contig rather than the whole file.
+    Bases will be forced to uppercase unless upper=False.
+    Gzip/bgzip compressed files are decompressed on the fly, over several
+    threads for large BGZF files (see biozip.openText). '-' reads stdin.
+    """
 
-    for line in f:
-        if ">" in line:
-            if (keepStart.upper() == 'N'):
-                titles.append(line.lstrip('>'))
-            elif (keepStart.upper() == 'Y'):
-                titles.append(line)
-            else:
-                print("keepStart input unclear, accepts Y/N only")
-                return
-    f.close()
+    filetype = detectType(filename)
 
-    n = open(r'names_out.txt', 'w')
+    if filetype is None or filetype.lower() not in ("fasta", "fastq"):
+        raise Exception("Incorrect file format supplied, please supply a fasta or fastq (optionally gzip, bgzip or zstd compressed).")
 
-    for element in titles:
-        n.write(element)
-    n.close()
+    with biozip.openText(filename, threads) as f:
+        if filetype.lower() == "fasta":
+            name = None
+            lines = []
+            for line in f: # take name from > to /n, seq from /n to >
+                if line[:1] == ">":
+                    if name is not None:
+                        seq = ''.join(lines)
+                        yield (name, seq.upper() if upper else seq, None)
+                    name = line[1:].rstrip('\r\n').lstrip(' ')
+                    lines = []
+                else:
+                    lines.append(line.rstrip())
+            if name is not None:
+                seq = ''.join(lines)
+                yield (name, seq.upper() if upper else seq, None)
+        else:
+            while True:
+                line1 = f.readline()
+                if not line1:
+                    break
+                if not line1.strip(): # tolerate blank lines between records
+                    continue
+                line2 = f.readline().rstrip()
+                f.readline()
+                line4 = f.readline().rstrip('\r\n')
+                seq = line2.upper() if upper else line2
+                yield (line1[1:].rstrip('\r\n'), seq, line4)
 
 def ToDict(filename):
     """Given a fasta or fastq, returns a dictionary with the format
     {"contig_name": ["sequence"]} if a fasta and
     {"contig_name": ["sequence", "qualities"]} if a fastq.
     Note that dictionaries are unordered and that all bases will be
-    forced to uppercase.
+    forced to uppercase. Prefer iterRecords() for large files.
     """
 
     dictionary = {}
-    seqcatch = ""
-    filetype = detectType(filename)
 
-    f = open(filename, "r")
+    for name, seq, qual in iterRecords(filename):
+        if name in dictionary:
+            raise Exception("Warning: Duplicate ToDict() key identified for: "+name+" Please change name for this sequence.")
+        if qual is None:
+            dictionary[name] = [seq]
+        else:
+            dictionary[name] = [seq, qual]
 
-    if filetype.lower() == "fasta":
-        for line in f: #take name from > to /n, seq from /n to >
-            if ">" in line:
-                tmp = line[1:-1].lstrip(' ')
-                if tmp in dictionary.keys():
-                    raise Exception("Warning: Duplicate ToDict() key identified for: "+tmp+" Please change name for this sequence.")
-                dictionary[tmp] = seqcatch.upper()
-                seqcatch = ""
-            else:
-                seqcatch += line.rstrip()
-            dictionary[tmp] = [seqcatch.upper()]
-    elif filetype.lower() == "fastq":
-        for line1 in f:
-                if line1.rstrip('\n') in dictionary.keys():
-                    raise Exception("Warning: Duplicate ToDict() key identified for: "+tmp+" Please change name for this sequence.")
-                line2 = next(f)
-                line3 = next(f)
-                line4 = next(f)
-                dictionary[line1.rstrip('\n')] = [line2.upper().rstrip('\n'), line4.rstrip('\n')]
+    return(dictionary)
+
+def buildIndex(fasta):
+    """Given a fasta, writes a samtools-compatible index (fasta.fai) alongside
+    it and returns it as a dictionary with the format
+    {"contig_name": (length, offset, lineBases, lineWidth)}.
+    As with samtools, contigs are named by the first word of their > line
+    (see _indexKey to look up a full iterRecords name).
+    Offsets of compressed fastas are into the uncompressed stream.
+    """
+
+    index = {}
+    name = None
+    length = offset = lineBases = lineWidth = 0
+    lastLine = False # set once a short line has been seen for the current contig
+    position = 0
+
+    with biozip.openBinary(fasta) as f:
+        for line in f:
+            if line[:1] == b">":
+                if name is not None:
+                    index[name] = (length, offset, lineBases, lineWidth)
+                words = line[1:].split()
+                name = words[0].decode() if words else ''
+                if name in index:
+                    raise Exception("Error: Duplicate contig name identified in index for: "+name)
+                length = lineBases = lineWidth = 0
+                lastLine = False
+                offset = position + len(line)
+            elif name is not None:
+                bases = len(line.rstrip(b'\r\n'))
+                if bases == 0:
+                    lastLine = True
+                elif lineBases == 0:
+                    lineBases = bases
+                    lineWidth = len(line)
+                elif lastLine or bases > lineBases:
+                    raise Exception("Error: Uneven line lengths identified in contig "+name+", cannot index.")
+                elif bases < lineBases:
+                    lastLine = True
+                length += bases
+            position += len(line)
+    if name is not None:
+        index[name] = (length, offset, lineBases, lineWidth)
+
+    with open(fasta+'.fai', 'w') as fai:
+        for key, value in index.items():
+            fai.write('{}\t{}\t{}\t{}\t{}\n'.format(key, *value))
+
+    return(index)
+
+def _indexIsCurrent(fasta, index):
+    """Check that a loaded index still describes the fasta, by mtime and
+    (uncompressed) size, and that it names contigs by their first word, as
+    the header line before the last contig should confirm. Plain gzip is
+    checked by mtime and names only.
+    """
+    if os.path.getmtime(fasta+'.fai') < os.path.getmtime(fasta):
+        return(False)
+    if any(len(name.split()) != 1 for name in index): # e.g. full header lines, as older versions wrote
+        return(False)
+    size = biozip.uncompressedSize(fasta)
+    if size is None:
+        return(True)
+    if len(index) == 0:
+        return(size == 0)
+    name, (length, offset, lineBases, lineWidth) = list(index.items())[-1]
+    header = biozip.readRange(fasta, max(offset - 4096, 0), offset).rstrip(b'\r\n').rsplit(b'\n', 1)[-1]
+    if not header.startswith(b'>') or header[1:].split()[:1] != [name.encode()]:
+        return(False)
+    if lineBases == 0:
+        end = offset
     else:
-        raise Exception("Incorrect file format supplied, please supply a fasta or fastq.")
+        end = offset + (length // lineBases) * lineWidth + length % lineBases
+    # The final contig should end within one line terminator of the end of file
+    return(0 <= size - end <= max(lineWidth - lineBases, 2))
 
-    f.close()
-    return(dictionary)
+def readIndex(fasta):
+    """Given a fasta, returns its index as produced by buildIndex. The .fai is
+    (re)built automatically if missing or if the fasta has since changed.
+    """
+    index = {}
+    if os.path.isfile(fasta+'.fai'):
+        with open(fasta+'.fai', 'r') as fai:
+            for line in fai:
+                fields = line.rstrip('\n').split('\t')
+                index[fields[0]] = tuple(int(i) for i in fields[1:5])
+        if _indexIsCurrent(fasta, index):
+            return(index)
+    return(buildIndex(fasta))
+
+def _indexKey(index, contig):
+    """Return the index name of a contig given either its first word or its
+    full header (as from iterRecords), or None if it is not indexed.
+    """
+    if contig in index:
+        return(contig)
+    words = contig.split()
+    return(words[0] if words and words[0] in index else None)
+
+def fetchSeq(fasta, contig, start=1, end=None, index=None):
+    """Given an indexed (or indexable) fasta, a contig name (its first word
+    or full header) and optionally a 1-based inclusive start and end, returns
+    that sequence as an uppercase string. Only the requested bytes are read,
+    via mmap, or for BGZF compressed fastas via the blocks named in their
+    .gzi index.
+    """
+    if index is None:
+        index = readIndex(fasta)
+    key = _indexKey(index, contig)
+    if key is None:
+        raise Exception('Error: Given contig name not present in fasta/q.')
+
+    length, offset, lineBases, lineWidth = index[key]
+    start = max(int(start), 1) - 1
+    end = length if end is None else min(int(end), length)
+    if end <= start or lineBases == 0:
+        return('')
+
+    # Convert sequence coordinates to file coordinates, skipping line ends
+    byteStart = offset + (start // lineBases) * lineWidth + start % lineBases
+    byteEnd = offset + ((end - 1) // lineBases) * lineWidth + (end - 1) % lineBases + 1
+
+    chunk = biozip.readRange(fasta, byteStart, byteEnd)
+    return(chunk.replace(b'\n', b'').replace(b'\r', b'').decode().upper())
 
 def ToList(filename):
-    """Given a fasta file, return a list with the format:
+    """Given a fasta/q (optionally compressed, or '-' for stdin), return a
+    list with the format:
     [contig1, contig2, ..., contigN]
+    where each record is split into contigs at runs of N.
     Note that this function will remove contig labels.
     """
 
-    # TODO: Allow fasta/fastq recognition.
-
     theList = []
-    seqcatch = ''
-
-    with open(filename, "r") as f:
-        for line in f: #ignore original > line, catch all else
-            if ">" in line:
-                pass
-            else:
-                if 'N' not in line.upper():
-                    seqcatch += line.rstrip()
-                elif 'N' in line.upper():
-                    for base in line.rstrip():
-                        if base.upper() != 'N':
-                            seqcatch += base
-                        elif base.upper() == 'N':
-                            if seqcatch != '':
-                                theList.append(seqcatch)
-                                seqcatch = ''
-                            else:
-                                pass
+    for name, seq, qual in iterRecords(filename, upper=False):
+        theList += [contig for contig in seq.replace('n', 'N').split('N') if contig]
     return(theList)
 
 def ReadContigsFile(inFile):
@@ -138,7 +332,7 @@ def ReadContigsFile(inFile):
         if rangeA < rangeB:
             contigs += [x for x in range(rangeA,rangeB+1)]
         elif rangeA > rangeB:
-            contigs += [x for x in range(rangeA,rangeB+1,-1)]
+            contigs += [x for x in range(rangeA,rangeB-1,-1)]
         else:
             raise Exception('Error: Zero length contig identified.')
     f.close()
@@ -178,80 +372,206 @@ def writeFasta(titles=[], sequences=[], filename='out.fasta'):
     with open(filename, 'a') as fasta:
         for t, s in zip(titles,sequences):
             fasta.write('> {}\n'.format(t))
-            s_wNewlines = re.sub("(.{80})","\\1\n", s, 0, re.DOTALL)
-            fasta.write(s_wNewlines+'\n')
-
-def createFasta(sequenceLens=[300, 200, 100], GCbias=0.5, filename='test.fasta', bases='DNA'):
-    '''Create an example fasta file for testing.'''
-
-    # Select correct base set
-    if bases.upper() == 'DNA':
-        baseset = ['A','C','G','T']
-    elif bases.upper() == 'DNA+':
-        baseset = ['A','C','G','T','R','Y','S','W','K','M','B','D','H','V','N','.']
-    elif bases.upper() == 'RNA':
-        baseset = ['A','C','G','U']
-    elif bases.upper() == 'PROTEIN':
-        baseset = ['A','B','C','D','G','H','J','I','K','L','M','P','Q','R','S','T','V','W','X','Y','Z']
-    else:
-        raise Exception("Error: Unrecognised base type '{}' selected.".format(bases))
+            fasta.write(''.join(s[i:i+80] + '\n' for i in range(0, len(s), 80)) or '\n')
 
-    # Determine GC bias if required, currently AT and GC linked.
-    if GCbias == 0.5:
-        acgtProbability = [0.25,0.25,0.25,0.25]
-    elif GCbias < 0 or GCbias > 1:
-        raise Exception("Error: Supplied GCbias '{}' must not be beyond the bounds of 0 to 1.".format(GCbias))
-    else:
-        acgtProbability = [((1-GCbias)/2), (GCbias/2), ((1-GCbias)/2), (GCbias/2)]
+def createFasta(sequenceLens=[300, 200, 100], GCbias=0.5, filename='test.fasta', bases='DNA', seed=None):
+    '''Create an example fasta file for testing. Each contig is drawn in one
+    go (see biosim for repeats, N-runs, planted sites and simulated reads).'''
+    import biosim # Imported here as biosim itself depends on biocore
 
-    # Assemble pseudo-contigs
+    # Assemble pseudo-contigs, DNA/RNA GC bias links A/T and G/C
+    rng = np.random.default_rng(seed)
     testTitles = ['Contig{}'.format(i) for i in range(len(sequenceLens))]
-    if bases.upper() == 'DNA':
-        testSeqs = [''.join([np.random.choice(baseset, p=acgtProbability) for j in range(i)]) for i in sequenceLens]
-    else:
-        testSeqs = [''.join([np.random.choice(baseset) for j in range(i)]) for i in sequenceLens]
+    testSeqs = [biosim.randomSequence(i, GCbias, bases, rng).tobytes().decode() for i in sequenceLens]
 
     # Write to fasta
     writeFasta(testTitles, testSeqs, filename=filename)
     print("Test fasta file successfully created.")
 
+###########################
+# Compact sequence arrays #
+###########################
+
+# Lookup tables over byte values: uppercase, 2-bit base code (A/C/G/T|U = 0-3, other = 4)
+_UPPER = np.arange(256, dtype=np.uint8)
+_UPPER[ord('a'):ord('z')+1] -= 32
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _i, _b in enumerate('ACGT'):
+    _BASE_CODES[ord(_b)] = _BASE_CODES[ord(_b.lower())] = _i
+_BASE_CODES[ord('U')] = _BASE_CODES[ord('u')] = 3
+_CODE_BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+class PackedSeq(object):
+    """A DNA/RNA sequence held as a NumPy uint8 array rather than a string.
+    By default each base is stored as its uppercase ASCII byte. With
+    packed=True bases are instead stored as 2-bit codes, four to a byte,
+    alongside a run-length mask of ambiguous positions (N, IUPAC, gaps) so
+    that the original sequence can always be restored exactly.
+    Slicing with a step of 1 returns a view of the same buffer, not a copy.
+    """
+
+    def __init__(self, seq, packed=False):
+        self.packed = packed
+        arr = _UPPER[_asArray(seq)]
+        self._start = 0
+        self._length = len(arr)
+        if not packed:
+            self._data = arr
+            return
+
+        # RNA is packed with U in place of T, anything else goes to the mask
+        hasU = bool(np.any(arr == ord('U')))
+        self._t = ord('U') if hasU and not np.any(arr == ord('T')) else ord('T')
+        codes = _BASE_CODES[arr]
+        ambiguous = (codes == 4) | ((arr != self._t) & (codes == 3))
+        codes[ambiguous] = 0
+
+        padded = np.zeros((len(codes) + 3) // 4 * 4, dtype=np.uint8)
+        padded[:len(codes)] = codes
+        padded = padded.reshape(-1, 4)
+        self._bits = (padded[:, 0] << 6) | (padded[:, 1] << 4) | (padded[:, 2] << 2) | padded[:, 3]
+
+        # Store maximal runs of identical ambiguous characters as [start, end)
+        positions = np.flatnonzero(ambiguous)
+        if len(positions):
+            breaks = np.flatnonzero((np.diff(positions) != 1) | (np.diff(arr[positions]) != 0)) + 1
+            self._runStarts = positions[np.r_[0, breaks]]
+            self._runEnds = positions[np.r_[breaks - 1, len(positions) - 1]] + 1
+            self._runChars = arr[self._runStarts]
+        else:
+            self._runStarts = self._runEnds = np.zeros(0, dtype=np.int64)
+            self._runChars = np.zeros(0, dtype=np.uint8)
+
+    def _view(self, start, length):
+        view = object.__new__(PackedSeq)
+        view.__dict__.update(self.__dict__)
+        view._start = self._start + start
+        view._length = length
+        return(view)
+
+    def toArray(self):
+        """Return the sequence as a uint8 array of uppercase ASCII bytes."""
+        if not self.packed:
+            return(self._data)
+        start, end = self._start, self._start + self._length
+        block = self._bits[start // 4:(end + 3) // 4]
+        codes = ((block[:, None] >> _SHIFTS) & 3).ravel()[start % 4:start % 4 + self._length]
+        arr = _CODE_BASES[codes]
+        arr[codes == 3] = self._t
+
+        # Overlay any ambiguous runs overlapping this region
+        first = np.searchsorted(self._runEnds, start, side='right')
+        last = np.searchsorted(self._runStarts, end, side='left')
+        for runStart, runEnd, char in zip(self._runStarts[first:last], self._runEnds[first:last], self._runChars[first:last]):
+            arr[max(runStart, start) - start:min(runEnd, end) - start] = char
+        return(arr)
+
+    def codes(self):
+        """Return the 2-bit base codes (A/C/G/T|U = 0-3) with 4 for any other base."""
+        return(_BASE_CODES[self.toArray()])
+
+    def ambiguityMask(self):
+        """Return a boolean array marking positions which are not A/C/G/T/U."""
+        return(self.codes() == 4)
+
+    def counts(self):
+        """Return a dictionary of {base: count} for all bases present."""
+        tally = np.bincount(self.toArray(), minlength=256)
+        return(dict((chr(i), int(tally[i])) for i in np.flatnonzero(tally)))
+
+    def count(self, base):
+        return(int(np.count_nonzero(self.toArray() == ord(base.upper()))))
+
+    def upper(self):
+        return(self) # Bases are always held in uppercase
+
+    @property
+    def nbytes(self):
+        if self.packed:
+            return(self._bits.nbytes + self._runStarts.nbytes + self._runEnds.nbytes + self._runChars.nbytes)
+        return(self._data.nbytes)
+
+    def __len__(self):
+        return(self._length)
+
+    def __str__(self):
+        return(self.toArray().tobytes().decode())
+
+    def __repr__(self):
+        text = str(self[:20]) + ('...' if self._length > 20 else '')
+        return("PackedSeq('{}', length={}, packed={})".format(text, self._length, self.packed))
+
+    def __contains__(self, base):
+        return(self.count(base) > 0)
+
+    def __eq__(self, other):
+        if isinstance(other, (PackedSeq, str, bytes)):
+            return(np.array_equal(self.toArray(), _UPPER[_asArray(other)]))
+        return(NotImplemented)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return(equal if equal is NotImplemented else not equal)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if not self.packed:
+                return(PackedSeq._wrap(self._data[key])) # NumPy slices are views
+            start, stop, step = key.indices(self._length)
+            if step == 1:
+                return(self._view(start, max(stop - start, 0)))
+            return(PackedSeq(self.toArray()[key], packed=True))
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError('PackedSeq index out of range')
+        return(chr(self[key:key+1].toArray()[0]))
+
+    @staticmethod
+    def _wrap(arr):
+        """Wrap an existing uppercase uint8 array without copying it."""
+        view = object.__new__(PackedSeq)
+        view.packed = False
+        view._data = arr
+        view._start = 0
+        view._length = len(arr)
+        return(view)
+
+def _asArray(seq):
+    """Return any sequence (string, bytes, array or PackedSeq) as a uint8 array."""
+    if isinstance(seq, PackedSeq):
+        return(seq.toArray())
+    if isinstance(seq, np.ndarray):
+        return(seq.astype(np.uint8, copy=False))
+    if isinstance(seq, str):
+        seq = seq.encode()
+    return(np.frombuffer(seq, dtype=np.uint8))
+
 #########################
 # Biologically Relevant #
 #########################
 
 def countNucs(seq):
     """Return the number of A, C, G & Ts within a sequence of DNA given
-    as a string.
+    as a string or PackedSeq.
     """
-    # DNA/RNA check
-    RNA = DNA = scaffold = False
-    seq = seq.upper()
+    if isinstance(seq, PackedSeq):
+        tally = seq.counts()
+    else:
+        seq = seq.upper()
+        tally = dict((base, seq.count(base)) for base in 'ACGTUN')
+    A, C, G, T, U, N = [tally.get(base, 0) for base in 'ACGTUN']
 
-    if "U" in seq:
-        RNA = True
-    if "T" in seq:
-        DNA = True
-    if "N" in seq:
-        scaffold = True
+    # DNA/RNA check
+    RNA = U > 0
+    DNA = T > 0
+    scaffold = N > 0
 
     if (RNA):
         if (DNA):
             raise Exception("Sequence contains both DNA and RNA.")
 
-    A = C = G = T = U = N = 0
-    for x in list(seq):
-        if x.upper() == "A":
-            A += 1
-        elif x.upper() == "C":
-            C += 1
-        elif x.upper() == "G":
-            G += 1
-        elif x.upper() == "T":
-            T += 1
-        elif x.upper() == "U":
-            U += 1
-        elif x.upper() == "N":
-            N += 1
     if (DNA):
         print("A: " + str(A) + "\n" + "C: " + str(C) + "\n" + "G: " + str(G) + "\n" + "T: " + str(T))
     if (RNA):
@@ -259,13 +579,20 @@ def countNucs(seq):
     if (scaffold):
         print("N: " + str(N))
 
+def _replaceBase(seq, old, new):
+    """Replace every instance of one base with another in a string or PackedSeq."""
+    if isinstance(seq, PackedSeq):
+        arr = seq.toArray().copy()
+        arr[arr == ord(old)] = ord(new)
+        return(PackedSeq(arr, packed=seq.packed))
+    return(seq.replace(old, new))
+
 def transcribe(seq, asPrint=False):
-    """Converts a sequence of bases, provided as a string, from RNA to
-    DNA or DNA to RNA. An automatic check is included to determine if
+    """Converts a sequence of bases, provided as a string or PackedSeq, from
+    RNA to DNA or DNA to RNA. An automatic check is included to determine if
     the given sequence is DNA or RNA.
     """
     seq = seq.upper()
-    newSeq = ""
 
     #DNA/RNA check - this breaks if U or T is not present
     if "U" in seq:
@@ -276,126 +603,104 @@ def transcribe(seq, asPrint=False):
             return
     elif "T" in seq:
         switch = "toRNA"
-        if "U" in seq:
-            print("Invalid sequence, contains both DNA and RNA. " +\
-                  "Function aborted.")
-            return
     else:
         switch = "toAlt"
 
     #Sequence conversion
     if switch == "toDNA":
-        for x in list(seq):
-            if x == "U":
-                newSeq += "T"
-            else:
-                newSeq += str(x)
+        newSeq = _replaceBase(seq, "U", "T")
     elif switch == "toRNA":
-        for x in list(seq):
-            if x == "T":
-                newSeq += "U"
-            else:
-                newSeq += str(x)
+        newSeq = _replaceBase(seq, "T", "U")
     elif switch == "toAlt":
-        newSeq == seq
+        newSeq = seq
 
     #if __name__ == "__main__": # for command line execution
     if asPrint:
-        print(switch[2:]+" Sequence: "+newSeq)
+        print(switch[2:]+" Sequence: "+str(newSeq))
     else:
         return(newSeq)
 
+# Complement lookup tables, shared by the string (str.translate) and array (LUT) paths
+_COMPLEMENT_FROM = 'ACGTYRWSKMDVHBXN-'
+_COMPLEMENT_TO = 'TGCARYWSMKHBDVXN-'
+_COMPLEMENT_TABLE = str.maketrans(_COMPLEMENT_FROM + _COMPLEMENT_FROM.lower(), _COMPLEMENT_TO * 2)
+_COMPLEMENT_INVALID = str.maketrans('', '', _COMPLEMENT_FROM + _COMPLEMENT_FROM.lower())
+_COMPLEMENT_LUT = np.zeros(256, dtype=np.uint8) # 0 marks a base which cannot be complemented
+for _a, _b in zip(_COMPLEMENT_FROM, _COMPLEMENT_TO):
+    _COMPLEMENT_LUT[ord(_a)] = _COMPLEMENT_LUT[ord(_a.lower())] = ord(_b)
+
+def _complement(seq, reverse=False):
+    """Complement a string or PackedSeq via lookup table, without any file handling."""
+    if isinstance(seq, PackedSeq):
+        newArr = _COMPLEMENT_LUT[seq.toArray()]
+        if not newArr.all():
+            raise Exception('Error: Non-DNA strands cannot be complemented.')
+        return(PackedSeq(newArr[::-1] if reverse else newArr, packed=seq.packed))
+    if seq.translate(_COMPLEMENT_INVALID):
+        raise Exception('Error: Non-DNA strands cannot be complemented.')
+    newSeq = seq.translate(_COMPLEMENT_TABLE)
+    return(newSeq[::-1] if reverse else newSeq)
+
 def getComplement(seq, silent=False, reverse=False): # 'silent' is internal use only
-    """Returns the complement of a given sequence, as a string.
-    DNA-exclusive. Supports ambiguous alleles, including unknowns
-    (as 'X' or 'N') and gaps (as '-'). Reverse complement is
-    dependent on providing reverse=True.
+    """Returns the complement of a given sequence, as a string (or as a
+    PackedSeq if given one). DNA-exclusive. Supports ambiguous alleles,
+    including unknowns (as 'X' or 'N') and gaps (as '-'). Reverse complement
+    is dependent on providing reverse=True.
+    If given a fasta/q, each record is complemented in turn and written out
+    to complemented.fa/complemented.fq, or to stdout if read from stdin ('-').
     """
     # TODO: Enable option to ignore ambiguous alleles, returning an error if present.
-    # TODO: Enable multi-contig fasta support.
-    # TODO: Enable fastq support.
-
-    # Check if seq was provided as a file, if so get the seq from that file.
-    if os.path.isfile(seq):
-        if (silent == False):
-            print("File input detected, reading into memory.")
-        fileSeq = ToDict(seq)
-        filetype = detectType(seq)
 
-        if filetype.lower() == "fasta": # {"contig_name": ["sequence"]}
-            if (len(fileSeq.values()) == 1):
-                for i in fileSeq.values():
-                    seq = ''.join(i)
-            else:
-                raise Exception("Multi-contig fastas currently not supported for complement.")
-        if filetype.lower() == "fastq":
-            raise Exception("fastq currently not supported for complement, please convert to fasta.")
-
-    revSeq = seq[::-1].upper()
-    newSeq = ""
-
-    for x in list(revSeq): # Loop this when implementing multi-contigs
-        if x == "A":
-            newSeq += "T"
-        elif x == "C":
-            newSeq += "G"
-        elif x == "G":
-            newSeq += "C"
-        elif x == "T":
-            newSeq += "A"
-        elif x == "Y":
-            newSeq += "R"
-        elif x == "R":
-            newSeq += "Y"
-        elif x == "W":
-            newSeq += "W"
-        elif x == "S":
-            newSeq += "S"
-        elif x == "K":
-            newSeq += "M"
-        elif x == "M":
-            newSeq += "K"
-        elif x == "D":
-            newSeq += "H"
-        elif x == "V":
-            newSeq += "B"
-        elif x == "H":
-            newSeq += "D"
-        elif x == "B":
-            newSeq += "V"
-        elif x == 'X':
-            newSeq += 'X'
-        elif x == 'N':
-            newSeq += 'N'
-        elif x == '-':
-            newSeq += '-'
-        else:
-            raise Exception('Error: Non-DNA strands cannot be complemented.')
-    if not reverse:
-        newSeq = newSeq[::-1]
+    if isinstance(seq, PackedSeq):
+        return(_complement(seq, reverse=reverse))
 
-    try: # Write out to file, if given as a file, consider making this a function.
-        if filetype.lower() == "fasta":
-            if (silent == False):
-                print('Writing output to complemented.fa')
-            outFile = open('complemented.fa','w')
-            outFile.write('>'+''.join(list(fileSeq.keys()))+'\n') # There should only be one of these
-            for line in [newSeq[i * 80:i * 80+80] for i,blah in enumerate(newSeq[::80])]:
-                outFile.write('%s\n' % line)
-            outFile.close()
-            if (silent == False):
-                print('Output written.')
-            return
-        elif filetype.lower() == "fastq":
-            pass # To be added later
-            return
-    except NameError:
-        pass # Handles non-file input of seq
+    # Check if seq was provided as a file, if so stream the records from that file.
+    # Records read from stdin ('-') are written to stdout, for use in pipelines.
+    if isInputFile(seq):
+        filetype = detectType(seq)
+        outName = 'complemented.fq' if filetype == 'fastq' else 'complemented.fa'
+        piped = seq == biozip.STDIN
+        if (silent == False and not piped):
+            print("File input detected, streaming records.")
+            print('Writing output to '+outName)
+        outFile = sys.stdout if piped else open(outName, 'w')
+        try:
+            for name, recSeq, qual in iterRecords(seq):
+                newSeq = _complement(recSeq, reverse=reverse)
+                if qual is None:
+                    outFile.write('>'+name+'\n')
+                    for i in range(0, len(newSeq), 80):
+                        outFile.write(newSeq[i:i+80]+'\n')
+                else:
+                    outFile.write('@'+name+'\n'+newSeq+'\n+\n'+(qual[::-1] if reverse else qual)+'\n')
+        finally:
+            if not piped:
+                outFile.close()
+        if (silent == False and not piped):
+            print('Output written.')
+        return
+
+    newSeq = _complement(seq.upper(), reverse=reverse)
 
     if __name__ == "__main__" and not silent: # for command line execution
         print("Complement: "+newSeq)
     return(newSeq)
 
+def fastqToFasta(fastq, outfile=None, processes=1):
+    """Given a fastq (or '-' for stdin), writes its reads as fasta, dropping
+    the base qualities, to outfile (default: the fastq name, less any
+    compression suffix and fastq extension, ending .fasta, e.g. reads.fq.gz
+    to reads.fasta, or stdout when reading stdin). Returns the output
+    location.
+    """
+    import biopipe
+    if outfile is None:
+        outfile = biozip.STDIN if fastq == biozip.STDIN else _stripExtensions(fastq) + '.fasta'
+        if os.path.exists(outfile):
+            raise Exception('Error: ' + outfile + ' already exists, please give an output file.')
+    biopipe.runPipeline(fastq, outfile, [('fasta', [])], processes=processes)
+    return(outfile)
+
 def getHeteroProb(k, m, n):
         """Returns the probability of gaining a dominate positive
         offspring for a pairing within a population where dominant (k),
@@ -428,150 +733,107 @@ def getHeteroProb(k, m, n):
         print(prob)
 
 def calcHamming(seqA, seqB):
-    """Calculate the Hamming distance between two sequences (as strings)
-    of equal length.
+    """Calculate the Hamming distance between two sequences (as strings
+    or PackedSeqs) of equal length.
     """
-    distH = 0
     if len(seqA) == len(seqB):
-        for index, value in enumerate(seqA):
-            if value != seqB[index]:
-                distH += 1
+        distH = int(np.count_nonzero(_asArray(seqA) != _asArray(seqB)))
     elif len(seqA) != len(seqB):
         print("Error: Sequences must be the same length!")
         return
     print(distH)
 
-def translate(seq, silent=False): # 'silent' is internal use only
-    """Given an RNA sequence, as a string, returns the protein
-    sequence. If given a DNA sequence, will attempt conversion
-    to RNA.
+def translate(seq, silent=False, code=1): # 'silent' is internal use only
+    """Given an RNA or DNA sequence, as a string, returns the protein
+    sequence of its first frame, with stops as '-'. Codons are looked up all
+    at once (see biotranslate), with any NCBI genetic code; codons with IUPAC
+    ambiguity codes translate if every codon they stand for agrees, else X.
     """
+    import biotranslate # Imported here as biotranslate itself depends on biocore
 
-    #Detects DNA and converts to RNA
-    if "T" in seq.upper():
-        if not silent:
-            print("Notice: DNA sequence detected, converting to RNA")
-    seq = transcribe(seq)
-
-    protein = ""
-    end = False
-    ticker = 0
-    RNAcodons = {"UUU": "F", "UUC": "F", "UUA": "L", "UUG": "L",
-                 "UCU": "S", "UCC": "S", "UCA": "S", "UCG": "S",
-                 "UAU": "Y", "UAC": "Y", "UAA": "-", "UAG": "-",
-                 "UGU": "C", "UGC": "C", "UGA": "-", "UGG": "W",
-                 "CUU": "L", "CUC": "L", "CUA": "L", "CUG": "L",
-                 "CCU": "P", "CCC": "P", "CCA": "P", "CCG": "P",
-                 "CAU": "H", "CAC": "H", "CAA": "Q", "CAG": "Q",
-                 "CGU": "R", "CGC": "R", "CGA": "R", "CGG": "R",
-                 "AUU": "I", "AUC": "I", "AUA": "I", "AUG": "M",
-                 "ACU": "T", "ACC": "T", "ACA": "T", "ACG": "T",
-                 "AAU": "N", "AAC": "N", "AAA": "K", "AAG": "K",
-                 "AGU": "S", "AGC": "S", "AGA": "R", "AGG": "R",
-                 "GUU": "V", "GUC": "V", "GUA": "V", "GUG": "V",
-                 "GCU": "A", "GCC": "A", "GCA": "A", "GCG": "A",
-                 "GAU": "D", "GAC": "D", "GAA": "E", "GAG": "E",
-                 "GGU": "G", "GGC": "G", "GGA": "G", "GGG": "G"}
-    while end == False:
-        fc = ticker
-        if len(seq[fc:fc+3]) < 3:
-            break
-        codon = seq[fc:fc+3]
-        protein += RNAcodons[codon]
-        ticker += 3
-        if fc+3 >= len(seq):
-            end = True
+    protein = biotranslate.translateSequence(seq, code=code, stop='-')
     if __name__ == "__main__": # for command line execution
         if not silent:
             print("Protein Sequence: "+protein)
     return(protein)
 
-def findMotif(motif, seq, vocal=False, asPrint=False):
+def findMotif(motif, seq, vocal=False, asPrint=False, processes=1):
     """When given a motif <string> and a fasta <file location> or
     sequence <string> returns the locations of that motif as a
     dictionary if a file is provided or a list if a string was provided.
+    IUPAC ambiguous bases in the motif are supported. For many motifs,
+    or to search both strands, see biosearch.searchMotifs.
+    Files may be searched in overlapping chunks over several processes.
     """
+    import biosearch # Imported here as biosearch itself depends on biocore
+
     # Force motif into uppercase to avoid case issues
     motif = motif.upper()
 
-    # CONVERT MOTIF TO List of lists?
-    motifGroups = []
-    for x in motif:
-        motifGroups.append(Idict[x])
-
     # Check is seq is a file or a sequence:
-    if (os.path.isfile(seq)): # if seq is a file
-        allSeqs = ToDict(seq) # convert fasta to dictionary
-        locationsDict = {}
-
-        for key in allSeqs: # Iterate over each sequence
+    if not isinstance(seq, (str, PackedSeq)):
+        # If not a file or string, abort with an error.
+        raise TypeError("Inappropriate datatype supplied, findMotif currently only accepts strings and fastas.")
+    elif isInputFile(seq): # if seq is a file
+        index = biosearch.loadTextIndex(seq)
+        if index is not None: # Use a prebuilt full-text index if available
             if (vocal):
-                print("Searching " + str(key) + "...")
-            # Force seq into uppercase to avoid case issues
-            seq = allSeqs[key][0].upper()
-
-            locations = []
-            mod = 1
-            for index, base in enumerate(seq): # Iterate over each base
-                if base in motifGroups[0]:
-                    while mod < len(motifGroups) and (index + mod) < len(seq):
-                        if seq[index+mod] in motifGroups[mod]:
-                            # Base match found, scan for whole motif
-                            mod += 1
-                        else:
-                            mod = 1 # Vital reset of mod on fail
-                            break
-                    if mod >= len(motifGroups):
-                        if (vocal):
-                            print("Whole motif found, adding location...")
-                        locations.append(index+1)
-                        mod = 1
-            if locations != []: # Only add to hits to locations if not empty
-                locationsDict[key] = locations
+                print("Searching full-text index...")
+            locationsDict = index.find(motif)
+        elif int(processes) > 1: # Chunks of shared memory over a process pool
+            import bioparallel
+            results = bioparallel.mapFile(seq, biosearch._motifChunk, (motif,), overlap=len(motif) - 1, processes=processes)
+            locationsDict = {}
+            for key, length, chunks in bioparallel.groupByContig(results):
+                locations = np.concatenate([hits + start + 1 for start, hits in chunks]).tolist()
+                if locations != []:
+                    locationsDict[key] = locations
+        else:
+            locationsDict = {}
+            for key, contig, qual in iterRecords(seq): # Iterate over each sequence
+                if (vocal):
+                    print("Searching " + str(key) + "...")
+                locations = (biosearch.matchMotif(contig, motif) + 1).tolist()
+                if (vocal):
+                    print(str(len(locations)) + " whole motif(s) found.")
+                if locations != []: # Only add to hits to locations if not empty
+                    locationsDict[key] = locations
         if asPrint:
             for keys,values in locationsDict.items():
                 print("Motif found starting at (bp):",keys,values)
         else:
             return(locationsDict) # Returns a dictionary of hits according to each strain/contig
-    elif (type(seq)) == str: # if seq is a string
-        # Force seq into uppercase to avoid case issues
-        seq = seq.upper()
-
-        locations = []
-        mod = 1
-        for index, base in enumerate(seq):
-            if base in motifGroups[0]:
-                while mod < len(motifGroups) and (index + mod) < len(seq):
-                    if seq[index+mod] in motifGroups[mod]:
-                        # Base match found, scan for whole motif
-                        mod += 1
-                    else:
-                        mod = 1 # Vital reset of mod on fail
-                        break
-                if mod >= len(motifGroups):
-                    if (vocal):
-                        print("Whole motif found, adding location...")
-                    locations.append(index+1)
-                    mod = 1
+    else: # if seq is a string
+        locations = (biosearch.matchMotif(seq, motif) + 1).tolist()
+        if (vocal):
+            print(str(len(locations)) + " whole motif(s) found.")
         if asPrint:
             print(len(locations),"motif(s) found starting at (bp):",locations)
         else:
             return(locations) # NB: locations is a dictionary for files and a list for strings
 
-    else:
-        # If not a file or string, abort with an error.
-        # Not that os.path.isfile will probably raise an error before this pops.
-        raise TypeError("Inappropriate datatype supplied, findMotif currently only accepts strings and fastas.")
-
 def countRepeats(motifs, ref):
     """Print the number of times a motif repeats within a larger
     sequence. Will work when given a string or a list of strings.
+    All motifs are searched for together in a single pass.
     """
+    import biosearch
+
     if (type(motifs) == str): # convert a single string into a one element list
         motifs = [motifs]
-    for motif in motifs:
-        motifDict = findMotif(motif, ref)
-        count = sum(len(i) for i in motifDict.itervalues())
+    index = None
+    if isInputFile(ref):
+        index = biosearch.loadTextIndex(ref)
+    if index is not None: # Counts come straight from the suffix array ranges
+        for motif in dict.fromkeys(i.upper() for i in motifs):
+            print(motif + ": " + str(index.count(motif)))
+        return
+
+    hits = biosearch.searchMotifs(motifs, ref, strands='+')
+    if not isInputFile(ref):
+        hits = {'sequence': hits}
+    for motif in dict.fromkeys(i.upper() for i in motifs):
+        count = sum(len(contigHits[motif]['+']) for contigHits in hits.values())
         print(motif + ": " + str(count))
 
 def findConsensus(fasta):
@@ -599,30 +861,29 @@ def findConsensus(fasta):
         print(consensus)
 
 def buildProfileMatrix(fasta):
-        """Return a profile matrix for a given set of strains."""
+        """Return a profile matrix for a given set of strains, provided as
+        a fasta/q or as a list of sequences (strings or PackedSeqs).
+        """
 
-        #pull sequences into a dictionary {strain: sequence}
-        fastaDict = ToDict(fasta)
+        #pull sequences into a list, one row per strain
+        if isInputFile(fasta):
+            seqs = [seq for name, seq, qual in iterRecords(fasta)]
+        else:
+            seqs = list(fasta)
 
         #check sequences are the same length, else abort
-        seqLens = set([len(seq[0]) for seq in fastaDict.values()])
+        seqLens = set([len(seq) for seq in seqs])
 
-        if len(seqLens) == 1:
-            seqLen = list(seqLens)[0]
-        else:
+        if len(seqLens) != 1:
             print("Error: Conflicting sequence lengths '{}'.".format(seqLens))
             sys.exit()
 
         base = ['A', 'C', 'G', 'T']
-        baseDict = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
         count = 0
 
-        #profile matrix
-        profile = [[0]*seqLen for i in range(4)]
-        for value in fastaDict.values():
-            for basePos, baseType in enumerate(value[0]):
-                profile[baseDict[baseType]][basePos] += 1
-                #NB: base position = y, base type = x
+        #profile matrix, NB: base position = y, base type = x
+        matrix = np.vstack([_UPPER[_asArray(seq)] for seq in seqs])
+        profile = [np.count_nonzero(matrix == ord(b), axis=0) for b in base]
 
         #print profile matrix
         for i, x in enumerate(profile):
@@ -630,18 +891,23 @@ def buildProfileMatrix(fasta):
                 print(base[count] + ": " + row)
                 count += 1
 
-def findKmers(reference, length):
+def findKmers(reference, length, canonical=False, processes=1):
     """Given a kmer length and a genome as a fasta, returns a dictionary
-    of kmers and their counts.
+    of kmers and their counts. Kmers of up to 32 bases are counted by the
+    integer-encoded engine in biokmers, which skips windows containing N
+    and can optionally count canonically or over several processes.
     """
-    refDict = ToDict(reference)
-    candidates = {} # sequence:count
+    length = int(length)
+
+    if length <= 32:
+        import biokmers # Imported here as biokmers itself depends on biocore
+        keys, counts = biokmers.countKmers(reference, length, canonical=canonical, processes=processes)
+        return(dict(zip(biokmers.decodeKmers(keys, length), counts.tolist())))
 
-    for key in refDict:
-        for i, base in enumerate(refDict[key][0]): # Focus on the seq for each contig
-            if i > len(refDict[key][0])-int(length): # Can this be encorporated into the for loop statement?
-                break;
-            window = refDict[key][0][i:i + int(length)] # Move across sequence with window
+    candidates = {} # sequence:count
+    for key, seq, qual in iterRecords(reference): # One contig in memory at a time
+        for i in range(len(seq) - length + 1):
+            window = seq[i:i + length] # Move across sequence with window
             if window not in candidates:
                 candidates[window] = 1
             elif window in candidates:
@@ -669,129 +935,76 @@ def predictMT(seq):
         mt = 64.9 + 41 * (GC - 16.4)/len(seq)
     print(mt)
 
-def simCleaveMulti(genomefile, enzyme, csite):
-    """The fasta/fastq multi-sequence gateway to simCleave.
+def simCleaveMulti(genomefile, enzyme, csite=None, processes=1):
+    """The fasta/fastq multi-sequence gateway to simCleave. Enzymes may be
+    given as a comma-separated list of names (see biodigest.ENZYMES) or as a
+    recognition site with its cleavage index. Records are digested over
+    several processes if requested, and a fragment size summary is printed.
     """
-    genomeS = ToDict(genomefile)
-    for strain in genomeS:
-        print("\nSimulating cleavage of "+strain+" by "+enzyme+"...")
-        simCleave(genomeS[strain][0], enzyme, csite)
+    import biodigest # Imported here as biodigest itself depends on biocore
+
+    if csite is None:
+        enzymes = [biodigest.getEnzyme(i) for i in enzyme.split(',')]
+    else:
+        enzymes = [biodigest.getEnzyme(enzyme, csite)]
+    biodigest.fragmentSummary(genomefile, enzymes, processes=processes)
 
-def simCleave(genome, enzyme, csite):
+def simCleave(genome, enzyme, csite=None):
     """Given a restriction enzyme's recognition site (string), the
     index at which it cleaves (int) and a sequence to cleave (string),
-    returns a list of the fragment lengths and a list of the fragment
-    sequences.
+    prints a list of the fragment lengths and a list of the fragment
+    sequences. The fragment start and end coordinates are returned as
+    NumPy arrays. Known enzymes may be given by name without a csite.
 
     E.g. for enzyme 'GCCG' with cleavage site 'GC|CG' csite = 2.
     NB: Non-specific base sites should be indicated with 'N'.
     NB: Both the genome and enzyme sequences should be provided 5'->3'.
     """
+    import biodigest
 
-    sites = []
-    fragLens = []
-    csite = int(csite)
-    enzyme = enzyme.upper()
-    enzymeComp = enzyme[::-1]
+    starts, ends = biodigest.digest(genome, [biodigest.getEnzyme(enzyme, csite)])
 
-    for i, baseG in enumerate(genome):
-        if (genome[i].upper() == enzyme[0]) or (enzyme[0] == "N"):
-            for j, baseE in enumerate(enzyme):
-                if (i+len(enzyme)) > len(genome): # if the enzyme would go beyond the given sequence
-                    break
-                if (enzyme[j] == genome[i+j].upper()) or (enzyme[j] == "N"):
-                    if (j + 1) == len(enzyme): #ie. if there is a complete match
-                        sites.append(i + csite)
-                else:
-                    break
-        elif (genome[i].upper() == enzymeComp[0]) or (enzymeComp[0] == "N"):
-            # NB: This loop only makes sense in regards to double-strained DNA
-            for l, baseC in enumerate(enzymeComp):
-                if (i+len(enzymeComp)) > len(genome):
-                    break
-                if (enzymeComp[l] == genome[i+l].upper()) or enzymeComp[l] == "N":
-                    if (l + 1) == len(enzyme):
-                        sites.append(len(enzymeComp) - csite)
-                else:
-                    break
-    for k in sites[::-1]: #go over the cleavage sites in reverse
-        genome = genome[:k] + '\n' + genome[k:]
-    genome = genome.split('\n')
+    print(sorted((ends - starts).tolist(), reverse=True))
+    print(sorted([genome[i:j] for i, j in zip(starts, ends)], key=len, reverse=True))
+    return(starts, ends)
 
-    for fragment in genome:
-        fragLens.append(len(fragment))
-
-    print(sorted(fragLens, reverse=True))
-    print(sorted(genome, key=len, reverse=True))
-
-def simPCRMulti(genomefile, primer1, primer2, passmark=90):
-    """The fasta/fastq multi-sequence gateway to simPCR.
+def simPCRMulti(genomefile, primer1, primer2, passmark=90, processes=1):
+    """The fasta/fastq multi-sequence gateway to simPCR. Records may be
+    searched in overlapping chunks over several processes.
     """
-    genomeS = ToDict(genomefile)
-    for strain in genomeS:
+    import biopcr
+
+    for strain, amplicons, frags in biopcr.ampliconsMulti(genomefile, primer1, primer2, passmark, processes=processes):
         print("\nSimulating PCR of "+strain+" by "+primer1+" and "+primer2+"...")
-        simPCR(genomeS[strain][0], primer1, primer2, passmark)
+        print(sorted((amplicons['end'] - amplicons['start']).tolist(), reverse=True))
+        print(sorted([i.upper() for i in frags], key=len, reverse=True))
 
-def simPCR(sequence, primer1, primer2, passmark=90):
+def simPCR(sequence, primer1, primer2, passmark=90, maxAmplicon=10000):
     """Given strings for a base sequence and two primer sequences,
     returns the fragment/s that PCR amplification would produce.
-    NB: Primer A should be 5' to 3', whilst Primer B should be a complement 3' to 5'.
+    Each primer must match with at least passmark percent identity, products
+    may come from either strand and are limited to maxAmplicon bases.
+    Fragments are printed, and returned as an array of amplicon coordinates
+    (see biopcr.findAmplicons).
+    NB: Both primers should be given 5' to 3', as ordered: primer1 the forward
+    primer and primer2 the reverse primer (not its complement).
     """
-    sequence = sequence.upper()
-
-    primer = primer1.upper()
-    complement = getComplement(primer2.upper(),silent=True)[::-1]
-
-    frags = []
-    fraglens = []
+    import biopcr # Imported here as biopcr itself depends on biocore
 
-    csites = []
-    fragstmp = []
+    amplicons = biopcr.findAmplicons(sequence, primer1, primer2, passmark=passmark, maxAmplicon=maxAmplicon)
+    frags = [sequence[start:end].upper() for start, end in zip(amplicons['start'], amplicons['end'])]
 
-    for i, base in enumerate(sequence): # for each base in sequence
-        count = 0 # reset match counter
-        total = len(primer)
-        for j, baseP in enumerate(primer): # for each base in primerA
-            if i+len(primer) > len(sequence): # prevent overhanging matches
-                break
-            if primer[j] == sequence[i+j]: # if seq base matches primer base
-                count += 1
-            if ((j+1)==len(primer)) & (((count/total)*100)>=passmark):
-                # if at end of primer & match >= PASSMARK
-                csites.append(i) # add cleavage site to list
-    for k in csites: # perform cleavage by primer sites
-        fragstmp.append(sequence[k:]) # fragments produced from step 1
-
-    for fragment in fragstmp: # apply complement primerB to cleavage on fragments
-        csites = []
-        for i, base in enumerate(fragment): # for each base in fragment
-            count = 0
-            total = len(complement)
-            for j, baseP in enumerate(complement): # for each base in primerB
-                if i+len(complement) > len(fragment): # prevent overhanging matches
-                    break
-                if complement[j] == fragment[i+j]:
-                    count += 1
-                if ((j+1)==len(complement)) & (((count/total)*100)>=passmark):
-                    # if at end of complement primer & good enough match
-                    csites.append(i+j+1) # add cleavage site to list
-        for l in csites:
-            frags.append(fragment[:l]) # fragments produced from all cleavage events
-    for piece in frags:
-        fraglens.append(len(piece))
-    print(sorted(fraglens, reverse=True))
+    print(sorted((amplicons['end'] - amplicons['start']).tolist(), reverse=True))
     print(sorted(frags, key=len, reverse=True))
+    return(amplicons)
 
 def scaffoldToContigs(infile, outfile):
-    """Given a scaffolded genome as a fasta, returns a fasta of the
-    contigs with a given output name.
+    """Given a scaffolded genome as a fasta/q (optionally compressed), returns
+    a fasta of the contigs with a given output name.
     Note that this approach will remove the > identifier.
     """
     wholeGenome = ToList(infile)
 
-    # TODO: Allow fasta and fastq distinction?
-    # TODO: Allow input with more than a single > line
-
     with open(outfile, 'w') as f:
         count = 0
         for contig in wholeGenome:
@@ -801,10 +1014,13 @@ def scaffoldToContigs(infile, outfile):
             f.write(contig+'\n')
             count += 1
 
-def AAchange(snp, gene):
+def AAchange(snp, gene, code=1):
     """Given a gene sequence and SNP, return the amino acid change.
+    Only the codon the SNP falls in is translated (see biovariant for
+    annotating many variants against a reference at once).
     """
     ## As predictMutation('4-A','GATCATGCATGCAGACTAGCATCGA')
+    import biotranslate # Imported here as biotranslate itself depends on biocore
 
     # Set SNP variables
     if '-' not in snp:
@@ -813,20 +1029,15 @@ def AAchange(snp, gene):
     snpLoc = int(snp.split('-')[0]) - 1
     snpAllele = str(snp.split('-')[1])
 
-    # SNP location to AA location
+    # SNP location to AA location, and the codon either side
     AAloc = snpLoc // 3
+    refCodon = gene[AAloc*3:AAloc*3+3]
+    newCodon = refCodon[:snpLoc % 3] + snpAllele + refCodon[snpLoc % 3 + 1:]
 
-    # Reference amino acid sequence
-    refAA = translate(gene, silent=True)
+    refAA = biotranslate.translateSequence(refCodon, code=code, stop='-')
+    newAA = biotranslate.translateSequence(newCodon, code=code, stop='-')
 
-    # Mutate sequence
-    newGene = list(gene)
-    newGene[snpLoc] = snpAllele
-    newGene = "".join(newGene)
-
-    newAA = translate(newGene, silent=True)
-
-    print('AA Change: '+refAA[AAloc]+str(AAloc+1)+newAA[AAloc]) # e.g. AA Change: Y412G
+    print('AA Change: '+refAA+str(AAloc+1)+newAA) # e.g. AA Change: Y412G
 
 def PosToAA(GivenPosition):
     """Given a base index, return two integers referring to the equivalent amino
@@ -836,50 +1047,41 @@ def PosToAA(GivenPosition):
     PositionInCodon = (((GivenPosition)-1) % 3)+1
     return(Codon,PositionInCodon)
 
-def BPtoPos(GivenPosition,Contigs):
-    """Given a genomic position and a list of exon base positions, return an
-    amino acid position as a tuple of two integers (amino acid, base within AA).
-    """
-
-    GivenPosition = int(GivenPosition)
-
+def _exonMap(Contigs):
+    """Build a biocoords.ExonMap from contigs given as a file or string."""
     if os.path.isfile(Contigs):
         print('Processing contigs as file input.')
-        contigs = ReadContigsFile(Contigs)
     else:
         print('Processing contigs as command line input.')
-        contigs = ReadContigsCMD(Contigs)
+    return(biocoords.ExonMap.parse(Contigs))
 
-    if GivenPosition not in contigs: # NB: this catches all non-exonic regions, not just introns
-        return('Position: ' + str(GivenPosition) + ' [Intronic]')
-    else:
-        # Grab base index of given position in contigs
-        GenePosition = [i+1 for i, x in enumerate(contigs) if x == GivenPosition]
-
-        # Check we're not getting duplicate positions
-        if len(GenePosition) > 1:
-            raise Exception('Error: Duplicate position/s found in contigs.')
+def _queries(Given):
+    """Return one or more positions given as an integer or a file of them."""
+    if isinstance(Given, str) and os.path.isfile(Given):
+        return(biocoords.readQueries(Given))
+    return(np.array([int(Given)], dtype=np.int64))
 
-        AApos = PosToAA(GenePosition[0])
-        return('Position: ' + str(GivenPosition) + ' [' + str(AApos[0]) + ':' + str(AApos[1]) + ']')
+def BPtoPos(GivenPosition,Contigs):
+    """Given a genomic position (or a file of them, one per line) and exons as
+    'bpA:bpB,bpC:bpD' (or a file of them), return each position's amino acid
+    position as 'Position: X [amino acid:base within AA]', one per line.
+    """
+    positions = _queries(GivenPosition)
+    codons, bases = _exonMap(Contigs).toAA(positions)
+    # NB: non-coding positions (codon 0) are all non-exonic regions, not just introns
+    return('\n'.join('Position: ' + str(position) + (' [Intronic]' if not codon else ' [' + str(codon) + ':' + str(base) + ']')
+                     for position, codon, base in zip(positions.tolist(), codons.tolist(), bases.tolist())))
 
 def AAtoPos(GivenCodon,Contigs):
-    """Given a codon number, return a list of the three possible positions
-    relative to that gene's contig.
+    """Given a codon number (or a file of them, one per line), return the
+    three positions relative to that gene's contig, one codon per line.
     """
-
-    GivenCodon = int(GivenCodon)
-
-    if os.path.isfile(Contigs):
-        print('Processing contigs as file input.')
-        contigs = ReadContigsFile(Contigs)
-    else:
-        print('Processing contigs as command line input.')
-        contigs = ReadContigsCMD(Contigs)
-
-    AArange = [contigs[(GivenCodon*3)-3], contigs[(GivenCodon*3)-2], contigs[(GivenCodon*3)-1]]
-
-    return('Codon ' + str(GivenCodon) + ' corresponds to positions ' + str(AArange))
+    exonMap = _exonMap(Contigs)
+    codons = _queries(GivenCodon)
+    if np.any(codons < 1) or np.any(codons > exonMap.length // 3):
+        raise Exception('Error: Codon/s outside the ' + str(exonMap.length // 3) + ' codons of the given contigs.')
+    return('\n'.join('Codon ' + str(codon) + ' corresponds to positions ' + str(positions)
+                     for codon, positions in zip(codons.tolist(), exonMap.codonToGenomic(codons).tolist())))
 
 def contigExtract(fasta_location,contigs):
     '''Given a fasta location and contig name/s, produce a subset of that fasta.'''
@@ -887,7 +1089,15 @@ def contigExtract(fasta_location,contigs):
         raise Exception('Error: Given file (' + fasta_location + ') does not exist.')
         return
     contigs = contigs.split(',')
-    fasta = ToDict(fasta_location)
+    if detectType(fasta_location) == 'fasta':
+        index = readIndex(fasta_location)
+        fasta = {}
+        for contig in contigs:
+            if _indexKey(index, contig) is None:
+                raise Exception('Error: Given contig name not present in fasta/q.')
+            fasta[contig] = [fetchSeq(fasta_location, contig, index=index)]
+    else:
+        fasta = dict((name, [seq]) for name, seq, qual in iterRecords(fasta_location) if name in contigs)
     for contig in contigs:
         if contig not in fasta.keys():
             raise Exception('Error: Given contig name not present in fasta/q.')
@@ -896,54 +1106,42 @@ def contigExtract(fasta_location,contigs):
         writeFasta(titles=contig, sequences=fasta[contig], filename=outname)
 
 def seqExtract(fasta_location,location):
-    '''Given a fasta and a sequence location, return that sequence.'''
+    '''Given a fasta and a sequence location, return that sequence.
+    Fastas are read via their .fai index, so only the requested region is read.
+    '''
     if not os.path.isfile(fasta_location):
         raise Exception('Error: Given file (' + fasta_location + ') does not exist.')
         return
-    if location.count('-') is not 2:
+    if location.count('-') != 2:
         raise Exception("Error: Location must be passed as 'contig-start-end'.")
         return
     contig, bpA, bpB = location.split('-')
-    fasta = ToDict(fasta_location)
-    if contig not in fasta.keys():
-        raise Exception('Error: Given contig name not present in fasta/q.')
+    if detectType(fasta_location) == 'fasta':
+        print(fetchSeq(fasta_location, contig, int(bpA), int(bpB)))
         return
-    print(fasta[contig][0][int(bpA)-1:int(bpB)])
-
-def findLongestPalindrome(seq, threshold=1.0, minWindowSize=4, complement=True):
-    '''Given a sequence, find the longest length palindromes for a given threshold.'''
-    palindromes = []
-    matchPercents = []
-    locations = []
-    lengths = []
-
-    for windowSize in range(len(seq), -1, -1):
-        if len(palindromes) != 0:
-            print('Sequence length: {0}'.format(len(seq)))
-            print('{0} palindromes identified:'.format(len(palindromes)))
-            print('Pos\tLen\tMatch\tSeq')
-            for i in range(len(palindromes)):
-                print('{}\t{}\t{}\t{}'.format(locations[i],lengths[i],matchPercents[i], palindromes[i]))
+    for name, seq, qual in iterRecords(fasta_location):
+        if name == contig:
+            print(seq[int(bpA)-1:int(bpB)])
             return
-        if windowSize < minWindowSize:
-            return('0 palindromes identified.')
-        divider = int(windowSize / 2)
-
-        for n in range(len(seq)-windowSize+1):
-            seqWindow = seq[n:n+windowSize]
-
-            seqA = seqWindow[:divider]
-            seqB = getComplement(seqWindow[divider:], silent=True, reverse=False)[::-1] if complement else seqWindow[divider:][::-1]
+    raise Exception('Error: Given contig name not present in fasta/q.')
 
-            # Get count & percentage matches
-            matches = [True if base == seqB[index] else False for index, base in enumerate(seqA)]
-            perc_matches = sum(matches) / len(matches)
-
-            if perc_matches >= threshold:
-                palindromes.append(seqWindow)
-                matchPercents.append(round(perc_matches,3))
-                locations.append('{0}-{1}'.format(n+1, n+1+windowSize))
-                lengths.append(len(seqWindow))
+def findLongestPalindrome(seq, threshold=1.0, minWindowSize=4, complement=True):
+    '''Given a sequence, find the longest length palindromes for a given threshold.
+    Exact palindromes are found in linear time, and palindromes with mismatches
+    by scoring every centre at once (see biopalindrome for genome-wide scans).'''
+    import biopalindrome # Imported here as biopalindrome itself depends on biocore
+
+    palindromes = biopalindrome.findPalindromes(seq, minWindowSize, threshold, complement, maxLength=len(seq))
+    if len(palindromes) == 0:
+        return('0 palindromes identified.')
+    lengths = palindromes['end'] - palindromes['start']
+    longest = palindromes[lengths == lengths.max()]
+
+    print('Sequence length: {0}'.format(len(seq)))
+    print('{0} palindromes identified:'.format(len(longest)))
+    print('Pos\tLen\tMatch\tSeq')
+    for start, end, identity in longest.tolist():
+        print('{}\t{}\t{}\t{}'.format('{0}-{1}'.format(start+1, end+1), end-start, round(identity,3), seq[start:end]))
 
 def howPalindromic(seq, complement=True):
     '''Given a sequence, return how well part A matches part B with or without complement.'''
@@ -977,7 +1175,7 @@ def howPalindromic(seq, complement=True):
 def main(args):
     # args[0] = subfunction to be called, args[1:] = input arguments for args[0].
     # e.g. if 'mt', call predictMT() with arguments
-    if len(args) == 1 and args[0].lower() != 'fasta':
+    if len(args) == 1 and args[0].lower() not in ('fasta', 'enzymes'):
         print("Warning: No arguments sent to function.")
     if args[0].lower() == "predictmt":
         if len(args) >= 2:
@@ -985,10 +1183,29 @@ def main(args):
         else:
             return("Required arguments: <sequence:str>")
     if args[0].lower() == "findkmers":
-        if len(args) >= 2:
-            findKmers(args[1], args[2])
+        if len(args) >= 3:
+            import biokmers
+            options = {'canonical': False, 'hist': False, 'disk': False, 'top': None, 'outfile': None, 'processes': 1}
+            extra = iter(args[3:])
+            for arg in extra:
+                if arg.lower() in ('canonical', 'hist', 'disk'):
+                    options[arg.lower()] = True
+                elif arg.lower() == 'top':
+                    options['top'] = int(next(extra))
+                elif arg.lower() == 'out':
+                    options['outfile'] = next(extra)
+                elif arg.lower() == 'threads':
+                    options['processes'] = int(next(extra))
+            biokmers.reportKmers(args[1], args[2], **options)
+        else:
+            return("Required arguments: <genome:fasta/q> <length:int> (canonical) (top <n:int> | hist | out <file>) (threads <n:int>) (disk)")
+    if args[0].lower() == "kmerlookup":
+        if len(args) >= 3:
+            import biokmers
+            for kmer, count in biokmers.lookupKmers(args[1], args[2].split(',')).items():
+                print("{}\t{}".format(kmer, count))
         else:
-            return("Required arguments: <genome:fasta/q> <length:int>")
+            return("Required arguments: <kmer_counts:file> <kmers:comma-separated str>")
     if args[0].lower() == "consensus":
         if len(args) >= 2:
             findConsensus(args[1])
@@ -1001,40 +1218,125 @@ def main(args):
             return("Required arguments: <sequences:fasta/q>")
     if args[0].lower() == "translate":
         if len(args) >= 2:
-            translate(args[1])
+            code = int(args[args.index('code') + 1]) if 'code' in args[2:] else 1
+            if 'frames' in args[2:]:
+                import biotranslate
+                for frame, protein in biotranslate.sixFrames(args[1], code=code):
+                    print(frame + "\t" + protein)
+            else:
+                translate(args[1], code=code)
+        else:
+            return("Required arguments: <rna:str> (code <int>) (frames)")
+    if args[0].lower() == "orfs":
+        if len(args) >= 2:
+            import biotranslate
+            options = {'minLength': 100, 'code': 1, 'startCodons': None, 'partial': False, 'processes': 1}
+            prefix = os.path.splitext(os.path.basename(args[1]))[0] + '.orfs' if isInputFile(args[1]) else 'sequence.orfs'
+            extra = iter(args[2:])
+            for arg in extra:
+                if arg.lower() == 'min':
+                    options['minLength'] = int(next(extra))
+                elif arg.lower() == 'code':
+                    options['code'] = int(next(extra))
+                elif arg.lower() == 'starts':
+                    starts = next(extra)
+                    options['startCodons'] = [] if starts.lower() == 'none' else starts.upper().split(',')
+                elif arg.lower() == 'partial':
+                    options['partial'] = True
+                elif arg.lower() == 'threads':
+                    options['processes'] = int(next(extra))
+                elif arg.lower() == 'out':
+                    prefix = next(extra)
+            found = biotranslate.writeORFs(args[1], prefix, **options)
+            print("{} ORFs written to {}.faa and {}.gff.".format(found, prefix, prefix))
         else:
-            return("Required arguments: <rna:str>")
+            return("Required arguments: <fasta:file_location or sequence:str> (min <aa:int>) (code <int>) (starts <codon,...|none>) (partial) (threads <int>) (out <prefix>)")
     if args[0].lower() == "transcribe":
         if len(args) >= 2:
             transcribe(args[1], asPrint=True)
         else:
             return("Required arguments: <sequence:str>")
     if args[0].lower() == "simcleave":
-        if len(args) >= 2:
-            simCleave(args[1], args[2], args[3])
+        if len(args) >= 3:
+            simCleave(args[1], args[2], args[3] if len(args) >= 4 else None)
         else:
-            return("Required arguments: <sequence:str> <enzyme:str> <cleavage_site:int>")
+            return("Required arguments: <sequence:str> <enzyme:str> <cleavage_site:int>\nNB: Known enzymes may be given by name without a cleavage site.")
     if args[0].lower() == "simcleavemulti":
-        if len(args) >= 2:
-            simCleaveMulti(args[1], args[2], args[3])
+        if len(args) >= 3:
+            csite = None
+            processes = 1
+            extra = iter(args[3:])
+            for arg in extra:
+                if arg.lower() == 'threads':
+                    processes = int(next(extra))
+                else:
+                    csite = arg
+            simCleaveMulti(args[1], args[2], csite, processes)
         else:
-            return("Required arguments: <sequences:file> <enzyme:str> <cleavage_site:int>")
+            return("Required arguments: <sequences:file> <enzyme:str> <cleavage_site:int> (threads <n:int>)\nNB: Known enzymes may be given by name, comma-separated, without a cleavage site.")
+    if args[0].lower() == "enzymes":
+        import biodigest
+        for name in sorted(biodigest.ENZYMES, key=str.lower):
+            site, cut5, cut3 = biodigest.ENZYMES[name]
+            kind, sequence = biodigest.overhang(name)
+            print('{}\t{}\t{}/{}\t{} {}'.format(name, site, cut5, cut3, kind, sequence).rstrip())
     if args[0].lower() == "simpcr":
-        if len(args) >= 2:
+        if len(args) >= 4:
             if len(args) == 4:
                 simPCR(args[1], args[2], args[3])
             elif len(args) == 5:
-                simPCR(args[1], args[2], args[3], args[4])
+                simPCR(args[1], args[2], args[3], float(args[4]))
+            else:
+                simPCR(args[1], args[2], args[3], float(args[4]), int(args[5]))
         else:
-            return("Required arguments: <sequence:str> <primer1:str> <primer2:str>")
+            return("Required arguments: <sequence:str> <primer1:str> <primer2:str> (<passmark:float>) (<max_amplicon:int>)")
     if args[0].lower() == "simpcrmulti":
+        if len(args) >= 4:
+            passmark = 90
+            processes = 1
+            extra = iter(args[4:])
+            for arg in extra:
+                if arg.lower() == 'threads':
+                    processes = int(next(extra))
+                else:
+                    passmark = float(arg)
+            simPCRMulti(args[1], args[2], args[3], passmark, processes)
+        else:
+            return("Required arguments: <sequences:location> <primer1:str> <primer2:str> (<passmark:float>) (threads <n:int>)")
+    if args[0].lower() == "pipe":
+        if len(args) >= 3:
+            import biopipe
+            processes = 1
+            if 'threads' in [i.lower() for i in args]:
+                at = [i.lower() for i in args].index('threads')
+                processes = int(args[at + 1])
+                args = args[:at] + args[at + 2:]
+            stages = biopipe.parseStages(args[3:])
+            read, written = biopipe.runPipeline(args[1], args[2], stages, processes=processes)
+            sys.stderr.write("{} records read, {} written.\n".format(read, written))
+        else:
+            return("Required arguments: <input:fasta/q or -> <output:file or -> (stages) (threads <n:int>)\n"
+                   +"Stages, applied in order: fasta, trim (<window:int> <quality:int> <offset:int, 33 or 64>), minlen <n:int>, maxlen <n:int>, "
+                   +"maxn <count or fraction>, revcomp, subsample <fraction:float> (<seed:int>)")
+    if args[0].lower() == "fastqtofasta":
         if len(args) >= 2:
-            if len(args) == 4:
-                simPCRMulti(args[1], args[2], args[3])
-            elif len(args) == 5:
-                simPCRMulti(args[1], args[2], args[3], int(args[4]))
+            print(fastqToFasta(args[1], args[2] if len(args) > 2 else None))
+        else:
+            return("Required arguments: <fastq> (<output:fasta>)")
+    if args[0].lower() == "simpcrbatch":
+        if len(args) >= 4:
+            import biopcr
+            passmark = 90
+            processes = 1
+            extra = iter(args[4:])
+            for arg in extra:
+                if arg.lower() == 'threads':
+                    processes = int(next(extra))
+                else:
+                    passmark = float(arg)
+            biopcr.batchPCR(args[1], args[2], args[3], passmark=passmark, processes=processes)
         else:
-            return("Required arguments: <sequences:location> <primer1:str> <primer2:str>")
+            return("Required arguments: <primer_panel:tsv> <genomes:directory, glob or comma-separated files> <output:tsv> (<passmark:float>) (threads <n:int>)")
     if args[0].lower() == "complement":
         if len(args) >= 2:
             getComplement(args[1])
@@ -1057,24 +1359,63 @@ def main(args):
             return("Required arguments: <infile:file_location> <outfile:str>")
     if args[0].lower() == "findmotif":
         if len(args) >= 3:
-            findMotif(args[1], args[2], vocal=False, asPrint=True)
+            processes = int(args[4]) if len(args) >= 5 and args[3].lower() == 'threads' else 1
+            findMotif(args[1], args[2], vocal=False, asPrint=True, processes=processes)
+        else:
+            return("Required arguments: <motif:str> <fasta:file_location> (threads <n:int>)")
+    if args[0].lower() == "findmotifs":
+        if len(args) >= 3:
+            import biosearch
+            biosearch.reportMotifs(args[1], args[2], strands='+' if 'forward' in args[3:] else 'both')
         else:
-            return("Required arguments: <motif:str> <fasta:file_location>")
+            return("Required arguments: <motifs:file_location or comma-separated str> <fasta:file_location or sequence:str> (forward)")
+    if args[0].lower() == "buildindex":
+        if len(args) >= 2:
+            import biosearch
+            biosearch.buildTextIndex(args[1])
+            print("Full-text index written alongside " + args[1])
+        else:
+            return("Required arguments: <fasta:file_location>")
     if args[0].lower() == 'aachange':
         if len(args) >= 3:
             AAchange(args[1], args[2])
         else:
             return("Required arguments: <snp:location_int-allele_str> <sequence:str>")
+    if args[0].lower() == 'annotate':
+        if len(args) >= 4:
+            import biovariant
+            outfile = args[args.index('out') + 1] if 'out' in args[4:] else None
+            code = int(args[args.index('code') + 1]) if 'code' in args[4:] else 1
+            counts = biovariant.annotateVariants(args[1], args[2], args[3], outfile=outfile, code=code)
+            if outfile:
+                print(', '.join('{}: {}'.format(effect, count) for effect, count in sorted(counts.items())))
+        else:
+            return("Required arguments: <variants:vcf or tsv> <reference:fasta> <cds:tsv of gene, contig, 'bpA:bpB,bpC:bpD'> (out <file>) (code <int>)")
+    if args[0].lower() == 'geneindex':
+        if len(args) >= 2:
+            path = args[args.index('out') + 1] if 'out' in args[2:] else None
+            index = biocoords.buildGeneIndex(args[1], path)
+            print("Index of {} transcripts on {} contigs written to {}".format(len(index.transcripts), len(index.contigs), path or biocoords.indexFile(args[1])))
+        else:
+            return("Required arguments: <annotation:gff3> (out <index:npz>)")
+    if args[0].lower() == 'locate':
+        if len(args) >= 3:
+            outfile = args[args.index('out') + 1] if 'out' in args[3:] else None
+            queries, hits = biocoords.reportLoci(args[1], args[2], outfile=outfile)
+            if outfile:
+                print("{} positions located, {} coding hits written to {}.".format(queries, hits, outfile))
+        else:
+            return("Required arguments: <positions:vcf or tsv of contig, position> <annotation:gff3 or index npz> (out <file>)")
     if args[0].lower() == 'bptoaa':
         if len(args) >= 3:
             print(BPtoPos(args[1],args[2]))
         else:
-            return("Required arguments: <position:int> <contigs:file_location str>\nNB: Contigs should be formatted as 'bpA:bpB,bpC:bpD'")
+            return("Required arguments: <position:int or file_location> <contigs:file_location or str>\nNB: Contigs should be formatted as 'bpA:bpB,bpC:bpD'")
     if args[0].lower() == 'aatobp':
         if len(args) >= 3:
             print(AAtoPos(args[1],args[2]))
         else:
-            return("Required arguments: <codon_number:int> <contigs:file_location or str>\nNB: Contigs should be formatted as 'bpA:bpB,bpC:bpD'")
+            return("Required arguments: <codon_number:int or file_location> <contigs:file_location or str>\nNB: Contigs should be formatted as 'bpA:bpB,bpC:bpD'")
     if args[0].lower() == 'contigextract':
         if len(args) == 3:
             contigExtract(args[1],args[2])
@@ -1086,13 +1427,38 @@ def main(args):
         else:
             return("Required arguments: <fasta_location:path> <location:contig-bpA-bpB>")
     if args[0].lower() == 'fasta':
-        if len(args) == 1:
-            createFasta()
-        elif len(args) == 2:
-            if args[1] in ['DNA','DNA+','RNA','PROTEIN']:
-                createFasta(bases=args[1])
+        options = {}
+        extra = iter(args[1:])
+        for arg in extra:
+            if arg.upper() in ['DNA','DNA+','RNA','PROTEIN']:
+                options['bases'] = arg.upper()
+            elif arg.lower() == 'lengths':
+                options['sequenceLens'] = [int(i) for i in next(extra).split(',')]
+            elif arg.lower() == 'gc':
+                options['GCbias'] = float(next(extra))
+            elif arg.lower() == 'out':
+                options['filename'] = next(extra)
+            elif arg.lower() == 'seed':
+                options['seed'] = int(next(extra))
+            else:
+                return("Optional arguments: <DNA|DNA+|RNA|PROTEIN> (lengths <int,int,...>) (gc <float>) (out <file>) (seed <int>)")
+        createFasta(**options)
+    if args[0].lower() == 'simreads':
+        if len(args) >= 3:
+            import biosim
+            options = {'readLength': 150, 'seed': None}
+            outfile = os.path.splitext(os.path.basename(args[1]))[0] + '.sim.fastq'
+            extra = iter(args[3:])
+            for arg in extra:
+                if arg.lower() == 'length':
+                    options['readLength'] = int(next(extra))
+                elif arg.lower() == 'out':
+                    outfile = next(extra)
+                elif arg.lower() == 'seed':
+                    options['seed'] = int(next(extra))
+            print("{} reads written to {}.".format(biosim.writeReads(outfile, args[1], int(args[2]), **options), outfile))
         else:
-            return("Additional arguments currently not accessible via command line.")
+            return("Required arguments: <fasta:file_location> <reads:int> (length <int>) (out <file>) (seed <int>)")
     if args[0].lower() == 'palindrome':
         threshold = 1.0
         complement = True
@@ -1112,6 +1478,27 @@ def main(args):
                 findLongestPalindrome(args[1], threshold=threshold, complement=complement)
         else:
             return("Required arguments: <sequence:string> (<threshold:float>) (<complement:boolean>)\n- Nb: Pass 'max' to determine palindrome score for whole sequence.")
+    if args[0].lower() == 'palindromes':
+        if len(args) >= 2:
+            import biopalindrome
+            options = {'minLength': 10, 'threshold': 1.0, 'complement': True, 'maxLength': biopalindrome.MAX_LENGTH, 'outfile': None}
+            extra = iter(args[2:])
+            for arg in extra:
+                if arg.lower() == 'min':
+                    options['minLength'] = int(next(extra))
+                elif arg.lower() == 'max':
+                    options['maxLength'] = int(next(extra))
+                elif arg.lower() == 'threshold':
+                    options['threshold'] = float(next(extra))
+                elif arg.lower() == 'mirror':
+                    options['complement'] = False
+                elif arg.lower() == 'out':
+                    options['outfile'] = next(extra)
+            found = biopalindrome.reportPalindromes(args[1], **options)
+            if options['outfile']:
+                print("{} palindromes written to {}.".format(found, options['outfile']))
+        else:
+            return("Required arguments: <fasta:file_location or sequence:str> (min <int>) (threshold <float>) (max <int>) (mirror) (out <file>)")
     # else:
     #     print("Operation aborted: Function not recognised.")
     #     sys.exit()
@@ -1124,18 +1511,29 @@ if __name__ == "__main__":
         print("\nUsage: biocore <command> <arguments>\n\nCommands:\n"
             +"predictMT\tRough melting temperature prediction\n"
             +"findkmers\tFind kmers of given length within a fasta\n"
+            +"kmerlookup\tLook up kmer counts in a binary kmer count file\n"
             +"translate\tTranslate from DNA/RNA to Protein, auto-detects\n"
+            +"orfs\t\tCall ORFs in six frames, writing protein fasta and GFF\n"
             +"transcribe\tTranscribe from RNA/DNA to DNA/RNA, auto-detects\n"
             +"complement\tFind the complement of a DNA sequence\n"
             +"revcomplement\tFind the reverse complement of a DNA sequence\n"
+            +"fastqToFasta\tConvert a fastq to fasta, dropping base qualities\n"
+            +"pipe\t\tStream reads through trimming, filtering, conversion and subsampling stages\n"
             +"calcHamming\tDetermine the Hamming distance between two sequences\n"
             +"simCleave\tSimulate cleavage of a sequence by a given enzyme\n"
             +"simCleaveMulti\tsimCleave for multiple sequences provided as a fasta/q\n"
+            +"enzymes\t\tList the built-in restriction enzymes\n"
             +"simPCR\t\tPredict PCR fragments of a given sequence and two primers\n"
             +"simPCRMulti\tsimPCR for multiple sequences provided as a fasta/q\n"
+            +"simPCRBatch\tRun a primer panel against many genomes, writing one table\n"
             +"scaffToContigs\tConvert single scaffold genome to contigs\n"
             +"findMotif\tGiven a motif, find start positions in fasta file or sequence\n"
+            +"findMotifs\tFind many motifs on both strands in a single pass\n"
+            +"buildIndex\tBuild a full-text (suffix array) index for repeated motif searches\n"
             +"AAchange\tPredict AA change from SNP and gene sequence\n"
+            +"annotate\tPredict the coding effect of every variant in a VCF\n"
+            +"geneIndex\tIndex the CDS features of a GFF3 annotation for locate\n"
+            +"locate\t\tFind the gene, CDS position and codon of many genomic positions\n"
             +"BPtoAA\t\tConvert a genomic position to an amino acid position\n"
             +"AAtoBP\t\tConvert an amino acid position to genomic positions\n"
             +"consensus\tFind a consensus sequence for a multi-contig fasta/q\n"
@@ -1143,7 +1541,9 @@ if __name__ == "__main__":
             +"contigextract\tWrite out specified contigs from a fasta/q file.\n"
             +"seqextract\tWrite out a specific sequence from a fasta/q file.\n"
             +"fasta\t\tCreate a randomised example fasta file.\n"
-            +"palindrome\tFind the longest palindrome/s in a given sequence.\n")
+            +"simReads\tSimulate fastq reads with qualities from a fasta.\n"
+            +"palindrome\tFind the longest palindrome/s in a given sequence.\n"
+            +"palindromes\tFind every maximal palindrome (inverted repeat) in a fasta/q.\n")
         sys.exit()
     else:
         exit(main(sys.argv[1:])) # Call main() with arguments from the command line
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import biocore
+import biosearch
+
+######################
+# Enzyme definitions #
+######################
+
+# Common restriction enzymes as {name: (site, top cut, bottom cut)}. Cuts are
+# given as offsets from the start of the site on the top strand, 5'->3', so
+# EcoRI (G^AATTC, CTTAA^G) cuts after base 1 on the top strand and after
+# base 5 on the bottom. Cuts may fall outside the site (e.g. Type IIS BsaI).
+ENZYMES = {
+    'AluI': ('AGCT', 2, 2),
+    'ApaI': ('GGGCCC', 5, 1),
+    'BamHI': ('GGATCC', 1, 5),
+    'BglII': ('AGATCT', 1, 5),
+    'BsaI': ('GGTCTC', 7, 11),
+    'DpnII': ('GATC', 0, 4),
+    'EcoRI': ('GAATTC', 1, 5),
+    'EcoRV': ('GATATC', 3, 3),
+    'HaeIII': ('GGCC', 2, 2),
+    'HindIII': ('AAGCTT', 1, 5),
+    'HinfI': ('GANTC', 1, 4),
+    'KpnI': ('GGTACC', 5, 1),
+    'MboI': ('GATC', 0, 4),
+    'MseI': ('TTAA', 1, 3),
+    'MspI': ('CCGG', 1, 3),
+    'NcoI': ('CCATGG', 1, 5),
+    'NdeI': ('CATATG', 2, 4),
+    'NlaIII': ('CATG', 4, 0),
+    'NotI': ('GCGGCCGC', 2, 6),
+    'PstI': ('CTGCAG', 5, 1),
+    'SacI': ('GAGCTC', 5, 1),
+    'SalI': ('GTCGAC', 1, 5),
+    'Sau3AI': ('GATC', 0, 4),
+    'SmaI': ('CCCGGG', 3, 3),
+    'SpeI': ('ACTAGT', 1, 5),
+    'SphI': ('GCATGC', 5, 1),
+    'TaqI': ('TCGA', 1, 3),
+    'XbaI': ('TCTAGA', 1, 5),
+    'XhoI': ('CTCGAG', 1, 5),
+}
+
+def getEnzyme(enzyme, csite=None):
+    """Given an enzyme name from ENZYMES, or a recognition site and the index
+    at which it cleaves the top strand (as for simCleave), returns a tuple of
+    (name, site, top cut, bottom cut). Sites given with a csite are assumed to
+    cut symmetrically, as palindromic sites do.
+    """
+    names = dict((i.upper(), i) for i in ENZYMES)
+    if csite is None:
+        if enzyme.upper() not in names:
+            raise Exception("Error: Unknown enzyme '{}', give its site and cleavage index instead.".format(enzyme))
+        name = names[enzyme.upper()]
+        site, cut5, cut3 = ENZYMES[name]
+        return(name, site, cut5, cut3)
+    site = enzyme.upper()
+    csite = int(csite)
+    return(site, site, csite, len(site) - csite)
+
+def overhang(enzyme):
+    """Return the overhang left by an enzyme as ("5'"|"3'"|'blunt', sequence).
+    Bases beyond the recognition site (as for Type IIS enzymes such as BsaI)
+    depend on the sequence cut, so are given as N, leaving only the type
+    and length; see siteOverhangs for the overhangs of actual cuts.
+    """
+    name, site, cut5, cut3 = getEnzyme(enzyme) if isinstance(enzyme, str) else enzyme
+    if cut5 == cut3:
+        return('blunt', '')
+    kind = "5'" if cut5 < cut3 else "3'"
+    return(kind, ''.join(site[i] if 0 <= i < len(site) else 'N' for i in range(min(cut5, cut3), max(cut5, cut3))))
+
+#####################
+# Finding & cutting #
+#####################
+
+def _cutPairs(arr, enzyme, owned=None):
+    """Return (top strand cuts, bottom strand cuts) of every match of an
+    enzyme's site, and its reverse complement for non-palindromic sites,
+    optionally only those matches starting before owned. Both cuts are given
+    as top strand positions (the 0-based index of the first base after the
+    cut) and may fall outside arr.
+    """
+    name, site, cut5, cut3 = enzyme
+    patterns = [(site, cut5, cut3)]
+    reverse = biosearch._reverseMotif(site)
+    if reverse != site: # Bottom strand sites cut the top strand at len - cut3, and the bottom at len - cut5
+        patterns.append((reverse, len(site) - cut3, len(site) - cut5))
+    tops, bottoms = [], []
+    for pattern, top, bottom in patterns:
+        matches = biosearch.matchMotif(arr, pattern)
+        if owned is not None:
+            matches = matches[matches < owned]
+        tops.append(matches + top)
+        bottoms.append(matches + bottom)
+    return(np.concatenate(tops), np.concatenate(bottoms))
+
+def _cutPositions(arr, enzymes, owned=None):
+    """Return {enzyme name: array of top strand cut positions} for every site
+    match, and its reverse complement for non-palindromic sites, optionally
+    only those matches starting before owned. Cuts may fall outside arr.
+    """
+    return(dict((enzyme[0], _cutPairs(arr, enzyme, owned)[0]) for enzyme in enzymes))
+
+def findCutSites(seq, enzymes):
+    """Given a sequence (string or PackedSeq) and a list of enzymes (tuples as
+    returned by getEnzyme), returns {enzyme name: sorted array of top strand
+    cut positions}. Each cut position is the 0-based index of the first base
+    after the cut. The sequence is encoded once and every site, and its
+    reverse complement for non-palindromic sites, is matched as an array.
+    """
+    arr = biocore._UPPER[biocore._asArray(seq)]
+    cuts = {}
+    for name, positions in _cutPositions(arr, enzymes).items():
+        positions = np.unique(positions)
+        cuts[name] = positions[(positions > 0) & (positions < len(arr))]
+    return(cuts)
+
+def siteOverhangs(seq, enzyme):
+    """Given a sequence and an enzyme (name or getEnzyme tuple), returns the
+    sorted top strand cut positions of every site it cuts and a list of their
+    overhangs as ("5'"|"3'"|'blunt', sequence), read from the top strand
+    between the two cuts. Overhangs are taken from the sequence itself, so
+    are exact for enzymes cutting outside their site. Sites whose cuts run
+    off either end of the sequence are left out.
+    """
+    enzyme = getEnzyme(enzyme) if isinstance(enzyme, str) else enzyme
+    arr = biocore._UPPER[biocore._asArray(seq)]
+    tops, bottoms = _cutPairs(arr, enzyme)
+    keep = (tops > 0) & (tops < len(arr)) & (bottoms >= 0) & (bottoms <= len(arr))
+    tops, bottoms = tops[keep], bottoms[keep]
+    order = np.argsort(tops, kind='stable')
+    tops, bottoms = tops[order], bottoms[order]
+    overhangs = []
+    for top, bottom in zip(tops.tolist(), bottoms.tolist()):
+        kind = 'blunt' if top == bottom else "5'" if top < bottom else "3'"
+        overhangs.append((kind, arr[min(top, bottom):max(top, bottom)].tobytes().decode()))
+    return(tops, overhangs)
+
+def fragmentCoords(length, cuts):
+    """Given a sequence length and an array of cut positions, returns two
+    arrays of the 0-based start (inclusive) and end (exclusive) of each fragment.
+    """
+    bounds = np.unique(np.concatenate(([0], np.asarray(cuts, dtype=np.int64), [length])))
+    return(bounds[:-1], bounds[1:])
+
+def digest(seq, enzymes):
+    """Given a sequence and a list of enzymes (names or getEnzyme tuples),
+    digests with all enzymes together and returns the fragment (starts, ends).
+    """
+    enzymes = [getEnzyme(i) if isinstance(i, str) else i for i in enzymes]
+    cuts = findCutSites(seq, enzymes)
+    allCuts = np.concatenate(list(cuts.values())) if cuts else np.zeros(0, dtype=np.int64)
+    return(fragmentCoords(len(seq), allCuts))
+
+############################
+# Multi-sequence digestion #
+############################
+
+def _siteChunk(view, owned, enzymes):
+    """Chunk worker (see bioparallel): cut positions of site matches starting
+    within the owned bases.
+    """
+    return(_cutPositions(view, enzymes, owned))
+
+def _indexedRecords(index, enzymes):
+    """Digest every contig from a prebuilt full-text index, without reading sequences."""
+    cuts = dict((name, []) for name in index.names)
+    lengths = np.diff(index.offsets) - 1
+    for name, site, cut5, cut3 in enzymes:
+        patterns = [(site, cut5)]
+        if biosearch._reverseMotif(site) != site:
+            patterns.append((biosearch._reverseMotif(site), len(site) - cut3))
+        for pattern, cut in patterns:
+            positions = index.positions(pattern)
+            contigs = np.searchsorted(index.offsets, positions, side='right') - 1
+            for contig in np.unique(contigs):
+                cuts[index.names[contig]].append(positions[contigs == contig] - index.offsets[contig] + cut)
+    for contig, name in enumerate(index.names):
+        contigCuts = np.concatenate(cuts[name]) if cuts[name] else np.zeros(0, dtype=np.int64)
+        contigCuts = contigCuts[(contigCuts > 0) & (contigCuts < lengths[contig])]
+        starts, ends = fragmentCoords(lengths[contig], contigCuts)
+        yield(name, int(lengths[contig]), len(starts) - 1, ends - starts)
+
+def digestMulti(genomefile, enzymes, processes=1):
+    """Given a fasta/q and a list of enzymes (names or getEnzyme tuples),
+    yields (name, length, cuts, fragment lengths) for every record. Records
+    are digested straight from a full-text index if one has been built for
+    the file, or else in overlapping chunks of shared memory over a process
+    pool if processes > 1.
+    """
+    enzymes = [getEnzyme(i) if isinstance(i, str) else i for i in enzymes]
+    index = biosearch.loadTextIndex(genomefile)
+    if index is not None:
+        for result in _indexedRecords(index, enzymes):
+            yield(result)
+        return
+
+    if int(processes) <= 1:
+        for name, seq, qual in biocore.iterRecords(genomefile):
+            starts, ends = digest(seq, enzymes)
+            yield(name, len(seq), len(starts) - 1, ends - starts)
+        return
+
+    import bioparallel
+    overlap = max(len(site) for name, site, cut5, cut3 in enzymes) - 1
+    results = bioparallel.mapFile(genomefile, _siteChunk, (enzymes,), overlap=overlap, processes=processes)
+    for name, length, chunks in bioparallel.groupByContig(results):
+        cuts = np.concatenate([positions + start for start, chunkCuts in chunks for positions in chunkCuts.values()])
+        cuts = cuts[(cuts > 0) & (cuts < length)]
+        starts, ends = fragmentCoords(length, cuts)
+        yield(name, length, len(starts) - 1, ends - starts)
+
+def fragmentSummary(genomefile, enzymes, processes=1):
+    """Print a tab-separated fragment size summary for every record of a
+    fasta/q digested with the given enzymes.
+    """
+    print('Contig\tLength\tCuts\tFragments\tShortest\tLongest\tMean\tMedian')
+    for name, length, cuts, fragLens in digestMulti(genomefile, enzymes, processes):
+        if len(fragLens) == 0:
+            print('{}\t{}\t0\t0\t-\t-\t-\t-'.format(name, length))
+            continue
+        print('{}\t{}\t{}\t{}\t{}\t{}\t{:.1f}\t{:g}'.format(name, length, cuts, len(fragLens),
+              fragLens.min(), fragLens.max(), fragLens.mean(), np.median(fragLens)))
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+
+import collections
+import os
+import shutil
+import tempfile
+import multiprocessing
+import numpy as np
+import biocore
+
+# Kmers are 2-bit encoded (A=0, C=1, G=2, T/U=3) into uint64, so k is limited to 32.
+MAX_K = 32
+CHUNK_SIZE = 1 << 22 # bases per unit of work, bounds memory for long contigs
+
+# Binary count files: a 32 byte header (magic, version, k, canonical, total) followed
+# by the sorted keys (<u8) and then their counts (<u4).
+KMER_MAGIC = b'BKMR'
+KMER_VERSION = 1
+HEADER_SIZE = 32
+
+#############################
+# Encoding & decoding kmers #
+#############################
+
+def encodeKmers(seq, k, canonical=False):
+    """Given a sequence (string or PackedSeq) and a kmer length (<= 32),
+    returns a uint64 array of every 2-bit encoded kmer in order.
+    Windows containing an N or any other non-ACGT base are skipped.
+    If canonical=True, the smaller of each kmer and its reverse complement
+    is returned, making counts strand-independent.
+    """
+    k = int(k)
+    if not 0 < k <= MAX_K:
+        raise Exception("Error: Kmer length must be between 1 and {}.".format(MAX_K))
+
+    codes = biocore._BASE_CODES[biocore._asArray(seq)]
+    n = len(codes) - k + 1
+    if n <= 0:
+        return(np.zeros(0, dtype=np.uint64))
+
+    # Windows are valid if they contain no invalid bases
+    invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+    valid = (invalid[k:] - invalid[:-k]) == 0
+
+    codes = codes.astype(np.uint64)
+    codes[codes == 4] = 0
+    two = np.uint64(2)
+    kmers = np.zeros(n, dtype=np.uint64)
+    for j in range(k): # Roll each base into every window at once
+        kmers <<= two
+        kmers |= codes[j:j+n]
+
+    if canonical:
+        reverse = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            reverse |= (np.uint64(3) - codes[j:j+n]) << np.uint64(2 * j)
+        kmers = np.minimum(kmers, reverse)
+
+    return(kmers[valid])
+
+def decodeKmers(kmers, k):
+    """Given an array of encoded kmers and their length, returns a list of strings."""
+    kmers = np.asarray(kmers, dtype=np.uint64)
+    shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+    codes = ((kmers[:, None] >> shifts) & np.uint64(3)).astype(np.uint8)
+    letters = np.ascontiguousarray(biocore._CODE_BASES[codes])
+    return([i.decode() for i in letters.view('S{}'.format(k)).ravel()])
+
+def encodeKmer(kmer):
+    """Given a kmer as a string, returns its 2-bit encoded integer."""
+    encoded = encodeKmers(kmer, len(kmer))
+    if len(encoded) != 1:
+        raise Exception("Error: Kmer '{}' contains non-ACGT bases.".format(kmer))
+    return(int(encoded[0]))
+
+######################
+# Counting & merging #
+######################
+
+def mergeCounts(keys, counts):
+    """Given (possibly repeated) kmer keys with counts, returns sorted unique
+    keys and their summed counts.
+    """
+    if len(keys) == 0:
+        return(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64))
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    counts = counts[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return(keys[starts], np.add.reduceat(counts.astype(np.uint64), starts))
+
+def _countChunk(task):
+    """Worker: count the kmers of a single sequence chunk."""
+    seq, k, canonical = task
+    keys, counts = np.unique(encodeKmers(seq, k, canonical), return_counts=True)
+    return(keys, counts.astype(np.uint64))
+
+def _iterChunks(reference, k):
+    """Yield sequence chunks of about CHUNK_SIZE bases. Long contigs are split
+    into chunks overlapping by k-1 so that every kmer falls within exactly one
+    chunk; short records (e.g. reads) are batched together, joined by an N so
+    that no kmer spans two records.
+    """
+    if not biocore.isInputFile(reference):
+        records = [reference]
+    else:
+        records = (seq for name, seq, qual in biocore.iterRecords(reference))
+    batch, size = [], 0
+    for seq in records:
+        if len(seq) >= CHUNK_SIZE:
+            for start in range(0, max(len(seq) - k + 1, 1), CHUNK_SIZE):
+                yield(seq[start:start + CHUNK_SIZE + k - 1])
+            continue
+        batch.append(seq)
+        size += len(seq) + 1
+        if size >= CHUNK_SIZE:
+            yield('N'.join(batch))
+            batch, size = [], 0
+    if batch:
+        yield('N'.join(batch))
+
+def _kmerChunk(view, owned, k, canonical):
+    """Chunk worker (see bioparallel): chunks overlap by k-1, so the view
+    holds exactly the kmers starting within the owned bases.
+    """
+    return(_countChunk((view, k, canonical)))
+
+def _countedChunks(reference, k, canonical=False, processes=1, stream=False):
+    """Yield the (keys, counts) of each chunk of a reference. With
+    processes > 1 a fasta is loaded once into shared memory and its chunks
+    are counted by a process pool reading it in place; reads (fastq), or any
+    input if stream=True, are instead read one chunk at a time and sent to
+    the pool, so that only a few chunks are ever held in memory.
+    """
+    if processes <= 1:
+        for chunk in _iterChunks(reference, k):
+            yield(_countChunk((chunk, k, canonical)))
+        return
+    if stream or (biocore.isInputFile(reference) and biocore.detectType(reference) == 'fastq'):
+        pool = multiprocessing.Pool(processes)
+        try:
+            pending = collections.deque() # Only a few chunks are held in memory at once
+            for chunk in _iterChunks(reference, k):
+                pending.append(pool.apply_async(_countChunk, ((chunk, k, canonical),)))
+                if len(pending) >= 2 * processes:
+                    yield(pending.popleft().get())
+            while pending:
+                yield(pending.popleft().get())
+        finally:
+            pool.close()
+            pool.join()
+        return
+    import bioparallel
+    for name, length, start, counted in bioparallel.mapFile(reference, _kmerChunk, (k, canonical), overlap=k - 1,
+                                                           processes=processes, chunkSize=CHUNK_SIZE):
+        yield(counted)
+
+def countKmers(reference, k, canonical=False, processes=1):
+    """Given a fasta/q (or a single sequence) and a kmer length (<= 32),
+    returns two sorted NumPy arrays: the encoded kmers and their counts.
+    Contigs are split into chunks which may be spread over a process pool
+    (via shared memory, see bioparallel), with the partial counts merged.
+    """
+    k = int(k)
+    partKeys, partCounts = [], []
+    merged, pending = 0, 0 # Distinct kmers after the last merge, and kmers added since
+
+    for keys, counts in _countedChunks(reference, k, canonical, int(processes)):
+        partKeys.append(keys)
+        partCounts.append(counts)
+        pending += len(keys)
+        if pending > max(4 * CHUNK_SIZE, merged): # Merge as we go to bound memory, less often as the table grows
+            keys, counts = mergeCounts(np.concatenate(partKeys), np.concatenate(partCounts))
+            partKeys, partCounts = [keys], [counts]
+            merged, pending = len(keys), 0
+
+    if len(partKeys) == 0:
+        return(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64))
+    return(mergeCounts(np.concatenate(partKeys), np.concatenate(partCounts)))
+
+def topKmers(keys, counts, n=10):
+    """Return the indices of the n most frequent kmers, most frequent first."""
+    n = min(int(n), len(counts))
+    if n == 0:
+        return(np.zeros(0, dtype=np.int64))
+    top = np.argpartition(counts, len(counts) - n)[len(counts) - n:]
+    return(top[np.lexsort((keys[top], -counts[top].astype(np.int64)))])
+
+def kmerHistogram(counts):
+    """Given kmer counts, returns an array where index i holds the number of
+    distinct kmers seen exactly i times.
+    """
+    return(np.bincount(np.asarray(counts, dtype=np.int64)))
+
+##################
+# Binary storage #
+##################
+
+def writeKmerCounts(filename, keys, counts, k, canonical=False):
+    """Write sorted kmer keys and counts to a compact binary file. Counts
+    above the uint32 range are saturated.
+    """
+    with open(filename, 'wb') as f:
+        _writeHeader(f, k, canonical, len(keys))
+        f.write(np.asarray(keys, dtype='<u8').tobytes())
+        f.write(_clipCounts(counts).tobytes())
+
+def _writeHeader(f, k, canonical, total):
+    f.write(KMER_MAGIC)
+    f.write(np.array([KMER_VERSION, k, int(canonical)], dtype='<u4').tobytes())
+    f.write(np.array([total, 0], dtype='<u8').tobytes()) # kmer total, reserved
+
+def _clipCounts(counts):
+    return(np.minimum(counts, np.iinfo(np.uint32).max).astype('<u4'))
+
+def readKmerCounts(filename, mmap=False):
+    """Read a file written by writeKmerCounts, returning a tuple of
+    (keys, counts, k, canonical). With mmap=True the arrays are memory-mapped
+    rather than loaded.
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if header[:4] != KMER_MAGIC:
+        raise Exception("Error: Given file (" + filename + ") is not a kmer count file.")
+    version, k, canonical = np.frombuffer(header[4:16], dtype='<u4')
+    if version != KMER_VERSION:
+        raise Exception("Error: Unsupported kmer count file version '{}'.".format(version))
+    n = int(np.frombuffer(header[16:24], dtype='<u8')[0])
+
+    if mmap:
+        keys = np.memmap(filename, dtype='<u8', mode='r', offset=HEADER_SIZE, shape=(n,))
+        counts = np.memmap(filename, dtype='<u4', mode='r', offset=HEADER_SIZE + 8 * n, shape=(n,))
+    else:
+        with open(filename, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            keys = np.fromfile(f, dtype='<u8', count=n)
+            counts = np.fromfile(f, dtype='<u4', count=n)
+    return(keys, counts, int(k), bool(canonical))
+
+def lookupKmers(filename, kmers):
+    """Given a binary count file and a kmer (string) or list of kmers, returns
+    a dictionary of {kmer: count} by binary search over the memory-mapped
+    table. Absent kmers have a count of 0. Kmers are made canonical first
+    if the table was counted canonically.
+    """
+    keys, counts, k, canonical = readKmerCounts(filename, mmap=True)
+    if isinstance(kmers, str):
+        kmers = [kmers]
+
+    results = {}
+    for kmer in kmers:
+        encoded = encodeKmers(kmer, k, canonical) if len(kmer) == k else []
+        if len(encoded) != 1:
+            raise Exception("Error: Kmer '{}' must be {} A/C/G/T bases to match this table.".format(kmer, k))
+        index = np.searchsorted(keys, encoded[0])
+        found = index < len(keys) and keys[index] == encoded[0]
+        results[kmer] = int(counts[index]) if found else 0
+    return(results)
+
+###################################
+# External (disk-backed) counting #
+###################################
+
+# On-disk bucket records, partially counted (key, count) pairs
+_BUCKET_DTYPE = np.dtype([('key', '<u8'), ('count', '<u8')])
+# Multiplier (Fibonacci hashing) spreading keys evenly over buckets by their top bits
+_BUCKET_HASH = np.uint64(0x9E3779B97F4A7C15)
+# Keys read from each bucket at a time when merging them into one table
+MERGE_BLOCK = 1 << 20
+
+def _bucketOf(keys, bits):
+    """Return the bucket (0 to 2**bits - 1) of each key by a multiplicative
+    hash, so that buckets are even however skewed the keys are (canonical
+    kmers, for instance, mostly start with A or C).
+    """
+    if bits == 0:
+        return(np.zeros(len(keys), dtype=np.uint64))
+    return((keys * _BUCKET_HASH) >> np.uint64(64 - bits))
+
+def _countBucket(path):
+    """Worker: merge the partial counts in one bucket file, writing its sorted
+    keys and counts alongside it. Returns the number of distinct kmers.
+    """
+    records = np.fromfile(path, dtype=_BUCKET_DTYPE)
+    os.remove(path)
+    keys, counts = mergeCounts(records['key'], records['count'])
+    keys.astype('<u8').tofile(path + '.keys')
+    _clipCounts(counts).tofile(path + '.counts')
+    return(len(keys))
+
+def _mergeBuckets(paths, sizes, f, countsPath):
+    """Write the keys of sorted buckets holding distinct kmers to f in
+    global order, then their counts (staged in countsPath). A block of each
+    bucket is read at a time, and every key up to the smallest of the blocks'
+    last keys is written, as no later key of any bucket can precede it.
+    """
+    read = [0] * len(paths)
+    with open(countsPath, 'wb') as countsOut:
+        while True:
+            blocks = [(i, np.fromfile(paths[i] + '.keys', dtype='<u8', count=MERGE_BLOCK, offset=8 * read[i]))
+                      for i in range(len(paths)) if read[i] < sizes[i]]
+            if not blocks:
+                break
+            bound = min(block[-1] for i, block in blocks)
+            keys, counts = [], []
+            for i, block in blocks:
+                taken = int(np.searchsorted(block, bound, side='right'))
+                keys.append(block[:taken])
+                counts.append(np.fromfile(paths[i] + '.counts', dtype='<u4', count=taken, offset=4 * read[i]))
+                read[i] += taken
+            keys = np.concatenate(keys)
+            order = np.argsort(keys, kind='stable')
+            f.write(keys[order].tobytes())
+            countsOut.write(np.concatenate(counts)[order].tobytes())
+    with open(countsPath, 'rb') as counts:
+        shutil.copyfileobj(counts, f)
+
+def countKmersExternal(reference, k, outfile, canonical=False, processes=1, buckets=64, tmpdir=None):
+    """Count kmers for inputs with more distinct kmers than fit in memory,
+    writing the result to outfile in the format of writeKmerCounts.
+    The input is read a chunk at a time (counted over a process pool if
+    processes > 1, without ever loading the whole input), and its kmers are
+    partitioned into on-disk buckets by a hash of the kmer. Each bucket is
+    then counted independently (also over the pool) and the sorted buckets
+    are merged block by block into one sorted table.
+    Returns the number of distinct kmers.
+    """
+    k = int(k)
+    processes = int(processes)
+    bits = int(np.log2(max(int(buckets), 1)))
+
+    if tmpdir is None:
+        tmpdir = os.path.dirname(os.path.abspath(outfile))
+    workdir = tempfile.mkdtemp(prefix='kmers_', dir=tmpdir)
+    paths = [os.path.join(workdir, 'bucket{}'.format(i)) for i in range(2 ** bits)]
+
+    try:
+        # Pass 1: encode and partially count each chunk (or batch of reads), then partition by hash
+        handles = [open(path, 'wb') for path in paths]
+        try:
+            for keys, counts in _countedChunks(reference, k, canonical, processes, stream=True):
+                owners = _bucketOf(keys, bits)
+                order = np.argsort(owners, kind='stable')
+                records = np.empty(len(keys), dtype=_BUCKET_DTYPE)
+                records['key'] = keys[order]
+                records['count'] = counts[order]
+                splits = np.searchsorted(owners[order], np.arange(len(paths) + 1, dtype=np.uint64))
+                for handle, start, end in zip(handles, splits[:-1], splits[1:]):
+                    if end > start:
+                        records[start:end].tofile(handle)
+        finally:
+            for handle in handles:
+                handle.close()
+
+        # Pass 2: count each bucket independently
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            try:
+                sizes = pool.map(_countBucket, paths, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            sizes = [_countBucket(path) for path in paths]
+
+        # Pass 3: merge the sorted buckets into one sorted table
+        with open(outfile, 'wb') as f:
+            _writeHeader(f, k, canonical, sum(sizes))
+            _mergeBuckets(paths, sizes, f, os.path.join(workdir, 'counts'))
+    finally:
+        shutil.rmtree(workdir)
+
+    return(sum(sizes))
+
+##########################
+# Command line reporting #
+##########################
+
+def reportKmers(reference, k, top=None, hist=False, outfile=None, canonical=False, processes=1, disk=False):
+    """Count kmers and print them (kmer\tcount), print only the top N, print
+    a count histogram (count\tdistinct kmers) or write a binary count file.
+    With disk=True kmers are counted externally into outfile (by default
+    <reference>.k<k>.bkm) and any top N or histogram is read back from it.
+    """
+    k = int(k)
+
+    if disk:
+        if outfile is None:
+            outfile = '{}.k{}.bkm'.format(reference, k)
+        total = countKmersExternal(reference, k, outfile, canonical=canonical, processes=processes)
+        print("{} distinct kmers written to {}".format(total, outfile))
+        if top is None and not hist:
+            return
+        keys, counts = readKmerCounts(outfile, mmap=True)[:2]
+    else:
+        keys, counts = countKmers(reference, k, canonical=canonical, processes=processes)
+        if outfile is not None:
+            writeKmerCounts(outfile, keys, counts, k, canonical)
+            print("{} distinct kmers written to {}".format(len(keys), outfile))
+            return
+
+    if hist:
+        for multiplicity, distinct in enumerate(kmerHistogram(counts)):
+            if distinct:
+                print("{}\t{}".format(multiplicity, distinct))
+    else:
+        if top is not None:
+            order = topKmers(keys, counts, top)
+            keys, counts = keys[order], counts[order]
+        for kmer, count in zip(decodeKmers(keys, k), counts):
+            print("{}\t{}".format(kmer, count))
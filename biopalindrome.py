@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import biocore
+
+# Palindromes are returned as records of 0-based start (inclusive), end
+# (exclusive) and the fraction of paired bases that match.
+PALINDROME_DTYPE = np.dtype([('start', np.int64), ('end', np.int64), ('identity', np.float64)])
+# Longest palindrome searched for by default when mismatches are allowed
+MAX_LENGTH = 200
+
+# Byte each base pairs with across the centre, -1 where none does (N and
+# other ambiguity codes never pair): its complement for inverted repeats,
+# or itself for mirror repeats.
+_PARTNERS = {True: np.full(256, -1, dtype=np.int16), False: np.full(256, -1, dtype=np.int16)}
+for _a, _b in zip('ACGT', 'TGCA'):
+    _PARTNERS[True][ord(_a)] = ord(_b)
+    _PARTNERS[False][ord(_a)] = ord(_a)
+
+###################
+# Exact (Manacher) #
+###################
+
+def palindromeArms(seq, complement=True):
+    """Given a sequence, returns the arm length of the longest exact
+    palindrome about every centre, in linear time (Manacher's algorithm).
+    Returns (even, odd): even[i] is the arm of the palindrome centred
+    between bases i-1 and i, i.e. seq[i-arm:i+arm]; odd[i] is the arm either
+    side of base i, i.e. seq[i-arm:i+arm+1], and is None for inverted
+    repeats, whose centre can never pair with itself. With complement=True
+    arms pair bases with their complement (reverse-complement palindromes
+    such as GAATTC), otherwise with themselves (mirror repeats).
+
+    A palindrome mirrors every palindrome inside it, so the arm about each
+    centre starts from that of its mirror image and the sequence is only
+    compared beyond the rightmost palindrome found so far.
+    """
+    s = biocore._UPPER[biocore._asArray(seq)].tolist()
+    partner = _PARTNERS[bool(complement)].tolist()
+    n = len(s)
+
+    even = [0] * n
+    left, right = 0, -1 # Rightmost palindrome found so far, inclusive
+    for i in range(n):
+        k = 0 if i > right else min(even[left + right - i + 1], right - i + 1)
+        while i + k < n and i - k - 1 >= 0 and partner[s[i - k - 1]] == s[i + k]:
+            k += 1
+        even[i] = k
+        if i + k - 1 > right:
+            left, right = i - k, i + k - 1
+
+    odd = None
+    if not complement:
+        odd = [0] * n
+        left, right = 0, -1
+        for i in range(n):
+            k = 0 if i > right else min(odd[left + right - i], right - i)
+            while i + k + 1 < n and i - k - 1 >= 0 and partner[s[i - k - 1]] == s[i + k + 1]:
+                k += 1
+            odd[i] = k
+            if i + k > right:
+                left, right = i - k, i + k
+        odd = np.array(odd, dtype=np.int64)
+    return(np.array(even, dtype=np.int64), odd)
+
+def _exactPalindromes(seq, minLength, complement):
+    even, odd = palindromeArms(seq, complement)
+    centres = np.flatnonzero(2 * even >= max(minLength, 1))
+    starts, ends = [centres - even[centres]], [centres + even[centres]]
+    if odd is not None:
+        centres = np.flatnonzero(2 * odd + 1 >= max(minLength, 2))
+        starts.append(centres - odd[centres])
+        ends.append(centres + odd[centres] + 1)
+    palindromes = np.zeros(sum(len(i) for i in starts), dtype=PALINDROME_DTYPE)
+    palindromes['start'] = np.concatenate(starts)
+    palindromes['end'] = np.concatenate(ends)
+    palindromes['identity'] = 1.0
+    return(palindromes)
+
+##########################
+# Mismatch-tolerant arms #
+##########################
+
+def _tolerantArms(arr, partner, centres, shift, threshold, maxArm):
+    """Score every centre at once, one base pair out from the centre at a
+    time (the anti-diagonals of the sequence against its reverse
+    complement), returning each centre's longest arm whose pairs match at
+    least threshold of the time, and the matches along it. Centres with more
+    mismatches than an arm of maxArm could absorb are dropped as they go.
+    """
+    n = len(arr)
+    bestArms = np.zeros(len(centres), dtype=np.int64)
+    bestMatches = np.zeros(len(centres), dtype=np.int64)
+    limits = np.minimum(np.minimum(centres, n - centres - shift), maxArm)
+    budget = (1 - threshold) * maxArm + 1e-9
+
+    alive = np.flatnonzero(limits > 0)
+    matches = np.zeros(len(alive), dtype=np.int64)
+    for k in range(int(maxArm)):
+        if not len(alive):
+            break
+        c = centres[alive]
+        matches += partner[arr[c - k - 1]] == arr[c + k + shift]
+        passing = matches >= threshold * (k + 1) - 1e-9
+        bestArms[alive[passing]] = k + 1
+        bestMatches[alive[passing]] = matches[passing]
+        keep = (k + 1 - matches <= budget) & (limits[alive] > k + 1)
+        alive, matches = alive[keep], matches[keep]
+    return(bestArms, bestMatches)
+
+def _tolerantPalindromes(seq, minLength, threshold, complement, maxLength):
+    arr = biocore._UPPER[biocore._asArray(seq)]
+    partner = _PARTNERS[bool(complement)]
+    n = len(arr)
+    starts, ends, identities = [], [], []
+    for shift in ((0,) if complement else (0, 1)): # Even centres, plus odd ones for mirror repeats
+        centres = np.arange(1 - shift, n - shift, dtype=np.int64)
+        arms, matches = _tolerantArms(arr, partner, centres, shift, threshold, (int(maxLength) - shift) // 2)
+        found = (arms > 0) & (2 * arms + shift >= minLength)
+        starts.append(centres[found] - arms[found])
+        ends.append(centres[found] + arms[found] + shift)
+        identities.append(matches[found] / arms[found])
+    palindromes = np.zeros(sum(len(i) for i in starts), dtype=PALINDROME_DTYPE)
+    palindromes['start'] = np.concatenate(starts)
+    palindromes['end'] = np.concatenate(ends)
+    palindromes['identity'] = np.concatenate(identities)
+    return(palindromes)
+
+##########
+# Search #
+##########
+
+def findPalindromes(seq, minLength=4, threshold=1.0, complement=True, maxLength=MAX_LENGTH):
+    """Given a sequence, returns an array of PALINDROME_DTYPE records for the
+    maximal palindrome about every centre that is at least minLength long,
+    sorted by start. Palindromes are reverse-complement (inverted repeats)
+    by default or mirror repeats if complement=False. At threshold 1.0 only
+    exact palindromes are found, of any length, in linear time; below it the
+    longest palindrome about each centre whose paired bases match at least
+    threshold of the time is found, up to maxLength bases.
+    """
+    threshold = float(threshold)
+    if threshold <= 0 or threshold > 1:
+        raise Exception("Error: Palindrome threshold '{}' must be above 0 and at most 1.".format(threshold))
+    if threshold == 1.0:
+        palindromes = _exactPalindromes(seq, int(minLength), complement)
+    else:
+        palindromes = _tolerantPalindromes(seq, int(minLength), threshold, complement, maxLength)
+    return(palindromes[np.lexsort((palindromes['end'], palindromes['start']))])
+
+def iterPalindromes(filename, minLength=10, threshold=1.0, complement=True, maxLength=MAX_LENGTH):
+    """Given a fasta/q (or a single sequence), yields (name, sequence,
+    palindromes) for every record, one record in memory at a time.
+    """
+    if not biocore.isInputFile(filename):
+        yield('sequence', filename.upper(), findPalindromes(filename, minLength, threshold, complement, maxLength))
+        return
+    for name, seq, qual in biocore.iterRecords(filename):
+        yield(name, seq, findPalindromes(seq, minLength, threshold, complement, maxLength))
+
+def reportPalindromes(filename, minLength=10, threshold=1.0, complement=True, maxLength=MAX_LENGTH, outfile=None):
+    """Write every maximal palindrome of a fasta/q (or sequence) as a
+    tab-separated table of contig, start and end (1-based, inclusive),
+    length, identity and sequence, to outfile or stdout. Returns the number
+    of palindromes found.
+    """
+    out = open(outfile, 'w') if outfile else None
+    found = 0
+    try:
+        line = 'Contig\tStart\tEnd\tLength\tIdentity\tSequence\n'
+        out.write(line) if out else print(line, end='')
+        for name, seq, palindromes in iterPalindromes(filename, minLength, threshold, complement, maxLength):
+            lines = ''.join('{}\t{}\t{}\t{}\t{:.3f}\t{}\n'.format(name, start + 1, end, end - start, identity, seq[start:end])
+                            for start, end, identity in palindromes.tolist())
+            out.write(lines) if out else print(lines, end='')
+            found += len(palindromes)
+    finally:
+        if out:
+            out.close()
+    return(found)
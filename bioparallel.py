@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import biocore
+import biozip
+
+# Contigs are split into chunks of this many bases (plus overlap) for workers
+CHUNK_SIZE = 1 << 22
+
+#######################
+# Shared memory store #
+#######################
+
+class SharedSeqs(object):
+    """Sequences held once in a shared memory block as uppercase uint8 bytes,
+    contig after contig, so that worker processes can read any part of any
+    contig as a zero-copy NumPy view. Create with fromFile or fromRecords in
+    the parent and close() when done, which also frees the block; workers
+    attach with attach(handle()).
+    """
+
+    def __init__(self, names, offsets, memory, owner=False):
+        self.names = list(names)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.memory = memory
+        self.owner = owner
+        self.data = np.ndarray((int(self.offsets[-1]),), dtype=np.uint8, buffer=memory.buf)
+
+    @classmethod
+    def _create(cls, names, lengths):
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        memory = shared_memory.SharedMemory(create=True, size=max(int(offsets[-1]), 1))
+        return(cls(names, offsets, memory, owner=True))
+
+    @classmethod
+    def fromRecords(cls, records):
+        """Given (name, sequence) pairs, returns them as SharedSeqs."""
+        names, parts = [], []
+        for name, seq in records:
+            names.append(name)
+            parts.append(biocore._UPPER[biocore._asArray(seq)])
+        shared = cls._create(names, [len(i) for i in parts])
+        for i, part in enumerate(parts):
+            shared.contig(i)[:] = part
+        return(shared)
+
+    @classmethod
+    def fromFile(cls, filename):
+        """Given a fasta/q, returns its records as SharedSeqs. Where a fasta
+        has (or can be given) a .fai index, contig lengths are taken from it so
+        that each record is copied straight into the shared block as it is
+        read; otherwise, e.g. for ragged line widths or a read-only
+        directory, the records are read first as by fromRecords.
+        """
+        index = None
+        if filename != biozip.STDIN and biocore.detectType(filename) == 'fasta':
+            try:
+                index = biocore.readIndex(filename)
+            except Exception: # Unindexable, or the .fai cannot be written
+                index = None
+        if index is None:
+            return(cls.fromRecords((name, seq) for name, seq, qual in biocore.iterRecords(filename)))
+        shared = cls._create(list(index), [value[0] for value in index.values()])
+        for i, (name, seq, qual) in enumerate(biocore.iterRecords(filename)):
+            shared.names[i] = name # Full header, as when read serially; the index holds only the first word
+            shared.contig(i)[:] = biocore._asArray(seq)
+        return(shared)
+
+    def handle(self):
+        """Return what a worker needs to attach: (block name, names, offsets)."""
+        return(self.memory.name, self.names, self.offsets)
+
+    @classmethod
+    def attach(cls, handle):
+        name, names, offsets = handle
+        return(cls(names, offsets, shared_memory.SharedMemory(name=name)))
+
+    def contig(self, i):
+        """Return contig i as a view into the shared block."""
+        return(self.data[self.offsets[i]:self.offsets[i+1]])
+
+    def __len__(self):
+        return(len(self.names))
+
+    def close(self):
+        del self.data # Views must be released before the block can close
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
+
+##########
+# Chunks #
+##########
+
+def chunkBounds(length, chunkSize=CHUNK_SIZE, overlap=0):
+    """Given a contig length, yields (start, end, owned) for each chunk: the
+    chunk view is [start, end) and covers the owned bases from start onwards
+    plus overlap bases of the next chunk. Workers should only report hits
+    starting within the owned bases, so that nothing at a boundary is
+    counted twice; any hit of at most overlap + 1 bases starting there lies
+    wholly within the view. Tails no longer than the overlap are folded into
+    the chunks before, so only the first chunk can be shorter than overlap.
+    """
+    starts = list(range(0, max(int(length), 1), int(chunkSize)))
+    while len(starts) > 1 and length - starts[-1] <= overlap:
+        starts.pop()
+    for i, start in enumerate(starts):
+        ownedEnd = starts[i+1] if i + 1 < len(starts) else int(length)
+        yield(start, min(ownedEnd + int(overlap), int(length)), ownedEnd - start)
+
+# Set in each worker process by _attach
+_shared = None
+
+def _attach(handle):
+    global _shared
+    _shared = SharedSeqs.attach(handle)
+
+def _runChunk(task):
+    """Worker: call func(view, owned, *args) on one chunk of a shared contig."""
+    func, contig, start, end, owned, args = task
+    return(contig, start, func(_shared.contig(contig)[start:end], owned, *args))
+
+def mapChunks(shared, func, args=(), overlap=0, processes=1, chunkSize=CHUNK_SIZE):
+    """Given SharedSeqs and a top-level function taking (chunk view, owned
+    length, *args), yields (contig index, chunk start, result) for every
+    chunk of every contig, in order. Chunks are handed to a pool of worker
+    processes, which read them straight from shared memory, if processes > 1.
+    """
+    tasks = ((func, i, start, end, owned, tuple(args)) for i in range(len(shared))
+             for start, end, owned in chunkBounds(shared.offsets[i+1] - shared.offsets[i], chunkSize, overlap))
+    if int(processes) <= 1:
+        for func, i, start, end, owned, args in tasks:
+            yield(i, start, func(shared.contig(i)[start:end], owned, *args))
+        return
+    pool = multiprocessing.Pool(int(processes), initializer=_attach, initargs=(shared.handle(),))
+    try:
+        for result in pool.imap(_runChunk, tasks, chunksize=1):
+            yield(result)
+    finally:
+        pool.close()
+        pool.join()
+
+def mapFile(filename, func, args=(), overlap=0, processes=1, chunkSize=CHUNK_SIZE):
+    """As mapChunks, for a fasta/q (or a single sequence) loaded into shared
+    memory for the duration, yielding (contig name, contig length, chunk start,
+    result).
+    """
+    if biocore.isInputFile(filename):
+        shared = SharedSeqs.fromFile(filename)
+    else:
+        shared = SharedSeqs.fromRecords([('sequence', filename)])
+    with shared:
+        lengths = np.diff(shared.offsets)
+        for i, start, result in mapChunks(shared, func, args, overlap, processes, chunkSize):
+            yield(shared.names[i], int(lengths[i]), start, result)
+
+def groupByContig(results):
+    """Given results from mapFile, yields (contig name, length, [(chunk start,
+    result)]) once all of a contig's chunks are in.
+    """
+    current, length, chunks = None, 0, []
+    for name, contigLength, start, result in results:
+        if chunks and start == 0: # Every contig's first chunk starts at 0
+            yield(current, length, chunks)
+            chunks = []
+        current, length = name, contigLength
+        chunks.append((start, result))
+    if chunks:
+        yield(current, length, chunks)
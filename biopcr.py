@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import itertools
+import os
+import multiprocessing
+import numpy as np
+import biocore
+import biosearch
+
+# Amplicons are returned as records of 0-based start (inclusive), end (exclusive),
+# the strand of the product and the mismatches of the primer at each end.
+AMPLICON_DTYPE = np.dtype([('start', np.int64), ('end', np.int64), ('strand', 'U1'),
+                           ('mismatches1', np.int16), ('mismatches2', np.int16)])
+
+###################
+# Primer matching #
+###################
+
+def passmarkToMismatches(primer, passmark=90):
+    """Convert a percentage identity passmark into a per-primer mismatch budget."""
+    return(int(len(primer) * (100 - float(passmark)) / 100 + 1e-9))
+
+def primerHits(seq, primer, maxMismatches=0):
+    """Given a sequence (string, PackedSeq or uint8 array) and an IUPAC primer,
+    returns two arrays: the 0-based start of every forward strand window with
+    at most maxMismatches mismatches, and the number of mismatches there.
+
+    Mismatches are added up one primer base at a time for every window at
+    once (Shift-Add, column-wise); once most windows are over budget only
+    the surviving candidates are carried forward.
+    """
+    arr = biocore._UPPER[biocore._asArray(seq)]
+    m = len(primer)
+    n = len(arr) - m + 1
+    if n <= 0 or m == 0:
+        return(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int16))
+
+    mismatch = ~biosearch._motifTable(primer) # (primer position x byte) -> mismatch
+    candidates = None
+    counts = np.zeros(n, dtype=np.int16)
+    for j in range(m):
+        if candidates is None:
+            counts += mismatch[j][arr[j:j+n]]
+            if j >= maxMismatches:
+                keep = counts <= maxMismatches
+                if np.count_nonzero(keep) < n // 8: # Few survivors left, switch to candidate lists
+                    candidates = np.flatnonzero(keep)
+                    counts = counts[candidates]
+        else:
+            counts += mismatch[j][arr[candidates + j]]
+            keep = counts <= maxMismatches
+            candidates = candidates[keep]
+            counts = counts[keep]
+
+    if candidates is None:
+        candidates = np.flatnonzero(counts <= maxMismatches)
+        counts = counts[candidates]
+    return(candidates, counts)
+
+def _pairHits(fwdStarts, fwdMismatches, revStarts, revMismatches, revLength, maxAmplicon, strand):
+    """Pair forward primer starts with downstream reverse primer sites no more
+    than maxAmplicon apart, returning amplicon records.
+    """
+    order = np.argsort(revStarts, kind='stable')
+    revStarts, revMismatches = revStarts[order], revMismatches[order]
+    lo = np.searchsorted(revStarts, fwdStarts, side='left')
+    hi = np.searchsorted(revStarts, fwdStarts + maxAmplicon - revLength, side='right')
+    pairs = np.maximum(hi - lo, 0)
+
+    fwd = np.repeat(np.arange(len(fwdStarts)), pairs)
+    rev = np.repeat(lo, pairs) + (np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs))
+
+    amplicons = np.zeros(len(fwd), dtype=AMPLICON_DTYPE)
+    amplicons['start'] = fwdStarts[fwd]
+    amplicons['end'] = revStarts[rev] + revLength
+    amplicons['strand'] = strand
+    amplicons['mismatches1'] = fwdMismatches[fwd]
+    amplicons['mismatches2'] = revMismatches[rev]
+    return(amplicons)
+
+def _cachedHits(arr, primer, budget, cache):
+    """primerHits, reusing earlier results for the same primer and budget."""
+    if cache is None:
+        return(primerHits(arr, primer, budget))
+    if (primer, budget) not in cache:
+        cache[(primer, budget)] = primerHits(arr, primer, budget)
+    return(cache[(primer, budget)])
+
+def findAmplicons(seq, primer1, primer2, passmark=90, maxMismatches=None, maxAmplicon=10000, cache=None):
+    """Given a sequence and two primers (both 5'->3', primer2 being the reverse
+    primer), returns an array of AMPLICON_DTYPE records for every product of
+    at most maxAmplicon bases, on either strand. Primers may carry at most
+    maxMismatches mismatches each, or by default as many as passmark (percent
+    identity) allows. The sequence is encoded once and only coordinates are
+    kept, so no substrings are copied. Passing the same cache dictionary for
+    repeated calls on one sequence reuses primer hits between primer pairs.
+    """
+    arr = seq if isinstance(seq, np.ndarray) else biocore._UPPER[biocore._asArray(seq)]
+    primer1, primer2 = primer1.upper(), primer2.upper()
+    reverse1, reverse2 = biosearch._reverseMotif(primer1), biosearch._reverseMotif(primer2)
+    budget1 = passmarkToMismatches(primer1, passmark) if maxMismatches is None else int(maxMismatches)
+    budget2 = passmarkToMismatches(primer2, passmark) if maxMismatches is None else int(maxMismatches)
+
+    # '+' products: primer1 then the reverse complement of primer2, '-' the other way round
+    plus = _pairHits(*_cachedHits(arr, primer1, budget1, cache), *_cachedHits(arr, reverse2, budget2, cache),
+                     len(primer2), int(maxAmplicon), '+')
+    minus = _pairHits(*_cachedHits(arr, primer2, budget2, cache), *_cachedHits(arr, reverse1, budget1, cache),
+                      len(primer1), int(maxAmplicon), '-')
+    minus['mismatches1'], minus['mismatches2'] = minus['mismatches2'].copy(), minus['mismatches1'].copy()
+
+    amplicons = np.concatenate((plus, minus))
+    return(amplicons[np.lexsort((amplicons['end'], amplicons['start']))])
+
+def _ampliconChunk(view, owned, primer1, primer2, passmark, maxAmplicon):
+    """Chunk worker (see bioparallel): amplicons starting within the owned
+    bases. Chunks overlap by maxAmplicon, so these are always complete.
+    """
+    amplicons = findAmplicons(view, primer1, primer2, passmark=passmark, maxAmplicon=maxAmplicon)
+    return(amplicons[amplicons['start'] < owned])
+
+def ampliconsMulti(genomefile, primer1, primer2, passmark=90, maxAmplicon=10000, processes=1):
+    """Given a fasta/q, yields (name, amplicons, fragment sequences) for every
+    record. With processes > 1 records are held in shared memory and split
+    into chunks overlapping by maxAmplicon for a process pool.
+    """
+    if int(processes) <= 1:
+        for name, seq, qual in biocore.iterRecords(genomefile):
+            amplicons = findAmplicons(seq, primer1, primer2, passmark=passmark, maxAmplicon=maxAmplicon)
+            yield(name, amplicons, [seq[start:end] for start, end in zip(amplicons['start'], amplicons['end'])])
+        return
+
+    import bioparallel
+    with bioparallel.SharedSeqs.fromFile(genomefile) as shared:
+        results = bioparallel.mapChunks(shared, _ampliconChunk, (primer1, primer2, passmark, int(maxAmplicon)),
+                                        overlap=int(maxAmplicon), processes=processes)
+        for contig, chunks in itertools.groupby(results, key=lambda result: result[0]):
+            parts = []
+            for contig, start, amplicons in chunks:
+                amplicons['start'] += start
+                amplicons['end'] += start
+                parts.append(amplicons)
+            amplicons = np.concatenate(parts)
+            fragments = [shared.contig(contig)[start:end].tobytes().decode()
+                         for start, end in zip(amplicons['start'], amplicons['end'])]
+            yield(shared.names[contig], amplicons, fragments)
+
+##############
+# Batch mode #
+##############
+
+def readPrimerPanel(panel):
+    """Given a tab-separated primer panel with one pair per line as
+    'name, forward primer, reverse primer (, max amplicon size)', returns a
+    list of (name, primer1, primer2, maxAmplicon or None) tuples. Blank lines,
+    '#' comments and a header line starting 'name' are skipped.
+    """
+    pairs = []
+    with open(panel, 'r') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if not line.strip() or line.startswith('#') or fields[0].lower() == 'name':
+                continue
+            if len(fields) < 3:
+                raise Exception("Error: Primer panel lines must be 'name<tab>primer1<tab>primer2', got: " + line.strip())
+            maxAmplicon = int(fields[3]) if len(fields) > 3 and fields[3].strip() else None
+            pairs.append((fields[0], fields[1].strip().upper(), fields[2].strip().upper(), maxAmplicon))
+    return(pairs)
+
+def _pcrGenome(task):
+    """Worker: evaluate every primer pair against each record of one genome,
+    encoding each record once. Returns the genome path and result rows.
+    """
+    genome, pairs, passmark, maxMismatches, maxAmplicon = task
+    rows = []
+    for contig, seq, qual in biocore.iterRecords(genome):
+        arr = biocore._UPPER[biocore._asArray(seq)]
+        cache = {}
+        for name, primer1, primer2, pairMax in pairs:
+            amplicons = findAmplicons(arr, primer1, primer2, passmark=passmark, maxMismatches=maxMismatches,
+                                      maxAmplicon=pairMax or maxAmplicon, cache=cache)
+            for amplicon in amplicons:
+                rows.append((os.path.basename(genome), contig, name, int(amplicon['start']) + 1, int(amplicon['end']),
+                             amplicon['strand'], int(amplicon['mismatches1']) + int(amplicon['mismatches2']),
+                             int(amplicon['end'] - amplicon['start'])))
+    return(genome, rows)
+
+def batchPCR(panel, genomes, outfile, passmark=90, maxMismatches=None, maxAmplicon=10000, processes=1):
+    """Given a primer panel (see readPrimerPanel) and a collection of genomes
+    (see biocore.expandFiles), runs every pair against every genome and
+    writes one tab-separated table of genome, contig, pair, start, end
+    (1-based, inclusive), strand, total mismatches and amplicon length. Each
+    genome is read and encoded once for the whole panel, and genomes are
+    spread over a process pool if processes > 1, with rows written in
+    genome order either way. Returns the number of amplicons found.
+    """
+    pairs = readPrimerPanel(panel) if isinstance(panel, str) else panel
+    files = biocore.expandFiles(genomes)
+    tasks = [(genome, pairs, passmark, maxMismatches, maxAmplicon) for genome in files]
+    found = 0
+
+    with open(outfile, 'w') as out:
+        out.write('Genome\tContig\tPair\tStart\tEnd\tStrand\tMismatches\tLength\n')
+        if int(processes) > 1:
+            pool = multiprocessing.Pool(int(processes))
+            results = pool.imap(_pcrGenome, tasks)
+        else:
+            pool = None
+            results = (_pcrGenome(task) for task in tasks)
+        try:
+            for done, (genome, rows) in enumerate(results, 1):
+                for row in rows:
+                    out.write('\t'.join(map(str, row)) + '\n')
+                found += len(rows)
+                print('[{}/{}] {}: {} amplicon(s)'.format(done, len(files), genome, len(rows)))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    return(found)
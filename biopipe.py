@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import queue
+import sys
+import threading
+import numpy as np
+import biocore
+import biozip
+
+# Records are passed between threads and processes this many at a time
+BATCH_SIZE = 10000
+# Batches held between the reader, workers and writer at any one time
+QUEUE_SIZE = 8
+
+##########
+# Stages #
+##########
+
+# Each stage takes a batch (a list of (name, sequence, qualities) records)
+# and its position in the file, plus its own arguments, and returns a batch.
+
+def _fasta(records, index):
+    """Drop qualities, so that records are written as fasta."""
+    return([(name, seq, None) for name, seq, qual in records])
+
+def _trim(records, index, window=4, quality=20, offset=33):
+    """Sliding window quality trimming: each read is cut before the first
+    window of bases whose mean quality falls below quality. Reads shorter
+    than the window are judged on their overall mean. Qualities are read as
+    Phred+offset (33, or 64 for older Illumina reads). Fasta records pass
+    through untouched.
+    """
+    if not records or records[0][2] is None:
+        return(records)
+    window, quality, offset = int(window), float(quality), int(offset)
+    lengths = np.fromiter((len(qual) for name, seq, qual in records), dtype=np.int64, count=len(records))
+    scores = biocore._asArray(''.join(qual for name, seq, qual in records)).astype(np.int64) - offset
+    starts = np.cumsum(lengths) - lengths
+    cycles = np.arange(len(scores)) - np.repeat(starts, lengths)
+    cumulative = np.concatenate(([0], np.cumsum(scores)))
+
+    # A window starts at every base with at least window bases left in its read
+    span = np.minimum(np.repeat(lengths, lengths), window)
+    valid = (cycles == 0) | (cycles <= np.repeat(lengths, lengths) - window)
+    ends = np.minimum(np.arange(len(scores)) + span, len(scores))
+    failing = valid & ((cumulative[ends] - cumulative[np.arange(len(scores))]) < quality * span)
+
+    keep = lengths.copy()
+    nonEmpty = lengths > 0
+    if nonEmpty.any():
+        cut = np.minimum.reduceat(np.where(failing, cycles, np.repeat(lengths, lengths)), starts[nonEmpty])
+        keep[nonEmpty] = cut
+    return([(name, seq[:n], qual[:n]) for (name, seq, qual), n in zip(records, keep.tolist())])
+
+def _minLength(records, index, length):
+    return([record for record in records if len(record[1]) >= int(length)])
+
+def _maxLength(records, index, length):
+    return([record for record in records if len(record[1]) <= int(length)])
+
+def _maxN(records, index, count):
+    """Drop reads with more than count Ns, or more than that fraction of Ns if count < 1."""
+    count = float(count)
+    if count < 1:
+        return([record for record in records if record[1].count('N') + record[1].count('n') <= count * len(record[1])])
+    return([record for record in records if record[1].count('N') + record[1].count('n') <= count])
+
+def _revcomp(records, index):
+    return([(name, biocore._complement(seq, reverse=True), None if qual is None else qual[::-1])
+            for name, seq, qual in records])
+
+def _subsample(records, index, fraction, seed=0):
+    """Keep each read with probability fraction. Draws are seeded per batch,
+    so the output does not depend on how batches were spread over workers.
+    """
+    rng = np.random.default_rng([int(seed), index])
+    keep = rng.random(len(records)) < float(fraction)
+    return([record for record, kept in zip(records, keep) if kept])
+
+STAGES = {'fasta': _fasta, 'trim': _trim, 'minlen': _minLength, 'maxlen': _maxLength,
+          'maxn': _maxN, 'revcomp': _revcomp, 'subsample': _subsample}
+
+def _applyStages(task):
+    """Worker: run every stage, in order, over one batch."""
+    index, records, stages = task
+    for name, args in stages:
+        records = STAGES[name](records, index, *args)
+    return(records)
+
+#############
+# Streaming #
+#############
+
+def _readBatches(infile, batchSize, batches, stages):
+    """Reader thread: queue (index, records, stages) tasks, then None."""
+    try:
+        records = []
+        index = 0
+        for record in biocore.iterRecords(infile, upper=False):
+            records.append(record)
+            if len(records) == batchSize:
+                batches.put((index, records, stages))
+                records = []
+                index += 1
+        if records:
+            batches.put((index, records, stages))
+    except Exception as e:
+        batches.put(e)
+    batches.put(None)
+
+def _formatBatch(records):
+    lines = []
+    for name, seq, qual in records:
+        if qual is None:
+            lines.append('>' + name + '\n' + ''.join(seq[i:i+80] + '\n' for i in range(0, len(seq), 80)))
+        else:
+            lines.append('@' + name + '\n' + seq + '\n+\n' + qual + '\n')
+    return(''.join(lines))
+
+def _writeBatches(outfile, results, counts):
+    """Writer thread: write processed batches, in order, until None."""
+    out = sys.stdout if outfile == biozip.STDIN else open(outfile, 'w')
+    try:
+        while True:
+            records = results.get()
+            if records is None:
+                break
+            out.write(_formatBatch(records))
+            counts[1] += len(records)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def _tasks(batches, counts):
+    """Yield tasks from the reader's queue, re-raising any reader error."""
+    while True:
+        task = batches.get()
+        if task is None:
+            return
+        if isinstance(task, Exception):
+            raise task
+        counts[0] += len(task[1])
+        yield(task)
+
+def runPipeline(infile, outfile, stages, processes=1, batchSize=BATCH_SIZE):
+    """Given a fasta/q (or '-' for stdin), an output file (or '-' for stdout)
+    and a list of (stage name, [arguments]) from STAGES, streams batches of
+    records through each stage in order. A reader thread parses batches, a
+    writer thread writes results in their original order, and batches are
+    processed over a pool of worker processes if processes > 1. Records stay
+    fastq unless the 'fasta' stage is used or the input is fasta. Returns
+    (records read, records written).
+    """
+    for name, args in stages:
+        if name not in STAGES:
+            raise Exception("Error: Unknown pipe stage '{}', choose from: {}".format(name, ', '.join(STAGES)))
+    counts = [0, 0]
+    batches, results = queue.Queue(QUEUE_SIZE), queue.Queue(QUEUE_SIZE)
+    reader = threading.Thread(target=_readBatches, args=(infile, int(batchSize), batches, stages), daemon=True)
+    writer = threading.Thread(target=_writeBatches, args=(outfile, results, counts))
+    reader.start()
+    writer.start()
+
+    pool = multiprocessing.Pool(int(processes)) if int(processes) > 1 else None
+    try:
+        tasks = _tasks(batches, counts)
+        processed = pool.imap(_applyStages, tasks) if pool else map(_applyStages, tasks)
+        for records in processed:
+            results.put(records)
+    finally:
+        results.put(None)
+        writer.join()
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return(tuple(counts))
+
+def parseStages(args):
+    """Given command line words such as ['trim', '4', '20', 'minlen', '50',
+    'fasta'], returns the list of (stage, [arguments]) for runPipeline.
+    Words that are not stage names are taken as arguments to the stage before.
+    """
+    stages = []
+    for arg in args:
+        if arg.lower() in STAGES:
+            stages.append((arg.lower(), []))
+        elif stages:
+            stages[-1][1].append(arg)
+        else:
+            raise Exception("Error: Unknown pipe stage '{}', choose from: {}".format(arg, ', '.join(STAGES)))
+    return(stages)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+import json
+import numpy as np
+import biocore
+
+# Reads are processed this many at a time
+BATCH_SIZE = 100000
+# Phred scores are tallied from 0 up to this value (Sanger/Illumina 1.8+ tops out at 93)
+MAX_QUAL = 93
+# Bases tallied by cycle, in column order (anything else counts as N)
+COMPOSITION = ['A', 'C', 'G', 'T', 'N']
+# Distinct sequences held for duplicate estimation before sampling kicks in
+DUPLICATE_KEYS = 1 << 20
+
+def iterBatches(filename, batchSize=BATCH_SIZE):
+    """Given a fastq, yields lists of (sequences, qualities) of up to
+    batchSize reads at a time.
+    """
+    seqs, quals = [], []
+    for name, seq, qual in biocore.iterRecords(filename):
+        if qual is None:
+            raise Exception("Error: Quality statistics need a fastq, not a fasta.")
+        seqs.append(seq)
+        quals.append(qual)
+        if len(seqs) == batchSize:
+            yield(seqs, quals)
+            seqs, quals = [], []
+    if seqs:
+        yield(seqs, quals)
+
+class DuplicateCounter(object):
+    """Estimates the fraction of duplicate reads in bounded memory. Reads are
+    hashed and only those whose hash falls in the current sample (low bits
+    all zero) are counted; each time more than maxKeys distinct hashes are
+    held the sample is halved. All copies of a sequence share a hash, so the
+    sampled duplicate rate is an unbiased estimate, and exact while fewer
+    than maxKeys distinct sequences have been seen.
+    """
+
+    def __init__(self, maxKeys=DUPLICATE_KEYS):
+        self.maxKeys = maxKeys
+        self.mask = 0
+        self.counts = {}
+
+    def add(self, seqs):
+        counts, mask = self.counts, self.mask
+        for seq in seqs:
+            key = hash(seq)
+            if key & mask == 0:
+                counts[key] = counts.get(key, 0) + 1
+        while len(counts) > self.maxKeys:
+            self.mask = (self.mask << 1) | 1
+            self.counts = counts = dict((k, v) for k, v in counts.items() if k & self.mask == 0)
+
+    def rate(self):
+        sampled = sum(self.counts.values())
+        return(1 - len(self.counts) / sampled if sampled else 0.0)
+
+class QCReport(object):
+    """Quality control tallies for a fastq, as returned by fastqQC. Holds
+    histograms rather than reads: quality counts per position (position x
+    Phred score), base counts per cycle (position x COMPOSITION), and read
+    length and mean read quality histograms.
+    """
+
+    def __init__(self, filename, offset=33):
+        self.filename = filename
+        self.offset = offset
+        self.reads = self.bases = 0
+        self.positionQuals = np.zeros((0, MAX_QUAL + 1), dtype=np.int64)
+        self.composition = np.zeros((0, len(COMPOSITION)), dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.meanQuals = np.zeros(MAX_QUAL + 1, dtype=np.int64)
+        self.duplicates = DuplicateCounter()
+
+    def _grow(self, length):
+        """Extend the per-position tables to cover reads of the given length."""
+        if length > len(self.positionQuals):
+            extra = length - len(self.positionQuals)
+            self.positionQuals = np.vstack((self.positionQuals, np.zeros((extra, MAX_QUAL + 1), dtype=np.int64)))
+            self.composition = np.vstack((self.composition, np.zeros((extra, len(COMPOSITION)), dtype=np.int64)))
+        if length >= len(self.lengths):
+            self.lengths = np.concatenate((self.lengths, np.zeros(length + 1 - len(self.lengths), dtype=np.int64)))
+
+    def add(self, seqs, quals):
+        """Tally a batch of reads: all reads are joined into single arrays and
+        every table is updated with one bincount each.
+        """
+        lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+        bases = biocore._asArray(''.join(seqs))
+        scores = biocore._asArray(''.join(quals)).astype(np.int16) - self.offset
+        if len(scores) != len(bases):
+            raise Exception("Error: Sequence and quality lengths differ in {}.".format(self.filename))
+        if len(scores) and (scores.min() < 0 or scores.max() > MAX_QUAL):
+            raise Exception("Error: Quality scores outside Phred+{} range in {}.".format(self.offset, self.filename))
+
+        self._grow(int(lengths.max()) if len(lengths) else 0)
+        width = len(self.positionQuals)
+        starts = np.cumsum(lengths) - lengths
+        cycles = np.arange(len(bases)) - np.repeat(starts, lengths)
+
+        self.positionQuals += np.bincount(cycles * (MAX_QUAL + 1) + scores,
+                                          minlength=width * (MAX_QUAL + 1)).reshape(width, MAX_QUAL + 1)
+        codes = np.minimum(biocore._BASE_CODES[bases], 4)
+        self.composition += np.bincount(cycles * len(COMPOSITION) + codes,
+                                        minlength=width * len(COMPOSITION)).reshape(width, len(COMPOSITION))
+        self.lengths += np.bincount(lengths, minlength=len(self.lengths))
+
+        nonEmpty = lengths > 0
+        sums = np.add.reduceat(scores.astype(np.int64), starts[nonEmpty]) if nonEmpty.any() else np.zeros(0)
+        self.meanQuals += np.bincount((sums // lengths[nonEmpty]).astype(np.int64), minlength=MAX_QUAL + 1)
+        self.duplicates.add(seqs)
+
+        self.reads += len(seqs)
+        self.bases += len(bases)
+
+    def positionSummary(self):
+        """Return per-position quality (mean, 10th, 25th, 50th, 75th and 90th
+        percentile) as an array, one row per position, from the histograms.
+        """
+        counts = self.positionQuals
+        totals = counts.sum(axis=1)
+        scores = np.arange(MAX_QUAL + 1)
+        summary = np.zeros((len(counts), 6))
+        summary[:, 0] = np.divide(counts @ scores, totals, out=np.zeros(len(counts)), where=totals > 0)
+        cumulative = np.cumsum(counts, axis=1)
+        for column, fraction in enumerate((0.1, 0.25, 0.5, 0.75, 0.9), 1):
+            summary[:, column] = (cumulative < (totals * fraction)[:, None]).sum(axis=1)
+        return(summary)
+
+    def toDict(self):
+        """Return the headline figures as a dictionary."""
+        lengths = np.flatnonzero(self.lengths)
+        meanQuals = np.arange(MAX_QUAL + 1)
+        return({'file': self.filename, 'reads': self.reads, 'bases': self.bases,
+                'shortest': int(lengths[0]) if len(lengths) else 0,
+                'longest': int(lengths[-1]) if len(lengths) else 0,
+                'meanLength': self.bases / self.reads if self.reads else 0.0,
+                'meanQuality': round(float(self.positionQuals.sum(axis=0) @ meanQuals) / self.bases, 2) if self.bases else 0.0,
+                'Q20': round(float(self.positionQuals[:, 20:].sum()) / self.bases * 100, 2) if self.bases else 0.0,
+                'Q30': round(float(self.positionQuals[:, 30:].sum()) / self.bases * 100, 2) if self.bases else 0.0,
+                'GC': round(float(self.composition[:, 1:3].sum()) / self.bases * 100, 2) if self.bases else 0.0,
+                'duplicateRate': round(self.duplicates.rate() * 100, 2)})
+
+    def toJSON(self):
+        return(json.dumps(self.toDict()))
+
+    def writeTables(self, prefix):
+        """Write the per-position, length and mean quality tables as
+        tab-separated files named <prefix>.<table>.tsv, returning their paths.
+        """
+        paths = [prefix + '.positions.tsv', prefix + '.lengths.tsv', prefix + '.meanquals.tsv']
+        summary = self.positionSummary()
+        composition = self.composition / np.maximum(self.composition.sum(axis=1), 1)[:, None] * 100
+        with open(paths[0], 'w') as f:
+            f.write('Position\tMean\tP10\tP25\tMedian\tP75\tP90\t' + '\t'.join('%' + i for i in COMPOSITION) + '\n')
+            for position in range(len(summary)):
+                f.write('{}\t{:.2f}\t{:g}\t{:g}\t{:g}\t{:g}\t{:g}\t'.format(position + 1, *summary[position])
+                        + '\t'.join('{:.2f}'.format(i) for i in composition[position]) + '\n')
+        with open(paths[1], 'w') as f:
+            f.write('Length\tReads\n')
+            for length in np.flatnonzero(self.lengths):
+                f.write('{}\t{}\n'.format(length, self.lengths[length]))
+        with open(paths[2], 'w') as f:
+            f.write('MeanQuality\tReads\n')
+            for score in np.flatnonzero(self.meanQuals):
+                f.write('{}\t{}\n'.format(score, self.meanQuals[score]))
+        return(paths)
+
+def fastqQC(filename, offset=33, batchSize=BATCH_SIZE):
+    """Given a fastq, returns a QCReport from a single streamed pass, reading
+    batchSize reads at a time so memory stays bounded whatever the run size.
+    """
+    report = QCReport(filename, offset=offset)
+    for seqs, quals in iterBatches(filename, batchSize):
+        report.add(seqs, quals)
+    return(report)
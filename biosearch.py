@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+import os
+import numpy as np
+import biocore
+
+# Motif patterns checked at once by MotifSet, one per bit of a uint64
+WORD_BITS = 64
+# Windows MotifSet checks per NumPy operation, bounding its memory use
+SCAN_BLOCK = 1 << 20
+
+##################
+# Motif matching #
+##################
+
+def _motifTable(motif):
+    """Given a motif, returns a (motif length x 256) boolean table marking which
+    sequence bytes are accepted at each motif position, following Idict.
+    """
+    table = np.zeros((len(motif), 256), dtype=bool)
+    for j, base in enumerate(motif.upper()):
+        if base not in biocore.Idict:
+            raise Exception("Error: Unrecognised base '{}' in motif '{}'.".format(base, motif))
+        for allowed in biocore.Idict[base]:
+            table[j, ord(allowed)] = True
+    return(table)
+
+def _reverseMotif(motif):
+    """Return the reverse complement of an IUPAC motif."""
+    return(biocore._complement(motif.upper().replace('U', 'T'), reverse=True))
+
+def matchMotif(seq, motif):
+    """Given a sequence (string or PackedSeq) and an IUPAC motif, returns a
+    NumPy array of the 0-based start positions of every forward strand match.
+    Each motif position is checked against every window at once.
+    """
+    arr = biocore._UPPER[biocore._asArray(seq)]
+    n = len(arr) - len(motif) + 1
+    if n <= 0 or len(motif) == 0:
+        return(np.zeros(0, dtype=np.int64))
+    table = _motifTable(motif)
+    hits = table[0][arr[:n]]
+    for j in range(1, len(motif)):
+        hits &= table[j][arr[j:j+n]]
+    return(np.flatnonzero(hits))
+
+def _motifChunk(view, owned, motif):
+    """Chunk worker (see bioparallel): matches starting within the owned bases."""
+    hits = matchMotif(view, motif)
+    return(hits[hits < owned])
+
+class MotifSet(object):
+    """A set of IUPAC motifs compiled once into bit-parallel tables, so that
+    any number of motifs are found in one pass over a sequence. Patterns
+    (each motif, plus its reverse complement with strands='both') are packed
+    64 to a uint64 word, and each word has a table per pattern position of
+    which of its patterns accept each byte there. ANDing these tables over a
+    window's bases leaves the bits of every pattern matching it, for a whole
+    block of windows at a time. Palindromic motifs are only reported on '+'.
+    """
+
+    def __init__(self, motifs, strands='both'):
+        if isinstance(motifs, str):
+            motifs = [motifs]
+        self.motifs = list(dict.fromkeys(i.upper() for i in motifs)) # de-duplicated, in order
+
+        patterns = []
+        for motif in self.motifs:
+            if len(motif) == 0:
+                raise Exception("Error: Empty motif supplied.")
+            patterns.append((motif, '+', motif))
+            if strands == 'both' and _reverseMotif(motif) != motif:
+                patterns.append((motif, '-', _reverseMotif(motif)))
+        patterns.sort(key=lambda pattern: len(pattern[2])) # Similar lengths share words, so fewer positions are checked
+
+        self._words = [] # (tables, [(motif, strand)] by bit)
+        for first in range(0, len(patterns), WORD_BITS):
+            group = patterns[first:first + WORD_BITS]
+            tables = np.zeros((len(group[-1][2]), 256), dtype=np.uint64)
+            for bit, (motif, strand, pattern) in enumerate(group):
+                accepts = np.ones(tables.shape, dtype=bool) # Positions past a pattern's end accept anything
+                accepts[:len(pattern)] = _motifTable(pattern)
+                tables[accepts] |= np.uint64(1) << np.uint64(bit)
+            self._words.append((tables, [(motif, strand) for motif, strand, pattern in group]))
+
+    def _scanWord(self, arr, tables, start, n):
+        """Return (window starts, match bits) for one word over arr[start:start+n]."""
+        windows = np.arange(start, start + n)
+        state = tables[0][arr[windows]]
+        for j in range(1, len(tables)):
+            if 4 * len(windows) > n and 4 * np.count_nonzero(state) <= len(windows):
+                live = np.flatnonzero(state) # Most windows have failed, so only check the rest from here on
+                windows, state = windows[live], state[live]
+            state &= tables[j][arr[windows + j]]
+        live = np.flatnonzero(state)
+        return(windows[live], state[live])
+
+    def scan(self, seq):
+        """Given a sequence (string or PackedSeq), returns a dictionary of
+        {motif: {'+': [positions], '-': [positions]}} with 1-based start
+        positions on the forward strand.
+        """
+        arr = biocore._UPPER[biocore._asArray(seq)]
+        found = dict((motif, {'+': [], '-': []}) for motif in self.motifs)
+        for tables, patterns in self._words:
+            padded = np.concatenate((arr, np.zeros(len(tables) - 1, dtype=np.uint8))) # Byte 0 ends any pattern running off the end
+            for start in range(0, len(arr), SCAN_BLOCK):
+                windows, state = self._scanWord(padded, tables, start, min(SCAN_BLOCK, len(arr) - start))
+                for bit, (motif, strand) in enumerate(patterns):
+                    hits = windows[(state >> np.uint64(bit)) & np.uint64(1) != 0]
+                    if len(hits):
+                        found[motif][strand].append(hits + 1)
+        return(dict((motif, dict((strand, np.concatenate(hits).tolist() if hits else []) for strand, hits in strands.items()))
+                    for motif, strands in found.items()))
+
+def searchMotifs(motifs, seq, strands='both'):
+    """Given a list of IUPAC motifs and a fasta/q <file location> or sequence
+    <string>, returns the hits for every motif on both strands (or '+' only)
+    as {contig: {motif: {'+': [positions], '-': [positions]}}} for a file
+    or {motif: {'+': [positions], '-': [positions]}} for a sequence.
+    """
+    motifSet = MotifSet(motifs, strands=strands)
+    if not biocore.isInputFile(seq):
+        return(motifSet.scan(seq))
+    return(dict((name, motifSet.scan(contig)) for name, contig, qual in biocore.iterRecords(seq)))
+
+def readMotifs(motifs):
+    """Given a file of motifs (one per line) or a comma-separated string,
+    returns a list of motifs.
+    """
+    if os.path.isfile(motifs):
+        with open(motifs, 'r') as f:
+            return([line.strip() for line in f if line.strip() and not line.startswith('#')])
+    return([i for i in motifs.split(',') if i])
+
+def reportMotifs(motifs, seq, strands='both'):
+    """Print a table of contig, motif, strand, count and positions for every
+    motif found by searchMotifs.
+    """
+    hits = searchMotifs(readMotifs(motifs), seq, strands=strands)
+    if not biocore.isInputFile(seq):
+        hits = {'sequence': hits}
+    print('Contig\tMotif\tStrand\tCount\tPositions')
+    for contig, motifHits in hits.items():
+        for motif, strandHits in motifHits.items():
+            for strand, positions in strandHits.items():
+                if positions:
+                    print('{}\t{}\t{}\t{}\t{}'.format(contig, motif, strand, len(positions), ','.join(map(str, positions))))
+
+#####################
+# Full-text indexes #
+#####################
+
+# Contigs are joined with this byte, which no motif base can match
+_SEPARATOR = b'$'
+
+def _suffixArray(text):
+    """Given a uint8 array, returns its suffix array by prefix doubling, with
+    each round sorting every suffix at once on (rank, rank k bases on).
+    """
+    n = len(text)
+    rank = text.astype(np.int64)
+    scale = max(n, 256) + 1 # above any rank, n < ~3e9 keeps keys within int64
+    k = 1
+    while True:
+        following = np.full(n, -1, dtype=np.int64)
+        following[:n-k] = rank[k:]
+        key = rank * scale + following + 1
+        sa = np.argsort(key, kind='stable')
+        key = key[sa]
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.cumsum(np.concatenate(([0], key[1:] != key[:-1])))
+        if n == 0 or rank[sa[-1]] == n - 1 or k >= n: # every suffix now distinct
+            return(sa)
+        k *= 2
+
+def indexFiles(fasta):
+    """Return the (suffix array, text, metadata) paths for a fasta's full-text index."""
+    return(fasta + '.sa.npy', fasta + '.sa.text.npy', fasta + '.sa.meta.npz')
+
+def buildTextIndex(fasta):
+    """Given a fasta/q, builds a persistent full-text index alongside it: the
+    uppercased contigs joined into one text (.sa.text.npy), its suffix array
+    (.sa.npy) and the contig names and offsets (.sa.meta.npz). The index only
+    has to be built once, after which exact and IUPAC motif queries take time
+    proportional to the motif length and number of hits, not genome length.
+    """
+    names, offsets, parts = [], [0], []
+    for name, seq, qual in biocore.iterRecords(fasta):
+        names.append(name)
+        parts.append(seq.encode())
+        offsets.append(offsets[-1] + len(seq) + 1)
+    text = np.frombuffer(_SEPARATOR.join(parts) + _SEPARATOR, dtype=np.uint8)
+
+    sa = _suffixArray(text)
+    sa = sa.astype(np.int32 if len(text) < 2 ** 31 else np.int64)
+
+    saPath, textPath, metaPath = indexFiles(fasta)
+    np.save(saPath, sa)
+    np.save(textPath, text)
+    stat = os.stat(fasta)
+    np.savez(metaPath, names=np.array(names, dtype=str), offsets=np.array(offsets, dtype=np.int64),
+             source=np.array([stat.st_mtime, stat.st_size], dtype=np.float64))
+    return(TextIndex(fasta))
+
+def loadTextIndex(fasta):
+    """Given a fasta, returns its TextIndex if one has been built and the fasta
+    has not changed since, else None.
+    """
+    if not all(os.path.isfile(path) for path in indexFiles(fasta)):
+        return(None)
+    index = TextIndex(fasta)
+    stat = os.stat(fasta)
+    if index.source[0] != stat.st_mtime or index.source[1] != stat.st_size:
+        return(None)
+    return(index)
+
+class TextIndex(object):
+    """A memory-mapped suffix array over all contigs of a fasta/q, as written
+    by buildTextIndex. Motifs are located by binary search, narrowing the
+    suffix array range one motif base at a time so that IUPAC bases only
+    branch where the expanded prefixes actually occur.
+    """
+
+    def __init__(self, fasta):
+        saPath, textPath, metaPath = indexFiles(fasta)
+        self.sa = np.load(saPath, mmap_mode='r')
+        self.text = np.load(textPath, mmap_mode='r')
+        with np.load(metaPath) as meta:
+            self.names = [str(i) for i in meta['names']]
+            self.offsets = meta['offsets']
+            self.source = meta['source']
+
+    def _narrow(self, lo, hi, depth, byte):
+        """Within suffix array range [lo, hi), whose suffixes share a prefix of
+        length depth, return the subrange followed by the given byte.
+        """
+        sa, text, n = self.sa, self.text, len(self.text)
+
+        def baseAt(i): # Suffixes which end before depth sort first
+            position = int(sa[i]) + depth
+            return(int(text[position]) if position < n else -1)
+
+        start, end = lo, hi
+        while start < end:
+            mid = (start + end) // 2
+            if baseAt(mid) < byte:
+                start = mid + 1
+            else:
+                end = mid
+        stop, end = start, hi
+        while stop < end:
+            mid = (stop + end) // 2
+            if baseAt(mid) <= byte:
+                stop = mid + 1
+            else:
+                end = mid
+        return(start, stop)
+
+    def ranges(self, motif):
+        """Return the suffix array ranges of every occurrence of an IUPAC motif."""
+        tables = _motifTable(motif)
+        ranges = [(0, len(self.sa))]
+        for depth in range(len(motif)):
+            allowed = np.flatnonzero(tables[depth])
+            ranges = [sub for lo, hi in ranges for sub in (self._narrow(lo, hi, depth, int(b)) for b in allowed) if sub[1] > sub[0]]
+            if not ranges:
+                break
+        return(ranges)
+
+    def positions(self, motif):
+        """Return the sorted 0-based positions of a motif within the joined text."""
+        hits = [np.asarray(self.sa[lo:hi], dtype=np.int64) for lo, hi in self.ranges(motif)]
+        return(np.sort(np.concatenate(hits)) if hits else np.zeros(0, dtype=np.int64))
+
+    def count(self, motif):
+        return(sum(hi - lo for lo, hi in self.ranges(motif)))
+
+    def find(self, motif):
+        """Given an IUPAC motif, returns the forward strand hits as a dictionary
+        of {contig: [1-based start positions]}, omitting contigs without hits.
+        """
+        positions = self.positions(motif)
+        contigs = np.searchsorted(self.offsets, positions, side='right') - 1
+        hits = {}
+        for contig in np.unique(contigs):
+            hits[self.names[contig]] = (positions[contigs == contig] - self.offsets[contig] + 1).tolist()
+        return(hits)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import biocore
+
+# Bases drawn for each base set, as accepted by createFasta
+ALPHABETS = {'DNA': 'ACGT', 'DNA+': 'ACGTRYSWKMBDHVN.', 'RNA': 'ACGU',
+             'PROTEIN': 'ABCDGHJIKLMPQRSTVWXYZ'}
+# Reads are simulated and written this many at a time
+BATCH_SIZE = 10000
+# Highest Phred score given to simulated qualities
+MAX_QUAL = 41
+
+#############
+# Sequences #
+#############
+
+def _rng(seed):
+    return(seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed))
+
+def baseProbabilities(gcBias=0.5, bases='DNA'):
+    """Return the draw probability of each base in ALPHABETS[bases]. GC bias
+    only applies to DNA/RNA, where A/T(U) and C/G are linked.
+    """
+    if bases.upper() not in ALPHABETS:
+        raise Exception("Error: Unrecognised base type '{}' selected.".format(bases))
+    if gcBias < 0 or gcBias > 1:
+        raise Exception("Error: Supplied GCbias '{}' must not be beyond the bounds of 0 to 1.".format(gcBias))
+    if bases.upper() in ('DNA', 'RNA'):
+        return(np.array([(1 - gcBias) / 2, gcBias / 2, gcBias / 2, (1 - gcBias) / 2]))
+    size = len(ALPHABETS[bases.upper()])
+    return(np.full(size, 1 / size))
+
+def randomSequence(length, gcBias=0.5, bases='DNA', seed=None):
+    """Return a random sequence of the given length as a uint8 array, with
+    every base drawn at once.
+    """
+    probabilities = baseProbabilities(gcBias, bases)
+    alphabet = np.frombuffer(ALPHABETS[bases.upper()].encode(), dtype=np.uint8)
+    codes = _rng(seed).choice(len(alphabet), size=int(length), p=probabilities)
+    return(alphabet[codes])
+
+def _resolve(motif, rng):
+    """Return one concrete sequence matching an IUPAC motif, ambiguity codes
+    being filled with random compatible bases.
+    """
+    return(''.join(rng.choice(sorted(set(biocore.Idict[base]) & set('ACGT'))) for base in motif.upper()))
+
+def addRepeats(arr, copies=10, repeatLength=1000, divergence=0.0, seed=None):
+    """Copy one random segment of repeatLength bases to copies random places
+    in arr (in place), each copy with a divergence fraction of its bases
+    substituted. Returns the repeat's source and copy starts.
+    """
+    rng = _rng(seed)
+    if len(arr) < 2 * repeatLength or copies <= 0:
+        return(0, np.zeros(0, dtype=np.int64))
+    source = int(rng.integers(0, len(arr) - repeatLength + 1))
+    repeat = arr[source:source + repeatLength].copy()
+    starts = rng.integers(0, len(arr) - repeatLength + 1, size=int(copies))
+    for start in starts:
+        copy = repeat.copy()
+        changed = rng.random(repeatLength) < divergence
+        shifted = (biocore._BASE_CODES[copy[changed]] + rng.integers(1, 4, size=int(changed.sum()))) % 4
+        copy[changed] = biocore._CODE_BASES[shifted]
+        arr[start:start + repeatLength] = copy
+    return(source, np.sort(starts))
+
+def addNRuns(arr, runs=0, runLength=100, seed=None):
+    """Mask runs random stretches of runLength bases in arr as N (in place),
+    returning their starts.
+    """
+    rng = _rng(seed)
+    if len(arr) <= runLength or runs <= 0:
+        return(np.zeros(0, dtype=np.int64))
+    starts = np.sort(rng.integers(0, len(arr) - runLength + 1, size=int(runs)))
+    mask = np.zeros(len(arr) + 1, dtype=np.int64)
+    np.add.at(mask, starts, 1)
+    np.add.at(mask, starts + runLength, -1)
+    arr[np.cumsum(mask[:-1]) > 0] = ord('N')
+    return(starts)
+
+def plantSites(arr, sites, count=10, seed=None):
+    """Write count copies of each site (IUPAC motifs, or enzyme names from
+    biodigest.ENZYMES) into arr in place, in random non-overlapping slots.
+    Returns a dictionary of {site: array of 0-based starts}; other matches
+    may of course occur by chance as well.
+    """
+    import biodigest # Imported here as biodigest itself depends on biocore
+    rng = _rng(seed)
+    enzymes = set(i.upper() for i in biodigest.ENZYMES)
+    motifs = [(site, biodigest.getEnzyme(site)[1] if site.upper() in enzymes else site.upper()) for site in sites]
+    if not motifs:
+        return({})
+
+    slot = max(len(motif) for site, motif in motifs)
+    slots = len(arr) // slot
+    total = min(int(count) * len(motifs), slots)
+    chosen = rng.choice(slots, size=total, replace=False) * slot
+    planted = {}
+    for i, (site, motif) in enumerate(motifs):
+        starts = np.sort(chosen[i::len(motifs)])
+        for start in starts:
+            arr[start:start + len(motif)] = np.frombuffer(_resolve(motif, rng).encode(), dtype=np.uint8)
+        planted[site] = starts
+    return(planted)
+
+def simulateGenome(lengths, gcBias=0.5, nRuns=0, nRunLength=100, repeats=0, repeatLength=1000,
+                   divergence=0.0, sites=(), count=10, seed=None):
+    """Given contig lengths, returns (records, planted): a list of (name,
+    sequence) and, per contig, the dictionary of planted site starts (see
+    plantSites). Each contig is drawn in bulk with the given GC bias, then
+    given repeat copies, N-runs and planted sites, in that order, so planted
+    sites are never masked.
+    """
+    rng = _rng(seed)
+    records, planted = [], []
+    for i, length in enumerate(lengths):
+        arr = randomSequence(length, gcBias, 'DNA', rng)
+        addRepeats(arr, repeats, repeatLength, divergence, rng)
+        addNRuns(arr, nRuns, nRunLength, rng)
+        planted.append(plantSites(arr, sites, count, rng))
+        records.append(('Contig{}'.format(i), arr.tobytes().decode()))
+    return(records, planted)
+
+def writeGenome(filename, lengths, **options):
+    """simulateGenome, written straight to a fasta. Returns the planted sites."""
+    records, planted = simulateGenome(lengths, **options)
+    biocore.writeFasta([name for name, seq in records], [seq for name, seq in records], filename=filename)
+    return(planted)
+
+#########
+# Reads #
+#########
+
+def simulateQualities(count, readLength, start=38, end=28, sd=3.0, seed=None):
+    """Return a (count x readLength) array of Phred scores, falling linearly
+    from start to end along the read with normal noise, as on Illumina runs.
+    """
+    rng = _rng(seed)
+    mean = np.linspace(start, end, int(readLength))
+    quals = np.rint(mean + rng.normal(0, sd, size=(int(count), int(readLength))))
+    return(np.clip(quals, 2, MAX_QUAL).astype(np.uint8))
+
+def simulateReads(records, count, readLength=150, start=38, end=28, sd=3.0, errors=True, seed=None):
+    """Given (name, sequence) records, yields batches of (names, sequences,
+    qualities) for count reads of readLength, sampled uniformly from both
+    strands, as (reads x readLength) uint8 arrays. Substitution errors are
+    made at the rate each base's simulated quality implies if errors is True.
+    """
+    rng = _rng(seed)
+    seqs = [biocore._UPPER[biocore._asArray(seq)] for name, seq in records]
+    names = [name for name, seq in records]
+    usable = np.array([max(len(seq) - readLength + 1, 0) for seq in seqs], dtype=np.float64)
+    if not usable.sum():
+        raise Exception("Error: No sequence is at least as long as the reads ({} bases).".format(readLength))
+    genome = np.concatenate(seqs)
+    offsets = np.concatenate(([0], np.cumsum([len(seq) for seq in seqs])))
+
+    done = 0
+    while done < count:
+        size = min(BATCH_SIZE, count - done)
+        contigs = rng.choice(len(seqs), size=size, p=usable / usable.sum())
+        starts = (rng.random(size) * usable[contigs]).astype(np.int64)
+        bases = genome[(offsets[contigs] + starts)[:, None] + np.arange(readLength)]
+        reverse = rng.random(size) < 0.5
+        bases[reverse] = biocore._COMPLEMENT_LUT[bases[reverse][:, ::-1]]
+        quals = simulateQualities(size, readLength, start, end, sd, rng)
+        if errors:
+            wrong = (rng.random(bases.shape) < 10 ** (quals / -10.0)) & (biocore._BASE_CODES[bases] < 4)
+            shifted = (biocore._BASE_CODES[bases[wrong]] + rng.integers(1, 4, size=int(wrong.sum()))) % 4
+            bases[wrong] = biocore._CODE_BASES[shifted]
+        readNames = ['read{}_{}:{}{}'.format(done + i, names[c], s + 1, '-' if r else '+')
+                     for i, (c, s, r) in enumerate(zip(contigs.tolist(), starts.tolist(), reverse.tolist()))]
+        yield(readNames, bases, quals)
+        done += size
+
+def writeReads(filename, records, count, readLength=150, offset=33, **options):
+    """simulateReads, written to a fastq in batches. records may also be a
+    fasta/q file. Returns the number of reads written.
+    """
+    if isinstance(records, str):
+        records = [(name, seq) for name, seq, qual in biocore.iterRecords(records)]
+    written = 0
+    with open(filename, 'w') as out:
+        for names, bases, quals in simulateReads(records, int(count), int(readLength), **options):
+            seqs = bases.tobytes().decode()
+            scores = (quals + offset).tobytes().decode()
+            out.write(''.join('@{}\n{}\n+\n{}\n'.format(name, seqs[i*readLength:(i+1)*readLength],
+                                                       scores[i*readLength:(i+1)*readLength])
+                              for i, name in enumerate(names)))
+            written += len(names)
+    return(written)
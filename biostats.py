@@ -2,156 +2,325 @@
 
 import os
 import sys
+import json
+import math
+import multiprocessing
+import numpy as np
 import biocore
 
 ######################################
 # Functions with a statistical focus #
 ######################################
 
-def getStats(filename, givenThreshold=500, scaffold=False, returnLens=False):
-    """Given a fasta or fastq, returns range of bioinformatic metrics.
-    Can also optionally return the full list of sequence lengths.
+class AssemblyStats(object):
+    """Summary statistics for one fasta/q, as returned by getStats. Lengths
+    are kept as a NumPy array; every other metric is an attribute listed in
+    FIELDS and can be written out with toDict, toJSON or toTSV.
     """
 
-    # getStats can probably eventually become a gateway to call multiple stats functions
-    # these additional functions could then be called directly with biostats <fasta> calling getStats by default
+    FIELDS = ['file', 'contigs', 'total', 'mean', 'median', 'longest', 'shortest',
+              'N50', 'N90', 'L50', 'L90', 'auN', 'GC', 'Ns', 'ambiguous',
+              'threshold', 'contigsThreshold', 'totalThreshold', 'N50threshold']
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+        self.lengths = values.get('lengths')
+
+    def toDict(self):
+        return(dict((field, getattr(self, field)) for field in self.FIELDS))
+
+    def toJSON(self):
+        return(json.dumps(self.toDict()))
+
+    def toTSV(self, header=True):
+        """Return the statistics as a tab-separated row, optionally below a header line."""
+        row = '\t'.join('' if getattr(self, i) is None else str(getattr(self, i)) for i in self.FIELDS)
+        return('\t'.join(self.FIELDS) + '\n' + row if header else row)
 
-    #Auto-detect file name
-    filetype = biocore.detectType(filename)
+    def __str__(self):
+        N50threshold = self.N50threshold
+        if N50threshold is None:
+            N50threshold = "Error: No contigs longer than {0} bp!".format(self.threshold)
+        return("Mean: " + str(self.mean) + "\n"
+            + "Median: " + str(self.median) + "\n"
+            + "N50: " + str(self.N50) + "\n"
+            + "N90: " + str(self.N90) + "\n"
+            + "L50: " + str(self.L50) + "\n"
+            + "auN: " + str(self.auN) + "\n"
+            + "N50 (>{0} bp): {1}".format(self.threshold, N50threshold) + "\n"
+            + "GC: " + str(self.GC) + "%\n"
+            + "Ns: " + str(self.Ns) + "\n"
+            + "Ambiguous bases: " + str(self.ambiguous) + "\n"
+            + "Longest: " + str(self.longest) + "\n"
+            + "Shortest: " + str(self.shortest) + "\n"
+            + "No. Contigs: " + str(self.contigs) + "\n"
+            + "Total length: " + str(self.total))
 
+def nStats(lengths, fraction=50):
+    """Given an array of lengths, returns (Nx, Lx) for the given percentage:
+    the smallest length that over fraction % of all bases belong to, and the
+    number of sequences at least that long needed to get there.
+    """
+    lengths = np.sort(np.asarray(lengths, dtype=np.int64))[::-1]
+    if len(lengths) == 0:
+        return(None, None)
+    cumulative = np.cumsum(lengths)
+    index = min(int(np.searchsorted(cumulative, cumulative[-1] * fraction / 100, side='right')), len(lengths) - 1)
+    return(int(lengths[index]), index + 1)
 
+def collectStats(filename, givenThreshold=500):
+    """Given a fasta or fastq, returns an AssemblyStats from a single streamed
+    pass: each record's length, GC, N and other non-ACGT counts are taken as
+    it is read, so memory grows with the number of contigs, not their size.
+    """
     threshold = int(givenThreshold) #bp
-    x = -1 # This can probably be replaced with something better suited
-    contigLengths = []
-
-    f = open(filename, "r")
-
-    # Get list of sequence lengths, different for fasta/fastq
-    if filetype == "fasta":
-        contigLengths.append(0)
-        for line in f:
-            if ">" in line:
-                # Create new entry in contigLengths ()
-                contigLengths.append(0)
-                x += 1
-            else:
-                # Add length of line to value for that contig
-                contigLengths[x] += len(line.rstrip('\n'))
-        contigLengths = contigLengths[:-1] # Removes excess list entry
-    elif filetype == "fastq":
-        for line1 in f:
-            line2 = next(f)
-            line3 = next(f)
-            line4 = next(f)
-            contigLengths.append(len(line2.rstrip('\n')))
-
-    totalMean = sum(contigLengths) / len(contigLengths)
-
-    # Calculate N50 (The smallest contig length that at least half the nucleotides belong to)
-    contigLengths.sort(reverse=True)
-
-    tmpTotal = tmpTotalThreshold = 0
-
-    for index, value in enumerate(contigLengths):
-        tmpTotal += int(contigLengths[index])
-        if tmpTotal > (sum(contigLengths) / 2):
-            N50 = contigLengths[index]
-            break
-
-    toremove = []
-    contigThreshold = []
-
-    # Remove below threshold contigs from contigLengths
-    for i in contigLengths: # Find the lengths under the threshold, add to toremove
-        if i <= threshold:
-            toremove.append(i)
-
-    for i in contigLengths: # Add lengths above the threshold to contigThreshold
-        if i not in toremove:
-            contigThreshold.append(i)
-
-    N50threshold = 0
-
-    # This time for the threshold limit only, but only if the threshold removed contigs
-    if len(contigThreshold) == 0:
-        N50threshold = "Error: No contigs longer than {0} bp!".format(threshold)
-    elif len(contigThreshold) != len(contigLengths):
-        for index, value in enumerate(contigThreshold):
-            tmpTotalThreshold += int(contigThreshold[index])
-            if tmpTotalThreshold > (sum(contigThreshold) / 2):
-                N50threshold = contigThreshold[index]
-                break
-    else:
-        N50threshold = N50
+    lengths = []
+    GC = Ns = ambiguous = 0
+    for name, seq, qual in biocore.iterRecords(filename):
+        tally = _baseTally(seq)
+        gc, n = int(tally[ord('G')] + tally[ord('C')]), int(tally[ord('N')])
+        lengths.append(len(seq))
+        GC += gc
+        Ns += n
+        ambiguous += len(seq) - gc - n - int(tally[ord('A')] + tally[ord('T')] + tally[ord('U')])
+    if not lengths:
+        raise Exception("Error: No sequences found in {}.".format(filename))
+
+    lengths = np.array(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    N50, L50 = nStats(lengths, 50)
+    N90, L90 = nStats(lengths, 90)
+    aboveThreshold = lengths[lengths > threshold]
+
+    return(AssemblyStats(file=filename, lengths=lengths, contigs=len(lengths), total=total,
+                         mean=total / len(lengths), median=float(np.median(lengths)),
+                         longest=int(lengths.max()), shortest=int(lengths.min()),
+                         N50=N50, N90=N90, L50=L50, L90=L90,
+                         auN=round(float((lengths.astype(np.float64) ** 2).sum() / total), 2) if total else 0.0,
+                         GC=round(GC / total * 100, 2) if total else 0.0, Ns=Ns, ambiguous=ambiguous,
+                         threshold=threshold, contigsThreshold=len(aboveThreshold),
+                         totalThreshold=int(aboveThreshold.sum()), N50threshold=nStats(aboveThreshold, 50)[0]))
+
+def getStats(filename, givenThreshold=500, scaffold=False, returnLens=False, output='text'):
+    """Given a fasta or fastq, returns range of bioinformatic metrics as an
+    AssemblyStats, printing them as text, 'json' or 'tsv'. Can also
+    optionally print the full list of sequence lengths.
+    """
+
+    # getStats can probably eventually become a gateway to call multiple stats functions
+    # these additional functions could then be called directly with biostats <fasta> calling getStats by default
 
-    # Calculate GC
-    statsGC = getGC(filename, total=True)
+    stats = collectStats(filename, givenThreshold)
 
     # Optional: Return full list of contig lengths
     if returnLens:
-        print ("Contig lengths: " + str(contigLengths))
-
-    print ("Mean: " + str(totalMean))
-    print ("N50: " + str(N50))
-    print ("N50 (>{0} bp): {1}".format(threshold, N50threshold))
-    print ("GC: " + str(statsGC) + "%")
-    print ("Longest: " + str(max(contigLengths)))
-    print ("Shortest: " + str(min(contigLengths)))
-    print ("No. Contigs: " + str(len(contigLengths)))
-    print ("Total length: " + str(sum(contigLengths)))
-    # Consider changing all stats in relation to a threshold
-    # Could also add mode, median etc.
+        print ("Contig lengths: " + str(sorted(stats.lengths.tolist(), reverse=True)))
+
+    if output == 'json':
+        print(stats.toJSON())
+    elif output == 'tsv':
+        print(stats.toTSV())
+    else:
+        print(stats)
+    return(stats)
+
+def _fileStats(task):
+    """Worker: collect the statistics of one file, returning any error as text."""
+    filename, threshold = task
+    try:
+        return(collectStats(filename, threshold))
+    except Exception as e:
+        return(str(e))
+
+def batchStats(files, outfile=None, output='tsv', givenThreshold=500, processes=1):
+    """Given many fasta/q files (see biocore.expandFiles), collects the getStats
+    metrics for each over a process pool and writes them as one TSV table or
+    JSON list to outfile (or stdout), printing progress as files complete.
+    Files that cannot be read are reported and skipped. Returns the list of
+    AssemblyStats, in the order of the input files.
+    """
+    files = biocore.expandFiles(files)
+    tasks = [(filename, int(givenThreshold)) for filename in files]
+    results = {}
+    pool = multiprocessing.Pool(int(processes)) if int(processes) > 1 else None
+    try:
+        completed = pool.imap_unordered(_fileStats, tasks) if pool else (_fileStats(task) for task in tasks)
+        for done, stats in enumerate(completed, 1):
+            if isinstance(stats, str):
+                sys.stderr.write("[{}/{}] {}\n".format(done, len(files), stats))
+                continue
+            results[stats.file] = stats
+            sys.stderr.write("[{}/{}] {}\n".format(done, len(files), stats.file))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    stats = [results[filename] for filename in files if filename in results]
+    if output == 'json':
+        text = json.dumps([i.toDict() for i in stats], indent=1)
+    else:
+        text = '\n'.join(['\t'.join(AssemblyStats.FIELDS)] + [i.toTSV(header=False) for i in stats])
+    if outfile:
+        with open(outfile, 'w') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+    return(stats)
+
+def _baseTally(seq):
+    """Given a sequence (string, PackedSeq or array), returns a count of each
+    upper-cased byte from a single bincount.
+    """
+    return(np.bincount(biocore._UPPER[biocore._asArray(seq)], minlength=256))
+
+def _gcTally(seq):
+    """Given a sequence (string, PackedSeq or array), returns (GC, N, length)
+    from a single bincount over its bytes.
+    """
+    tally = _baseTally(seq)
+    return(int(tally[ord('G')] + tally[ord('C')]), int(tally[ord('N')]), int(tally.sum()))
+
+def _gcPercent(GC, length):
+    return(round((float(GC) / float(length)) * 100, 2) if length > 0 else 0.0)
+
+def iterGC(filename):
+    """Given a fasta or fastq, yields (name, GC, N, length) for each record as
+    it is read.
+    """
+    for key, seq, qual in biocore.iterRecords(filename):
+        yield((key,) + _gcTally(seq))
 
 def getGC(filename, total=False):
     """Given the location of a fasta or fastq, returns the GC value for
     each strain as a dictionary by default. Alternatively, the total GC
-    will be returned if total=True.
+    will be returned if total=True. A PackedSeq may also be given in
+    place of a file, in which case its GC is returned.
+    Per strain GC excludes that strain's Ns from its length.
     """
 
-    filetype = biocore.detectType(filename)
+    if isinstance(filename, biocore.PackedSeq):
+        GC, Ncount, length = _gcTally(filename)
+        return(_gcPercent(GC, length - Ncount))
 
-    Ncount = 0
     if (total == False): # Default: return dict of strains with GCs
-        strains = biocore.ToDict(filename) # Convert file into dictionary
-        strainsGC = {}
-        for key in strains: # Calculate GCs and assign to strains
-            GC = 0
-            for base in strains[key][0]: # Workhorse
-                if base.upper() in ("G", "C"):
-                    GC += 1
-                if base.upper() in ("N"):
-                    Ncount += 1
-            GCperc = (float(GC) / float((len(strains[key][0])) - float(Ncount))) * 100
-            strainsGC[key] = round(GCperc, 2)
-        return(strainsGC)
-
-    elif (total): # Alternative: return the total GC for all sequences
-        GC = 0
-        totalLength = 0
-
-        genome = biocore.ToDict(filename)
-        for key in genome:
-            totalLength += len(genome[key][0])
-            for base in genome[key][0]:
-                if base.upper() in ("G", "C"):
-                    GC += 1
-
-        totalGC = (float(GC) / float(totalLength)) * 100
-        return(round(totalGC, 2))
+        return(dict((key, _gcPercent(GC, length - Ncount)) for key, GC, Ncount, length in iterGC(filename)))
+
+    else: # Alternative: return the total GC for all sequences
+        GC = totalLength = 0
+        for key, contigGC, Ncount, length in iterGC(filename):
+            GC += contigGC
+            totalLength += length
+        return(_gcPercent(GC, totalLength))
 
 def getHighestGC(fasta):
     """Given a fasta file location, prints the strain with the highest
     GC content and its value.
     """
-    strainsGC = getGC(fasta) # Get GCs
-    highestGC = 0
+    highestGC = -1
     highestGCstrain = ""
-    for key in strainsGC: # Find the highest GC, return the strain & value
-        if strainsGC[key] > highestGC:
-            highestGC = strainsGC[key]
+    for key, GC, Ncount, length in iterGC(fasta): # Keep only the best so far
+        GCperc = _gcPercent(GC, length - Ncount)
+        if GCperc > highestGC:
+            highestGC = GCperc
             highestGCstrain = key
     print(str(highestGCstrain))
-    print(str(strainsGC[highestGCstrain]))
+    print(str(highestGC))
+
+###############
+# GC profiles #
+###############
+
+def gcProfile(seq, window=1000, step=None):
+    """Given a sequence, returns arrays of window starts, ends (0-based, end
+    exclusive), GC content (%) and GC skew ((G - C) / (G + C)) for sliding
+    windows of the given size, moved step bases at a time (default: window).
+    GC content ignores non-ACGT bases. Sequences shorter than one window give
+    a single window. Counts are summed over bins of gcd(window, step) bases,
+    so no per-base cumulative arrays are kept.
+    """
+    arr = biocore._UPPER[biocore._asArray(seq)]
+    window = int(window)
+    step = window if step is None else int(step)
+    if window <= 0 or step <= 0:
+        raise Exception("Error: Window and step sizes must be positive.")
+    n = len(arr)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return(empty, empty, np.zeros(0), np.zeros(0))
+
+    binSize = math.gcd(window, step)
+    bins = np.arange(0, n, binSize)
+    def binned(mask): # Counts per bin, as a cumulative array over bin boundaries
+        return(np.concatenate(([0], np.cumsum(np.add.reduceat(mask, bins, dtype=np.int64)))))
+    G = binned(arr == ord('G'))
+    C = binned(arr == ord('C'))
+    valid = binned(biocore._BASE_CODES[arr] < 4)
+
+    starts = np.arange(0, max(n - window, 0) + 1, step, dtype=np.int64)
+    ends = np.minimum(starts + window, n)
+    lo, hi = starts // binSize, (ends + binSize - 1) // binSize
+    g, c, v = G[hi] - G[lo], C[hi] - C[lo], valid[hi] - valid[lo]
+
+    gc = np.divide((g + c) * 100.0, v, out=np.zeros(len(starts)), where=v > 0)
+    skew = np.divide((g - c).astype(np.float64), g + c, out=np.zeros(len(starts)), where=(g + c) > 0)
+    return(starts, ends, gc, skew)
+
+def _gcChunk(view, owned, window, step):
+    """Chunk worker (see bioparallel): windows starting within the owned bases."""
+    starts, ends, gc, skew = gcProfile(view, window, step)
+    keep = starts < owned
+    return(starts[keep], ends[keep], gc[keep], skew[keep])
+
+def iterGCProfiles(filename, window=1000, step=None, processes=1):
+    """Given a fasta or fastq, yields (name, length, starts, ends, GC, skew)
+    for every record as returned by gcProfile. With processes > 1 records are
+    held in shared memory and profiled in window-aligned chunks over a
+    process pool.
+    """
+    step = int(window) if step is None else int(step)
+    if int(processes) <= 1:
+        for key, seq, qual in biocore.iterRecords(filename):
+            yield((key, len(seq)) + gcProfile(seq, window, step))
+        return
+
+    import bioparallel
+    chunkSize = step * max(1, bioparallel.CHUNK_SIZE // step) # Chunks start on window starts
+    results = bioparallel.mapFile(filename, _gcChunk, (int(window), step), overlap=int(window),
+                                  processes=processes, chunkSize=chunkSize)
+    for key, length, chunks in bioparallel.groupByContig(results):
+        starts, ends, gc, skew = (np.concatenate(i) for i in zip(*[(s + start, e + start, g, k) for start, (s, e, g, k) in chunks]))
+        yield(key, length, starts, ends, gc, skew)
+
+def writeGCProfile(filename, prefix=None, window=1000, step=None, processes=1):
+    """Given a fasta or fastq, writes GC content, GC skew and cumulative GC
+    skew for sliding windows over every record as three bedGraph files:
+    <prefix>.gc.bedGraph, <prefix>.skew.bedGraph and <prefix>.cumskew.bedGraph.
+    The cumulative skew is summed along each record; its minimum and maximum
+    point to the origin and terminus of replication in bacterial genomes.
+    When windows overlap, each value covers the step-sized interval at the
+    centre of its window, so bedGraph intervals never overlap.
+    """
+    prefix = prefix or os.path.splitext(filename)[0]
+    step = int(window) if step is None else int(step)
+    paths = [prefix + '.gc.bedGraph', prefix + '.skew.bedGraph', prefix + '.cumskew.bedGraph']
+    outs = [open(path, 'w') for path in paths]
+    try:
+        for out, name in zip(outs, ('GC content', 'GC skew', 'Cumulative GC skew')):
+            out.write('track type=bedGraph name="{}"\n'.format(name))
+        for key, length, starts, ends, gc, skew in iterGCProfiles(filename, window, step, processes):
+            if step < int(window): # Non-overlapping step-wide intervals around each window's centre
+                centres = (starts + ends) // 2
+                starts = np.clip(centres - step // 2, 0, length)
+                ends = np.clip(centres - step // 2 + step, 0, length)
+            for out, values in zip(outs, (gc, skew, np.cumsum(skew))):
+                out.write(''.join('{}\t{}\t{}\t{:.4f}\n'.format(key, start, end, value)
+                                  for start, end, value in zip(starts.tolist(), ends.tolist(), values.tolist())))
+    finally:
+        for out in outs:
+            out.close()
+    return(paths)
 
 def main(args):
     # args[0] = subfunction to be called, args[1:] = input arguments for args[0].
@@ -161,13 +330,46 @@ def main(args):
 
     if args[0].lower() == "full":
         if len(args) == 1:
-            print("\nUsage: biostats full <threshold:int (default:500)> <scaffold:boolean (default:False)> <return all lengths:boolean (default:False)>\n")
-        if len(args) == 2:
-            getStats(args[1]) # passing additional arguments needs to be optimised, current solution is terrible
-        if len(args) == 3:
-            getStats(args[1], args[2])
-        if len(args) == 4:
-            getStats(args[1], args[2], args[3])
+            print("\nUsage: biostats full <fasta> <threshold:int (default:500)> <scaffold:boolean (default:False)> <return all lengths:boolean (default:False)> (json|tsv)\n")
+        else:
+            output = 'text'
+            if args[-1].lower() in ('json', 'tsv'): # Output format may follow any of the optional arguments
+                output = args.pop().lower()
+            returnLens = len(args) > 4 and args[4].lower() == 'true'
+            getStats(args[1], *args[2:4], returnLens=returnLens, output=output)
+    elif args[0].lower() == "batch":
+        if len(args) == 1:
+            print("\nUsage: biostats batch <fastas:files, directories or globs> (out <file>) (json|tsv) (threshold <int>) (threads <int>)\n")
+        else:
+            files, options = [], {'out': None, 'threshold': 500, 'threads': 1}
+            output = 'tsv'
+            extra = iter(args[1:])
+            for arg in extra:
+                if arg.lower() in options:
+                    options[arg.lower()] = next(extra)
+                elif arg.lower() in ('json', 'tsv'):
+                    output = arg.lower()
+                else:
+                    files.append(arg)
+            batchStats(files, options['out'], output, options['threshold'], options['threads'])
+    elif args[0].lower() == "gcprofile":
+        if len(args) == 1:
+            print("\nUsage: biostats gcprofile <fasta> <window:int (default:1000)> <step:int (default:window)> <output prefix (default:fasta name)> (threads <int>)\n")
+        else:
+            processes = 1
+            if 'threads' in args:
+                processes = int(args[args.index('threads') + 1])
+                args = args[:args.index('threads')]
+            print("\n".join(writeGCProfile(args[1], args[4] if len(args) > 4 else None,
+                                        int(args[2]) if len(args) > 2 else 1000, int(args[3]) if len(args) > 3 else None, processes)))
+    elif args[0].lower() == "qc":
+        if len(args) == 1:
+            print("\nUsage: biostats qc <fastq> <output prefix (default:fastq name)> <phred offset:int (default:33)>\n")
+        else:
+            import bioqc
+            report = bioqc.fastqQC(args[1], offset=int(args[3]) if len(args) > 3 else 33)
+            print(report.toJSON())
+            print("\n".join(report.writeTables(args[2] if len(args) > 2 else os.path.splitext(args[1])[0])))
     elif args[0].lower() == "topgc":
         if len(args) == 1:
             print("\nUsage: biostats topgc <fasta>\n")
@@ -184,6 +386,9 @@ if __name__ == "__main__":
         # Fill this with something useful explaining basic uses of biostats
         print("\nUsage: biostats <command> <arguments>\n\nCommands:\n"
             +"full\tOverview statistics for fastas\n"
+            +"batch\tOverview statistics for many fastas at once, as one table\n"
+            +"gcProfile\tSliding window GC content, GC skew and cumulative skew as bedGraph\n"
+            +"qc\tRead quality, length, composition and duplication statistics for a fastq\n"
             +"topGC\tReturns the contig/strain with the highest GC\n")
         	# Add N50, range, contigs etc. as separate functions
         sys.exit()
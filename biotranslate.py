@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import numpy as np
+import biocore
+
+##################
+# Genetic codes #
+##################
+
+# NCBI genetic codes as {table: (name, amino acids, start codons)}. Amino
+# acids are listed for codons in NCBI order (TTT, TTC, TTA, TTG, TCT, ...,
+# GGG), '*' marking stops.
+GENETIC_CODES = {
+    1: ('Standard', 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', ('TTG', 'CTG', 'ATG')),
+    2: ('Vertebrate Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSS**VVVVAAAADDEEGGGG',
+        ('ATT', 'ATC', 'ATA', 'ATG', 'GTG')),
+    3: ('Yeast Mitochondrial', 'FFLLSSSSYY**CCWWTTTTPPPPHHQQRRRRIIMMTTTTNNKKSSRRVVVVAAAADDEEGGGG', ('ATA', 'ATG', 'GTG')),
+    4: ('Mold, Protozoan, Coelenterate Mitochondrial and Mycoplasma',
+        'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG',
+        ('TTA', 'TTG', 'CTG', 'ATT', 'ATC', 'ATA', 'ATG', 'GTG')),
+    5: ('Invertebrate Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSSSVVVVAAAADDEEGGGG',
+        ('TTG', 'ATT', 'ATC', 'ATA', 'ATG', 'GTG')),
+    6: ('Ciliate, Dasycladacean and Hexamita Nuclear', 'FFLLSSSSYYQQCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG',
+        ('ATG',)),
+    9: ('Echinoderm and Flatworm Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNNKSSSSVVVVAAAADDEEGGGG',
+        ('ATG', 'GTG')),
+    10: ('Euplotid Nuclear', 'FFLLSSSSYY**CCCWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', ('ATG',)),
+    11: ('Bacterial, Archaeal and Plant Plastid', 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG',
+         ('TTG', 'CTG', 'ATT', 'ATC', 'ATA', 'ATG', 'GTG')),
+    12: ('Alternative Yeast Nuclear', 'FFLLSSSSYY**CC*WLLLSPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', ('CTG', 'ATG')),
+    13: ('Ascidian Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSGGVVVVAAAADDEEGGGG',
+         ('TTG', 'ATA', 'ATG', 'GTG')),
+    14: ('Alternative Flatworm Mitochondrial', 'FFLLSSSSYYY*CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNNKSSSSVVVVAAAADDEEGGGG', ('ATG',)),
+    16: ('Chlorophycean Mitochondrial', 'FFLLSSSSYY*LCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', ('ATG',)),
+    21: ('Trematode Mitochondrial', 'FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNNKSSSSVVVVAAAADDEEGGGG', ('ATG', 'GTG')),
+    22: ('Scenedesmus obliquus Mitochondrial', 'FFLLSS*SYY*LCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG', ('ATG',)),
+    23: ('Thraustochytrium Mitochondrial', 'FF*LSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG',
+         ('ATT', 'ATG', 'GTG')),
+    25: ('Candidate Division SR1 and Gracilibacteria', 'FFLLSSSSYY**CCGWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG',
+         ('TTG', 'ATG', 'GTG')),
+}
+
+# Bases are encoded as their index here (anything else counts as N), so that
+# a codon is the integer 256a + 16b + c and A/C/G/T codons come first.
+IUPAC = 'ACGTRYSWKMBDHVN'
+_IUPAC_CODES = np.full(256, IUPAC.index('N'), dtype=np.int64)
+for _i, _b in enumerate(IUPAC):
+    _IUPAC_CODES[ord(_b)] = _IUPAC_CODES[ord(_b.lower())] = _i
+_IUPAC_CODES[ord('U')] = _IUPAC_CODES[ord('u')] = IUPAC.index('T')
+_CODONS = 16 ** 3
+
+# Built on first use, {table: (amino acid bytes, start flags)} over every codon
+_tables = {}
+
+def codonTable(code=1):
+    """Given an NCBI genetic code number, returns (amino acids, starts): a
+    uint8 array of the amino acid (byte) for every encoded codon and a
+    boolean array marking start codons. Codons with ambiguous bases get an
+    amino acid if every codon they could stand for agrees on it, else 'X';
+    they are only starts if every one of those is a start.
+    """
+    code = int(code)
+    if code not in _tables:
+        if code not in GENETIC_CODES:
+            raise Exception("Error: Unknown genetic code '{}', choose from: {}".format(code, ', '.join(map(str, GENETIC_CODES))))
+        name, aminoAcids, starts = GENETIC_CODES[code]
+        exact = {}
+        for i, codon in enumerate(a + b + c for a in 'TCAG' for b in 'TCAG' for c in 'TCAG'):
+            exact[codon] = (aminoAcids[i], codon in starts)
+        table = np.full(_CODONS, ord('X'), dtype=np.uint8)
+        isStart = np.zeros(_CODONS, dtype=bool)
+        bases = [sorted(set(biocore.Idict[i]) - {'U'}) for i in IUPAC]
+        for a in range(len(IUPAC)):
+            for b in range(len(IUPAC)):
+                for c in range(len(IUPAC)):
+                    meanings = set(exact[x + y + z] for x in bases[a] for y in bases[b] for z in bases[c])
+                    aminoAcid = set(i[0] for i in meanings)
+                    index = a * 256 + b * 16 + c
+                    if len(aminoAcid) == 1:
+                        table[index] = ord(aminoAcid.pop())
+                    isStart[index] = all(i[1] for i in meanings)
+        _tables[code] = (table, isStart)
+    return(_tables[code])
+
+###############
+# Translation #
+###############
+
+def encodeCodons(seq, frame=0):
+    """Given a sequence (string, PackedSeq or uint8 array), returns every
+    whole codon from frame (0-2) onwards as integers 256a + 16b + c.
+    """
+    codes = _IUPAC_CODES[biocore._asArray(seq)[int(frame):]]
+    codes = codes[:len(codes) - len(codes) % 3]
+    return(codes[0::3] * 256 + codes[1::3] * 16 + codes[2::3])
+
+def translateSequence(seq, frame=0, code=1, stop='*'):
+    """Given a DNA or RNA sequence, returns its translation from frame (0-2)
+    as a string, looking every codon up at once. Stops are written as stop.
+    """
+    aminoAcids = codonTable(code)[0][encodeCodons(seq, frame)]
+    protein = aminoAcids.tobytes().decode()
+    return(protein if stop == '*' else protein.replace('*', stop))
+
+def sixFrames(seq, code=1, stop='*'):
+    """Given a sequence, returns [(frame, protein)] for the three forward
+    frames (+1, +2, +3) and the three frames of its reverse complement
+    (-1, -2, -3).
+    """
+    reverse = biocore._complement(seq, reverse=True)
+    return([('+{}'.format(i + 1), translateSequence(seq, i, code, stop)) for i in range(3)]
+           + [('-{}'.format(i + 1), translateSequence(reverse, i, code, stop)) for i in range(3)])
+
+########
+# ORFs #
+########
+
+# ORFs are returned as records of 0-based start (inclusive) and end
+# (exclusive, including any stop codon) on the forward strand, the strand
+# and frame (1-3, counted from that strand's 5' end) and the protein length.
+ORF_DTYPE = np.dtype([('start', np.int64), ('end', np.int64), ('strand', 'U1'), ('frame', np.int8),
+                      ('length', np.int64)])
+
+def _startFlags(code, startCodons):
+    """Return the start codon flags over every encoded codon: those of the
+    genetic code if startCodons is None, else for the codons given.
+    """
+    if startCodons is None:
+        return(codonTable(code)[1])
+    isStart = np.zeros(_CODONS, dtype=bool)
+    for codon in startCodons:
+        if len(codon) != 3:
+            raise Exception("Error: Start codon '{}' is not three bases long.".format(codon))
+        isStart[encodeCodons(codon.upper())] = True
+    return(isStart)
+
+def _frameORFs(codons, isStop, isStart, minLength, partial):
+    """Given one frame's encoded codons, returns the first codon, the stop
+    codon and the end (exclusive, stop included) of each ORF: from the first
+    start after a stop to the next stop, or from just after a stop if there
+    are no start codons, keeping those of at least minLength amino acids.
+    ORFs left open at either end of the sequence are kept only if partial:
+    the stretch before the first stop, which may begin upstream of the
+    sequence, as an ORF from its first codon (5'-partial), and the stretch
+    after the last stop up to the end of the sequence (3'-partial).
+    """
+    stops = np.flatnonzero(isStop[codons])
+    ends = np.concatenate((stops, [len(codons)])) if partial else stops
+    begins = np.concatenate(([0], stops + 1))[:len(ends)]
+    if isStart.any():
+        starts = np.flatnonzero(isStart[codons])
+        index = np.searchsorted(starts, begins)
+        first = starts[np.minimum(index, len(starts) - 1)] if len(starts) else begins
+        found = (index < len(starts)) & (first < ends)
+        if partial and len(ends): # Its start codon may lie upstream of the sequence
+            first[0], found[0] = 0, ends[0] > 0
+    else:
+        first = begins
+        found = first < ends
+        found[:1] &= partial # Nothing says the first stop-to-stop ORF starts where the sequence does
+    first, ends = first[found], ends[found]
+    keep = ends - first >= minLength
+    first, ends = first[keep], ends[keep]
+    return(first, ends, np.minimum(ends + 1, len(codons)))
+
+def findORFs(seq, minLength=100, code=1, startCodons=None, partial=False, strands='both'):
+    """Given a sequence, returns (orfs, proteins): an array of ORF_DTYPE
+    records, sorted by start, and the protein of each. An ORF runs from the
+    first start codon (those of the genetic code, or startCodons; an empty
+    list gives stop-to-stop ORFs) after a stop to the next stop in frame, and
+    must code at least minLength amino acids. With partial=True, ORFs running
+    off either end are kept too, those open at the 5' end starting from the
+    first codon of their frame. Every frame is translated with one table
+    lookup. Proteins begin with M whatever the start codon, as initiators
+    do, and omit the stop.
+    """
+    table = codonTable(code)[0]
+    isStop = table == ord('*')
+    isStart = _startFlags(code, startCodons)
+    arr = biocore._UPPER[biocore._asArray(seq)]
+    n = len(arr)
+    strandSeqs = [('+', arr)] if strands != '-' else []
+    if strands in ('both', '-'):
+        strandSeqs.append(('-', biocore._COMPLEMENT_LUT[arr[::-1]]))
+
+    parts, proteins = [], []
+    for strand, strandSeq in strandSeqs:
+        for frame in range(3):
+            codons = encodeCodons(strandSeq, frame)
+            first, stops, last = _frameORFs(codons, isStop, isStart, int(minLength), partial)
+            if not len(first):
+                continue
+            aminoAcids = table[codons].tobytes().decode()
+            for i, j in zip(first.tolist(), stops.tolist()):
+                protein = aminoAcids[i:j]
+                proteins.append('M' + protein[1:] if isStart[codons[i]] else protein) # Not for 5'-partial ORFs
+            orfs = np.zeros(len(first), dtype=ORF_DTYPE)
+            orfs['start'], orfs['end'] = frame + 3 * first, frame + 3 * last
+            if strand == '-':
+                orfs['start'], orfs['end'] = n - orfs['end'], n - orfs['start']
+            orfs['strand'], orfs['frame'] = strand, frame + 1
+            orfs['length'] = stops - first
+            parts.append(orfs)
+
+    orfs = np.concatenate(parts) if parts else np.zeros(0, dtype=ORF_DTYPE)
+    order = np.lexsort((orfs['end'], orfs['start']))
+    return(orfs[order], [proteins[i] for i in order])
+
+def _recordORFs(task):
+    """Worker: call ORFs on one record."""
+    name, seq, minLength, code, startCodons, partial = task
+    return(name, findORFs(seq, minLength, code, startCodons, partial))
+
+def iterORFs(filename, minLength=100, code=1, startCodons=None, partial=False, processes=1):
+    """Given a fasta/q (or a single sequence), yields (name, orfs, proteins)
+    for every record, in order, over a pool of worker processes if
+    processes > 1.
+    """
+    if not biocore.isInputFile(filename):
+        yield(('sequence',) + findORFs(filename, minLength, code, startCodons, partial))
+        return
+    tasks = ((name, seq, minLength, code, startCodons, partial) for name, seq, qual in biocore.iterRecords(filename))
+    if int(processes) <= 1:
+        results = map(_recordORFs, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(int(processes))
+        results = pool.imap(_recordORFs, tasks)
+    try:
+        for name, (orfs, proteins) in results:
+            yield(name, orfs, proteins)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+def writeORFs(filename, prefix, minLength=100, code=1, startCodons=None, partial=False, processes=1):
+    """Call ORFs on every record of a fasta/q, writing their proteins to
+    <prefix>.faa and their coordinates to <prefix>.gff (GFF3, 1-based and
+    inclusive, stop codons included). Returns the number of ORFs found.
+    """
+    found = 0
+    with open(prefix + '.faa', 'w') as faa, open(prefix + '.gff', 'w') as gff:
+        gff.write('##gff-version 3\n')
+        for name, orfs, proteins in iterORFs(filename, minLength, code, startCodons, partial, processes):
+            contig = name.split()[0] if name else name
+            for i, (orf, protein) in enumerate(zip(orfs.tolist(), proteins), 1):
+                start, end, strand, frame, length = orf
+                orfID = '{}_orf{}'.format(contig, i)
+                faa.write('>{} {}:{}-{}({}) frame={} length={}\n'.format(orfID, contig, start + 1, end, strand, frame, length))
+                faa.write(''.join(protein[j:j+60] + '\n' for j in range(0, len(protein), 60)))
+                gff.write('{}\tbio\tCDS\t{}\t{}\t.\t{}\t0\tID={};frame={};length={};code={}\n'.format(
+                          contig, start + 1, end, strand, orfID, frame, length, code))
+            found += len(orfs)
+    return(found)
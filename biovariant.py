@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import biocoords
+import biocore
+import biotranslate
+import biozip
+
+# Columns of the annotation table written by annotateVariants
+COLUMNS = ['Contig', 'Position', 'Ref', 'Alt', 'Gene', 'Strand', 'CDSPosition', 'Codon',
+           'RefCodon', 'AltCodon', 'AAChange', 'Effect']
+
+############
+# Reading #
+############
+
+def readVariants(filename):
+    """Given a VCF or a tab-separated table of contig, position (1-based),
+    ref and alt (optionally gzip/bgzip compressed), returns a list of
+    (contig, position, ref, alt), one per alternative allele. VCFs are told
+    apart by their '#' header; '#' lines and a header starting 'contig' are
+    otherwise skipped.
+    """
+    variants = []
+    columns = (0, 1, 2, 3)
+    with biozip.openText(filename) as f:
+        for line in f:
+            if line.startswith('##fileformat=VCF') or line.startswith('#CHROM'):
+                columns = (0, 1, 3, 4)
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.rstrip('\r\n').split('\t')
+            if fields[0].lower() in ('contig', 'chrom', 'chromosome'):
+                continue
+            if len(fields) <= columns[3]:
+                raise Exception("Error: Variant lines need contig, position, ref and alt columns, got: " + line.strip())
+            contig, position, ref = fields[columns[0]], int(fields[columns[1]]), fields[columns[2]].upper()
+            for alt in fields[columns[3]].upper().split(','):
+                if alt not in ('.', '*'): # No call, or an allele spanned by an upstream deletion
+                    variants.append((contig, position, ref, alt))
+    return(variants)
+
+def readCDS(filename):
+    """Given a tab-separated file of gene name, contig and exons (as
+    'bpA:bpB,bpC:bpD' in coding order, descending for minus strand genes,
+    see biocoords.readExons), one gene per line, returns a list of (gene,
+    contig, exons).
+    """
+    genes = []
+    with open(filename, 'r') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if not line.strip() or line.startswith('#') or fields[0].lower() == 'gene':
+                continue
+            if len(fields) < 3:
+                raise Exception("Error: CDS lines must be 'gene<tab>contig<tab>bpA:bpB,bpC:bpD', got: " + line.strip())
+            genes.append((fields[0], fields[1], biocoords.readExons(fields[2].strip())))
+    return(genes)
+
+################
+# Coding genes #
+################
+
+class CodingGene(biocoords.ExonMap):
+    """An ExonMap that also holds the gene's coding sequence (5'->3', as a
+    uint8 array), taken from a reference fasta one exon at a time.
+    """
+
+    def __init__(self, name, contig, exons, fasta, index=None):
+        biocoords.ExonMap.__init__(self, exons)
+        self.name, self.contig = name, contig
+        parts = [biocore.fetchSeq(fasta, contig, low, high, index) for low, high in zip(self.lows, self.highs)]
+        if self.strand == '-':
+            parts = [biocore._complement(i, reverse=True) for i in parts]
+        self.seq = biocore._UPPER[biocore._asArray(''.join(parts))]
+        if len(self.seq) != self.length:
+            raise Exception("Error: Exons of {} run off the end of {}.".format(name, contig))
+
+##############
+# Annotation #
+##############
+
+def _aminoAcid(table, codons):
+    """Return amino acids (as bytes) for codons given as (n x 3) uint8 arrays."""
+    codes = biotranslate._IUPAC_CODES[codons]
+    return(table[codes[:, 0] * 256 + codes[:, 1] * 16 + codes[:, 2]])
+
+def _effect(refProtein, altProtein):
+    """Classify a change between equal length stretches of protein, codon by
+    codon: any new stop makes it nonsense, else any lost stop stop_lost.
+    """
+    if refProtein == altProtein:
+        return('synonymous')
+    pairs = list(zip(refProtein, altProtein))
+    if any(alt == '*' and ref != '*' for ref, alt in pairs):
+        return('nonsense')
+    if any(ref == '*' and alt != '*' for ref, alt in pairs):
+        return('stop_lost')
+    return('missense')
+
+def _sortedVariants(variants):
+    """Return {contig: (variant indices, starts, ends, longest span)} with
+    each contig's variants sorted by start; ends cover the ref allele.
+    """
+    byContig = {}
+    for v, (contig, position, ref, alt) in enumerate(variants):
+        byContig.setdefault(contig, []).append(v)
+    for contig, indices in byContig.items():
+        indices = np.array(indices, dtype=np.int64)
+        starts = np.array([variants[i][1] for i in indices], dtype=np.int64)
+        ends = starts + np.array([max(len(variants[i][2]), 1) for i in indices], dtype=np.int64) - 1
+        order = np.argsort(starts, kind='stable')
+        byContig[contig] = (indices[order], starts[order], ends[order], int((ends - starts).max()))
+    return(byContig)
+
+def _overlaps(gene, contigVariants):
+    """Return (variant indices, exons) for every variant overlapping one of
+    a gene's exons, found by binary search on the sorted variant starts.
+    """
+    indices, starts, ends, longest = contigVariants
+    lo = np.searchsorted(starts, gene.lows - longest, side='left')
+    hi = np.searchsorted(starts, gene.highs, side='right')
+    counts = hi - lo
+    exons = np.repeat(np.arange(len(gene.lows)), counts)
+    hits = np.repeat(lo, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    inside = ends[hits] >= gene.lows[exons]
+    return(indices[hits[inside]], exons[inside])
+
+def _annotateSNVs(gene, table, positions, refs, alts, exons):
+    """Annotate single base substitutions in one gene at once, returning a
+    list of row tails (CDS position onwards) for each.
+    """
+    cds = gene.exonToCDS(exons, positions)
+    codons = cds // 3
+    complete = 3 * codons + 3 <= len(gene.seq)
+    windows = np.minimum(3 * codons[:, None] + np.arange(3), len(gene.seq) - 1)
+    refCodons = gene.seq[windows]
+    altBases = biocore._asArray(''.join(alts))
+    refBases = gene.seq[cds]
+    if gene.strand == '-':
+        altBases = biocore._COMPLEMENT_LUT[altBases]
+        refBases = biocore._COMPLEMENT_LUT[refBases]
+    altCodons = refCodons.copy()
+    altCodons[np.arange(len(cds)), cds % 3] = altBases
+    refAAs = _aminoAcid(table, refCodons).tobytes().decode()
+    altAAs = _aminoAcid(table, altCodons).tobytes().decode()
+    matches = refBases == biocore._asArray(''.join(refs))
+
+    rows = []
+    for i in range(len(cds)):
+        if not complete[i]: # The codon window was padded, so there is no real codon to show
+            rows.append((int(cds[i]) + 1, int(codons[i]) + 1, '.', '.', '.', 'incomplete_codon' if matches[i] else 'ref_mismatch'))
+            continue
+        effect = _effect(refAAs[i], altAAs[i]) if matches[i] else 'ref_mismatch'
+        rows.append((int(cds[i]) + 1, int(codons[i]) + 1, refCodons[i].tobytes().decode(), altCodons[i].tobytes().decode(),
+                     '{}{}{}'.format(refAAs[i], codons[i] + 1, altAAs[i]), effect))
+    return(rows)
+
+def _annotateOther(gene, code, position, ref, alt, exon):
+    """Annotate one multi-base substitution or indel in a gene, returning
+    its row tail (CDS position onwards). Substitutions are translated over
+    the codons they touch; indels are classed as frameshift or in-frame by
+    their length change alone.
+    """
+    low, high = gene.lows[exon], gene.highs[exon]
+    if len(ref) == len(alt):
+        if position < low or position + len(ref) - 1 > high:
+            cds = gene.exonToCDS(exon, min(max(position, low), high))
+            return(int(cds) + 1, int(cds) // 3 + 1, '.', '.', '.', 'splice_region')
+        span = gene.exonToCDS(exon, np.arange(position, position + len(ref)))
+        first, last = int(span.min()) // 3, int(span.max()) // 3
+        refSeg = gene.seq[3 * first:3 * last + 3]
+        altSeg = refSeg.copy()
+        bases = biocore._asArray(alt)
+        altSeg[span - 3 * first] = biocore._COMPLEMENT_LUT[bases] if gene.strand == '-' else bases
+        refAAs = biotranslate.translateSequence(refSeg, code=code)
+        altAAs = biotranslate.translateSequence(altSeg, code=code)
+        genomic = refSeg[span - 3 * first]
+        if gene.strand == '-':
+            genomic = biocore._COMPLEMENT_LUT[genomic]
+        if not np.array_equal(genomic, biocore._asArray(ref)):
+            effect = 'ref_mismatch'
+        elif len(refSeg) % 3 or 3 * last + 3 > len(gene.seq):
+            return(int(span.min()) + 1, first + 1, '.', '.', '.', 'incomplete_codon')
+        else:
+            effect = _effect(refAAs, altAAs)
+        return(int(span.min()) + 1, first + 1, refSeg.tobytes().decode(), altSeg.tobytes().decode(),
+               '{}{}{}'.format(refAAs, first + 1, altAAs), effect)
+
+    # Indels: skip any shared leading (VCF anchor) bases to find the first changed base
+    shared = 0
+    while shared < min(len(ref), len(alt)) and ref[shared] == alt[shared]:
+        shared += 1
+    changed = min(max(position + shared, low), high)
+    cds = int(gene.exonToCDS(exon, changed))
+    codon = cds // 3
+    refCodon = gene.seq[3 * codon:3 * codon + 3]
+    refAA = biotranslate.translateSequence(refCodon, code=code) or '?'
+    delta = len(alt) - len(ref)
+    if delta % 3:
+        effect, change = 'frameshift', 'fs'
+    else:
+        effect, change = ('inframe_insertion', 'ins') if delta > 0 else ('inframe_deletion', 'del')
+    return(cds + 1, codon + 1, refCodon.tobytes().decode(), '.', '{}{}{}'.format(refAA, codon + 1, change), effect)
+
+def annotateVariants(variants, fasta, cds, outfile=None, code=1):
+    """Given variants (a VCF/TSV, see readVariants, or a list of (contig,
+    position, ref, alt)), a reference fasta and coding genes (a file, see
+    readCDS, or a list of (gene, contig, exons)), writes a table of
+    COLUMNS to outfile (or stdout), one row per variant and gene it falls
+    in, and returns the count of each effect. Each gene's CDS is read from
+    the reference once and only the codons a variant touches are
+    translated; single base changes in a gene are handled all at once.
+    Variants outside every CDS are reported as noncoding.
+    """
+    variants = readVariants(variants) if isinstance(variants, str) else list(variants)
+    genes = readCDS(cds) if isinstance(cds, str) else cds
+    table = biotranslate.codonTable(code)[0]
+    index = biocore.readIndex(fasta)
+    byContig = _sortedVariants(variants)
+
+    rows = []
+    for name, contig, exons in genes:
+        contigVariants = byContig.get(contig)
+        if contigVariants is None:
+            continue
+        gene = CodingGene(name, contig, exons, fasta, index)
+        strand = gene.strand
+        hits, exonHits = _overlaps(gene, contigVariants)
+        snvs = np.array([len(variants[v][2]) == 1 and len(variants[v][3]) == 1 for v in hits], dtype=bool)
+        if snvs.any():
+            selected = hits[snvs]
+            tails = _annotateSNVs(gene, table, np.array([variants[v][1] for v in selected], dtype=np.int64),
+                                  [variants[v][2] for v in selected], [variants[v][3] for v in selected], exonHits[snvs])
+            rows.extend((int(v), name, strand) + tail for v, tail in zip(selected, tails))
+        for v, exon in zip(hits[~snvs].tolist(), exonHits[~snvs].tolist()):
+            contigName, position, ref, alt = variants[v]
+            rows.append((v, name, strand) + _annotateOther(gene, code, position, ref, alt, exon))
+
+    coding = set(row[0] for row in rows)
+    rows.extend((v, '.', '.', '.', '.', '.', '.', '.', 'noncoding') for v in range(len(variants)) if v not in coding)
+    rows.sort(key=lambda row: row[0])
+
+    counts = {}
+    out = open(outfile, 'w') if outfile else None
+    try:
+        lines = ['\t'.join(COLUMNS) + '\n']
+        for row in rows:
+            lines.append('\t'.join(map(str, variants[row[0]] + row[1:])) + '\n')
+            counts[row[-1]] = counts.get(row[-1], 0) + 1
+        out.write(''.join(lines)) if out else print(''.join(lines), end='')
+    finally:
+        if out:
+            out.close()
+    return(counts)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+import gzip
+import io
+import mmap
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# Filename standing for standard input
+STDIN = '-'
+# Files at least this large are decompressed over several threads by default
+THREAD_THRESHOLD = 1 << 24
+# Number of blocks handed to the thread pool at a time
+BLOCK_BATCH = 64
+
+###################
+# Format checking #
+###################
+
+def peek(filename, size=64):
+    """Return up to the first size bytes of a file, or of stdin for '-',
+    without consuming them.
+    """
+    if filename == STDIN:
+        return(sys.stdin.buffer.peek(size)[:size])
+    with open(filename, 'rb') as f:
+        return(f.read(size))
+
+def isGzip(filename):
+    """Return True if the file starts with the gzip magic bytes."""
+    return(peek(filename, 2) == GZIP_MAGIC)
+
+def isZstd(filename):
+    """Return True if the file starts with the zstd magic bytes."""
+    return(peek(filename, 4) == ZSTD_MAGIC)
+
+def decompressHead(head):
+    """Given the first bytes of a gzip or zstd file, returns as much of the
+    start of its uncompressed content as they decode to (possibly b'').
+    """
+    if head[:2] == GZIP_MAGIC:
+        try:
+            return(zlib.decompressobj(31).decompress(head))
+        except zlib.error:
+            return(b'')
+    if head[:4] == ZSTD_MAGIC:
+        try:
+            import zstandard # Optional, only needed for zstd input
+            return(zstandard.ZstdDecompressor().decompressobj().decompress(head))
+        except Exception:
+            return(b'')
+    return(head)
+
+def _blockSize(header, position=0):
+    """Given a buffer holding a gzip member header at position, returns the
+    total BGZF block size from its 'BC' extra subfield, or None if absent.
+    """
+    if header[position:position+2] != GZIP_MAGIC or not header[position+3] & 4: # FEXTRA flag
+        return(None)
+    xlen = struct.unpack_from('<H', header, position + 10)[0]
+    field, end = position + 12, position + 12 + xlen
+    while field + 4 <= end:
+        sub, length = header[field:field+2], struct.unpack_from('<H', header, field + 2)[0]
+        if sub == b'BC' and length == 2:
+            return(struct.unpack_from('<H', header, field + 4)[0] + 1)
+        field += 4 + length
+    return(None)
+
+def isBGZF(filename):
+    """Return True if the file is blocked gzip (as written by bgzip)."""
+    header = peek(filename, 1024)
+    return(len(header) >= 18 and _blockSize(header) is not None)
+
+##################
+# BGZF block map #
+##################
+
+def blockOffsets(filename):
+    """Given a BGZF file, returns two uint64 arrays of the compressed and
+    uncompressed offset of every block, plus the total uncompressed size.
+    Only block headers and trailers are read, nothing is decompressed.
+    """
+    compressed, uncompressed = [], []
+    total = 0
+    size = os.path.getsize(filename)
+    if size == 0:
+        return(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64), 0)
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = 0
+            while position < size:
+                blockSize = _blockSize(mm, position)
+                if blockSize is None:
+                    raise Exception("Error: {} is not BGZF compressed (bad block at byte {}).".format(filename, position))
+                compressed.append(position)
+                uncompressed.append(total)
+                total += struct.unpack_from('<I', mm, position + blockSize - 4)[0] # ISIZE
+                position += blockSize
+    return(np.array(compressed, dtype=np.uint64), np.array(uncompressed, dtype=np.uint64), total)
+
+def buildGzi(filename):
+    """Given a BGZF file, writes its block index (filename.gzi, in the same
+    layout as bgzip -i: entry count then (compressed, uncompressed) offset
+    pairs, all little-endian uint64, omitting the first block) and returns
+    (compressed offsets, uncompressed offsets) including the first block.
+    """
+    compressed, uncompressed, total = blockOffsets(filename)
+    pairs = np.empty((max(len(compressed) - 1, 0), 2), dtype='<u8')
+    pairs[:, 0], pairs[:, 1] = compressed[1:], uncompressed[1:]
+    with open(filename + '.gzi', 'wb') as f:
+        f.write(struct.pack('<Q', len(pairs)))
+        f.write(pairs.tobytes())
+    return(compressed, uncompressed)
+
+def readGzi(filename):
+    """Given a BGZF file, returns its (compressed, uncompressed) block offsets
+    from filename.gzi, building the .gzi first if missing or out of date.
+    """
+    gzi = filename + '.gzi'
+    if not os.path.isfile(gzi) or os.path.getmtime(gzi) < os.path.getmtime(filename):
+        return(buildGzi(filename))
+    with open(gzi, 'rb') as f:
+        count = struct.unpack('<Q', f.read(8))[0]
+        pairs = np.frombuffer(f.read(16 * count), dtype='<u8').reshape(-1, 2)
+    compressed = np.concatenate(([0], pairs[:, 0])).astype(np.uint64)
+    uncompressed = np.concatenate(([0], pairs[:, 1])).astype(np.uint64)
+    return(compressed, uncompressed)
+
+def _inflate(block):
+    """Decompress one whole BGZF block (header, raw deflate data, trailer)."""
+    xlen = struct.unpack_from('<H', block, 10)[0]
+    return(zlib.decompress(block[12 + xlen:-8], -15))
+
+class BGZFReader(object):
+    """Random access to the uncompressed bytes of a BGZF file through its
+    .gzi index: only the blocks overlapping a requested range are read and
+    decompressed.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        compressed, uncompressed = readGzi(filename)
+        self.compressed = np.append(compressed, os.path.getsize(filename)).astype(np.int64)
+        self.uncompressed = uncompressed.astype(np.int64)
+
+    def size(self):
+        """Return the total uncompressed size, from the last block's ISIZE."""
+        if len(self.uncompressed) == 0:
+            return(0)
+        with open(self.filename, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            return(int(self.uncompressed[-1]) + struct.unpack('<I', f.read(4))[0])
+
+    def read(self, start, end):
+        """Return the uncompressed bytes [start, end)."""
+        if end <= start or len(self.uncompressed) == 0:
+            return(b'')
+        first = int(np.searchsorted(self.uncompressed, start, side='right')) - 1
+        last = int(np.searchsorted(self.uncompressed, end, side='left'))
+        with open(self.filename, 'rb') as f:
+            f.seek(int(self.compressed[first]))
+            raw = f.read(int(self.compressed[last] - self.compressed[first]))
+        base = int(self.compressed[first])
+        data = b''.join(_inflate(raw[int(self.compressed[i]) - base:int(self.compressed[i+1]) - base])
+                        for i in range(first, last))
+        offset = start - int(self.uncompressed[first])
+        return(data[offset:offset + end - start])
+
+##########################
+# Parallel decompression #
+##########################
+
+def iterBlocks(filename, threads=2):
+    """Given a BGZF file, yields its uncompressed contents in order, one block
+    at a time, with blocks decompressed in batches over a thread pool (zlib
+    releases the GIL while inflating).
+    """
+    compressed, uncompressed, total = blockOffsets(filename)
+    if len(compressed) == 0:
+        return
+    bounds = np.append(compressed, os.path.getsize(filename)).astype(np.int64)
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with ThreadPoolExecutor(max_workers=int(threads)) as pool:
+                for batch in range(0, len(compressed), BLOCK_BATCH * int(threads)):
+                    blocks = [mm[bounds[i]:bounds[i+1]] for i in range(batch, min(batch + BLOCK_BATCH * int(threads), len(compressed)))]
+                    for data in pool.map(_inflate, blocks):
+                        yield(data)
+
+class _BlockStream(io.RawIOBase):
+    """A readable raw stream over an iterator of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self):
+        return(True)
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return(0)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return(n)
+
+    def close(self):
+        if hasattr(self._chunks, 'close'):
+            self._chunks.close()
+        super().close()
+
+###########
+# Opening #
+###########
+
+def _threadsFor(filename, threads):
+    if threads is not None:
+        return(int(threads))
+    if os.path.getsize(filename) < THREAD_THRESHOLD:
+        return(1)
+    return(min(4, os.cpu_count() or 1))
+
+class _StdinStream(io.RawIOBase):
+    """A raw stream over stdin's buffer, which is left open when closed, so
+    that bytes already peeked at are still read."""
+
+    def readable(self):
+        return(True)
+
+    def readinto(self, b):
+        return(sys.stdin.buffer.readinto1(b))
+
+def _zstdReader(source):
+    try:
+        import zstandard # Optional, only needed for zstd input
+    except ImportError:
+        raise Exception("Error: zstd compressed input needs the zstandard module (pip install zstandard), or decompress it first.")
+    return(io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(source)))
+
+def openBinary(filename, threads=None):
+    """Open a plain, gzip, BGZF or zstd file, or stdin for '-', for reading as
+    uncompressed bytes. BGZF files are decompressed over several threads when
+    threads > 1, or by default when the file is large.
+    """
+    if filename == STDIN:
+        source = io.BufferedReader(_StdinStream())
+        if isGzip(filename):
+            return(gzip.GzipFile(fileobj=source, mode='rb'))
+        return(_zstdReader(source) if isZstd(filename) else source)
+    if isZstd(filename):
+        return(_zstdReader(open(filename, 'rb')))
+    if not isGzip(filename):
+        return(open(filename, 'rb'))
+    threads = _threadsFor(filename, threads)
+    if threads > 1 and isBGZF(filename):
+        return(io.BufferedReader(_BlockStream(iterBlocks(filename, threads)), buffer_size=1 << 20))
+    return(gzip.open(filename, 'rb'))
+
+def openText(filename, threads=None):
+    """As openBinary, but returns a text stream."""
+    if filename != STDIN and not isGzip(filename) and not isZstd(filename):
+        return(open(filename, 'r'))
+    return(io.TextIOWrapper(openBinary(filename, threads)))
+
+def readRange(filename, start, end):
+    """Return the uncompressed bytes [start, end) of a plain, gzip or BGZF
+    file. Plain files are read via mmap and BGZF files via their .gzi index;
+    plain gzip has no random access, so is decompressed up to the range.
+    """
+    if not isGzip(filename):
+        with open(filename, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return(mm[start:end])
+    if isBGZF(filename):
+        return(BGZFReader(filename).read(start, end))
+    with gzip.open(filename, 'rb') as f:
+        f.seek(start)
+        return(f.read(end - start))
+
+def uncompressedSize(filename):
+    """Return the uncompressed size of a plain or BGZF file, or None for plain
+    gzip (whose size is only known after decompressing it all).
+    """
+    if not isGzip(filename):
+        return(os.path.getsize(filename))
+    if isBGZF(filename):
+        return(BGZFReader(filename).size())
+    return(None)
+
+###############
+# Compression #
+###############
+
+# Largest uncompressed payload per block written by bgzip
+BLOCK_SIZE = 0xff00
+
+def _deflateBlock(data):
+    """Compress up to BLOCK_SIZE bytes into one BGZF block."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    header = GZIP_MAGIC + struct.pack('<BBIBBH', 8, 4, 0, 0, 0xff, 6) + b'BC' + struct.pack('<HH', 2, len(payload) + 25)
+    return(header + payload + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data)))
+
+def bgzip(filename, outfile=None):
+    """Given a plain or gzip compressed file, writes it BGZF compressed (as
+    bgzip would) to outfile, by default filename.gz with any existing .gz
+    replaced, and builds its .gzi index. Returns the output path.
+    """
+    if outfile is None:
+        outfile = (filename[:-3] if filename.endswith('.gz') else filename) + '.gz'
+        if outfile == filename:
+            outfile = filename[:-3] + '.bgz'
+    with openBinary(filename, threads=1) as f, open(outfile, 'wb') as out:
+        while True:
+            data = f.read(BLOCK_SIZE)
+            if not data:
+                break
+            out.write(_deflateBlock(data))
+        out.write(_deflateBlock(b'')) # Empty EOF block
+    buildGzi(outfile)
+    return(outfile)